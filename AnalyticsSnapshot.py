@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Read-only SQLite snapshot of every dashboard table, rebuilt after each run and swapped in for app servers to read locally
+
+import json
+import logging
+import os
+import sqlite3
+
+from BulkLoader import connect_to_db
+from Competitions import COMPETITIONS, get_competition, shot_grid_table_names, shot_zone_table_names
+from DataVersions import DATA_VERSIONS_TABLE
+from EtlMetrics import track
+from GameLogs import advanced_table_names, player_trends_table_name
+from PlayerSimilarity import similarity_table_names
+from ScheduleResults import head_to_head_table_name, standings_table_name
+from ShotData import relation_kind
+from TableSchemas import ROW_HASH_COLUMN
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = os.getenv("ANALYTICS_SNAPSHOT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "analytics_snapshot.sqlite"))
+SNAPSHOT_MMAP_SIZE = int(os.getenv("ANALYTICS_SNAPSHOT_MMAP_SIZE", str(1 << 30)))
+BATCH_ROWS = 50_000
+SQLITE_TYPES = {'smallint': 'INTEGER', 'integer': 'INTEGER', 'bigint': 'INTEGER', 'real': 'REAL', 'double precision': 'REAL'}
+# Load bookkeeping the dashboards never read
+SKIPPED_COLUMNS = ('id', ROW_HASH_COLUMN)
+
+def snapshot_tables(competition_type: str) -> list:
+    """(table, cluster columns, other indexes) for every table the dashboards read for a competition.
+
+    Rows are written in cluster column order, so a season and player or team range is a few contiguous pages."""
+    competition = get_competition(competition_type)
+    game_logs_table = competition.table_name('game_logs')
+    schedule_table = competition.table_name('schedule_results')
+    shot_table = competition.table_name('shot_data')
+    advanced_game_table, advanced_season_table = advanced_table_names(game_logs_table)
+    team_zone_table, player_zone_table = shot_zone_table_names(shot_table)
+    league_grid_table, team_grid_table, player_grid_table = shot_grid_table_names(shot_table)
+    features_table, similarity_table = similarity_table_names(game_logs_table)
+    return [
+        (game_logs_table, ('season', 'player_id', 'round', 'gamecode', 'team'), (('season', 'team', 'round'),)),
+        (player_trends_table_name(game_logs_table), ('season', 'player_id', 'round', 'gamecode'), ()),
+        (advanced_game_table, ('season', 'player_id', 'round', 'gamecode', 'team'), (('season', 'team', 'round'),)),
+        (advanced_season_table, ('season', 'player_id', 'team'), (('season', 'team'),)),
+        (schedule_table, ('season', 'team', 'round', 'gamecode'), ()),
+        (standings_table_name(schedule_table), ('season', 'phase_group', 'round', 'team'), ()),
+        (head_to_head_table_name(schedule_table), ('season', 'team', 'opponent'), ()),
+        (shot_table, ('season', 'id_player', 'gamecode', 'num_anot'), (('season', 'team'),)),
+        (team_zone_table, ('season', 'team', 'phase'), ()),
+        (player_zone_table, ('season', 'id_player', 'phase'), ()),
+        (league_grid_table, ('season', 'phase'), ()),
+        (team_grid_table, ('season', 'team', 'phase'), ()),
+        (player_grid_table, ('season', 'id_player', 'phase'), ()),
+        (features_table, ('season', 'player_id'), ()),
+        (similarity_table, ('season', 'player_id', 'rank'), ()),
+    ]
+
+def fetch_column_types(cursor, table_name: str) -> list:
+    cursor.execute("""
+    SELECT column_name, data_type FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = %s
+    ORDER BY ordinal_position
+    """, (table_name,))
+    return [(name, data_type) for name, data_type in cursor.fetchall() if name not in SKIPPED_COLUMNS]
+
+def copy_table(conn, snapshot, table_name: str, cluster_columns: tuple, indexes: tuple) -> int:
+    """Copy one Postgres table or view into the snapshot in cluster order, streaming BATCH_ROWS rows at a time."""
+    with conn.cursor() as cursor:
+        columns = fetch_column_types(cursor, table_name)
+    names = [name for name, _ in columns]
+    # SQLite has no arrays or timestamps: the shot grid arrays are stored as JSON and timestamps as ISO text
+    json_positions = [i for i, (_, data_type) in enumerate(columns) if data_type == 'ARRAY']
+    text_positions = [i for i, (_, data_type) in enumerate(columns) if data_type.startswith(('timestamp', 'date'))]
+    column_sql = [f"{name} {SQLITE_TYPES.get(data_type, 'TEXT')}" for name, data_type in columns]
+    snapshot.execute(f"CREATE TABLE {table_name} ({', '.join(column_sql)})")
+
+    rows = 0
+    with conn.cursor(name=f"snapshot_{table_name}") as cursor:
+        cursor.itersize = BATCH_ROWS
+        cursor.execute(f"SELECT {', '.join(names)} FROM {table_name} ORDER BY {', '.join(cluster_columns)}")
+        insert_sql = f"INSERT INTO {table_name} VALUES ({', '.join('?' * len(names))})"
+        while True:
+            batch = cursor.fetchmany(BATCH_ROWS)
+            if not batch:
+                break
+            if json_positions or text_positions:
+                batch = [list(row) for row in batch]
+                for row in batch:
+                    for i in json_positions:
+                        row[i] = json.dumps(row[i]) if row[i] is not None else None
+                    for i in text_positions:
+                        row[i] = row[i].isoformat() if row[i] is not None else None
+            snapshot.executemany(insert_sql, batch)
+            rows += len(batch)
+
+    for index_columns in (cluster_columns,) + indexes:
+        snapshot.execute(f"CREATE INDEX {table_name}__{'_'.join(index_columns)} ON {table_name} ({', '.join(index_columns)})")
+    return rows
+
+def export_analytics_snapshot(competitions: list = None, path: str = SNAPSHOT_PATH, conn=None) -> dict:
+    """Write every loaded dashboard table of competitions (all when None) to one SQLite file at path.
+
+    The tables are read in one repeatable-read transaction, so the snapshot is a consistent cut of the database
+    even while other loads commit. It is built next to path and renamed over it: readers that already have the
+    old file open keep reading it until they reopen, new readers get the new one. Returns rows per table."""
+    competitions = list(COMPETITIONS) if competitions is None else competitions
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_to_db()
+    cursor = conn.cursor()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    snapshot = None
+
+    try:
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY;")
+        tables = [(DATA_VERSIONS_TABLE, ('table_name', 'season'), ())]
+        for competition in competitions:
+            tables += snapshot_tables(competition)
+        tables = [table for table in tables if relation_kind(cursor, table[0]) is not None]
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        snapshot = sqlite3.connect(tmp_path)
+        # Nothing reads the file until it is renamed in, so it needs no journal; the one commit still syncs it to disk
+        snapshot.execute("PRAGMA journal_mode = OFF")
+
+        table_rows = {}
+        with track(f"export_snapshot {os.path.basename(path)}", rows_in=0) as metrics:
+            for table_name, cluster_columns, indexes in tables:
+                table_rows[table_name] = copy_table(conn, snapshot, table_name, cluster_columns, indexes)
+                metrics.rows_in += table_rows[table_name]
+            snapshot.execute("ANALYZE")
+            snapshot.commit()
+            metrics.rows_out = metrics.rows_in
+        snapshot.close()
+        snapshot = None
+        conn.commit()
+
+        with track('swap'):
+            os.replace(tmp_path, path)
+        logger.info(f"Wrote {len(table_rows)} tables to {path}")
+        return table_rows
+
+    except Exception as e:
+        conn.rollback()
+        if snapshot is not None:
+            snapshot.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise e
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+
+def open_analytics_snapshot(path: str = SNAPSHOT_PATH, mmap_size: int = SNAPSHOT_MMAP_SIZE) -> sqlite3.Connection:
+    """Open the snapshot read-only and memory mapped. The file is never changed in place, only replaced,
+    so SQLite can skip locking it; reopen to pick up a newer snapshot."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+    return conn
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    export_analytics_snapshot()
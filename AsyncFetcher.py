@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Asyncio engine for the per-game euroleague_api requests, with a token-bucket rate limit, retries and pooled connections per host
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from urllib.parse import urlencode, urlsplit
+
+import aiohttp
+import pandas as pd
+import requests
+
+from GameFetcher import CACHE_DIR, CURRENT_SEASON_TTL, GAME_METHODS, FetchUnit, add_game_columns, cache_path, read_cache, write_cache
+
+logger = logging.getLogger(__name__)
+
+API_BASE_URL = os.getenv("EUROLEAGUE_API_BASE_URL")
+RECORD_DIR = os.getenv("EUROLEAGUE_RECORD_DIR")
+REQUESTS_PER_SECOND = float(os.getenv("EUROLEAGUE_REQUESTS_PER_SECOND", "10"))
+BURST = 10
+CONNECTIONS_PER_HOST = 8
+MAX_RETRIES = 4
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30.0
+REQUEST_TIMEOUT = 60
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+HEADERS = {"Accept": "application/json"}
+
+_routing = threading.local()
+_routing_lock = threading.Lock()
+_routing_users = 0
+_original_get_requests = {}
+
+@dataclass
+class FetchStats:
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+
+class TokenBucket:
+    """Hands out `rate` tokens a second, letting up to `capacity` through at once after a quiet spell."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = None
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Waiters queue on the lock, so tokens go out in request order
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self.updated is not None:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class CapturedRequest(Exception):
+    """Raised in place of a euroleague_api request while game_request reads which URL the library would call."""
+
+    def __init__(self, url: str, params: dict):
+        super().__init__(url)
+        self.url = url
+        self.params = params
+
+def routed_get_requests(original):
+    def get_requests(url, params=None, headers=HEADERS):
+        if getattr(_routing, 'capture', False):
+            raise CapturedRequest(url, dict(params or {}))
+        responses = getattr(_routing, 'responses', None)
+        response = responses.get(request_key(url, params)) if responses is not None else None
+        if response is None:
+            if responses is not None:
+                logger.warning(f"No prefetched response for {url} {params}, requesting it directly.")
+            return original(url, params=params or {}, headers=headers)
+        if response.status_code != 200:
+            response.raise_for_status()
+        return response
+    return get_requests
+
+@contextmanager
+def routing_get_requests():
+    """Route euroleague_api's get_requests through this module while the block runs, and put the library's own
+    back when the last concurrent fetch leaves. Threads with nothing captured or prefetched still reach the API."""
+    global _routing_users
+    with _routing_lock:
+        if _routing_users == 0:
+            for name, module in list(sys.modules.items()):
+                original = getattr(module, 'get_requests', None)
+                if name.startswith('euroleague_api') and original is not None:
+                    _original_get_requests[name] = original
+                    module.get_requests = routed_get_requests(original)
+        _routing_users += 1
+    try:
+        yield
+    finally:
+        with _routing_lock:
+            _routing_users -= 1
+            if _routing_users == 0:
+                for name, original in _original_get_requests.items():
+                    sys.modules[name].get_requests = original
+                _original_get_requests.clear()
+
+def game_request(client, unit: FetchUnit) -> tuple:
+    """The URL and params euroleague_api requests for one game, read by calling the library with the request
+    intercepted, so the response can be replayed into its parser. Needs routing_get_requests."""
+    _routing.capture = True
+    try:
+        getattr(client, GAME_METHODS[unit.dataset])(unit.season, unit.gamecode)
+    except CapturedRequest as request:
+        return request.url, request.params
+    finally:
+        _routing.capture = False
+    raise ValueError(f"{GAME_METHODS[unit.dataset]} made no request for game {unit.gamecode}.")
+
+def request_key(url: str, params: dict) -> str:
+    # The host is left out so a stub server or another base URL serves the same responses
+    query = urlencode(sorted((str(name), str(value)) for name, value in (params or {}).items()))
+    return f"{urlsplit(url).path}?{query}"
+
+def recorded_paths(record_dir: str, key: str) -> tuple:
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    base = os.path.join(record_dir, digest[:2], digest)
+    return f"{base}.json", f"{base}.body"
+
+def record_response(record_dir: str, key: str, status: int, content_type: str, body: bytes):
+    meta_path, body_path = recorded_paths(record_dir, key)
+    os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+    with open(body_path, 'wb') as f:
+        f.write(body)
+    with open(meta_path, 'w') as f:
+        json.dump({'key': key, 'status': status, 'content_type': content_type}, f)
+
+def make_response(url: str, status: int, reason: str, headers: dict, body: bytes) -> requests.Response:
+    """A requests Response, built the way requests builds one, so the library parses it exactly as before."""
+    response = requests.Response()
+    response.url = url
+    response.status_code = status
+    response.reason = reason
+    response.headers.update(headers)
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response._content = body
+    return response
+
+@contextmanager
+def replayed_responses(responses: dict):
+    """Answer the calling thread's euroleague_api requests from responses. Needs routing_get_requests."""
+    _routing.responses = responses
+    try:
+        yield
+    finally:
+        _routing.responses = None
+
+def parse_unit(client, unit: FetchUnit, responses: dict, path: str) -> pd.DataFrame:
+    with replayed_responses(responses):
+        df = getattr(client, GAME_METHODS[unit.dataset])(unit.season, unit.gamecode)
+    add_game_columns(df, unit)
+    write_cache(path, df)
+    return df
+
+class AsyncFetcher:
+    """Concurrent GETs sharing one connection pool, with a token bucket and a connection cap per host.
+
+    Connection errors, timeouts and 429/5xx answers are retried with jittered exponential backoff,
+    honouring Retry-After. Other answers are returned as they are, for the caller to raise on."""
+
+    def __init__(self, rate: float = REQUESTS_PER_SECOND, burst: float = BURST, connections_per_host: int = CONNECTIONS_PER_HOST,
+                 max_retries: int = MAX_RETRIES, backoff: float = BACKOFF_SECONDS, max_backoff: float = MAX_BACKOFF_SECONDS,
+                 timeout: float = REQUEST_TIMEOUT, base_url: str = API_BASE_URL, record_dir: str = RECORD_DIR):
+        self.rate = rate
+        self.burst = burst
+        self.connections_per_host = connections_per_host
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.record_dir = record_dir
+        self.buckets = {}
+        self.stats = FetchStats()
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.connections_per_host)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                             headers=HEADERS)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    def target_url(self, url: str) -> str:
+        if self.base_url is None:
+            return url
+        return f"{self.base_url}{urlsplit(url).path}"
+
+    def backoff_seconds(self, attempt: int, retry_after: str = None) -> float:
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+        if retry_after is not None and retry_after.isdigit():
+            delay = max(delay, min(self.max_backoff, float(retry_after)))
+        return delay
+
+    async def throttle(self, host: str):
+        if not self.rate:
+            return
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.burst)
+        await self.buckets[host].acquire()
+
+    async def get(self, url: str, params: dict = None) -> requests.Response:
+        target = self.target_url(url)
+        query = {str(name): str(value) for name, value in (params or {}).items()}
+        for attempt in range(self.max_retries + 1):
+            await self.throttle(urlsplit(target).netloc)
+            self.stats.requests += 1
+            retry_after = None
+            try:
+                async with self.session.get(target, params=query) as r:
+                    body = await r.read()
+                    response = make_response(str(r.url), r.status, r.reason, r.headers, body)
+                    retry_after = r.headers.get('Retry-After')
+                if response.status_code not in RETRY_STATUSES:
+                    if self.record_dir:
+                        record_response(self.record_dir, request_key(url, params), response.status_code,
+                                        response.headers.get('Content-Type'), body)
+                    return response
+                error = f"HTTP {response.status_code}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                response = None
+                error = f"{type(e).__name__}: {e}"
+                if attempt == self.max_retries:
+                    self.stats.failures += 1
+                    raise
+
+            if attempt == self.max_retries:
+                self.stats.failures += 1
+                return response
+            self.stats.retries += 1
+            delay = self.backoff_seconds(attempt, retry_after)
+            logger.debug(f"GET {target} {query} failed ({error}), retry {attempt + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+async def fetch_unit_async(fetcher: AsyncFetcher, client, unit: FetchUnit, cache_dir: str, ttl: float):
+    path = cache_path(unit, cache_dir)
+    df = read_cache(path, unit.season, ttl)
+    if df is not None:
+        return df
+
+    try:
+        url, params = game_request(client, unit)
+        response = await fetcher.get(url, params)
+        # Parsing stays with euroleague_api, off the event loop, so the frames match the threaded fetch
+        return await asyncio.to_thread(parse_unit, client, unit, {request_key(url, params): response}, path)
+    except Exception as e:
+        logger.error(f"Fetching {unit.dataset} for game {unit.gamecode}, season {unit.season} failed: {e}. Skip and continue.")
+        return None
+
+async def fetch_frames_async(client, units: list, cache_dir: str = CACHE_DIR, ttl: float = CURRENT_SEASON_TTL, **fetcher_options) -> list:
+    with routing_get_requests():
+        async with AsyncFetcher(**fetcher_options) as fetcher:
+            frames = await asyncio.gather(*(fetch_unit_async(fetcher, client, unit, cache_dir, ttl) for unit in units))
+    logger.info(f"Async fetch made {fetcher.stats.requests} requests for {len(units)} games, "
+                f"{fetcher.stats.retries} retries, {fetcher.stats.failures} gave up")
+    return frames
+
+def fetch_frames(client, units: list, cache_dir: str = CACHE_DIR, ttl: float = CURRENT_SEASON_TTL, **fetcher_options) -> list:
+    """One frame per unit, None where the game could not be fetched, like GameFetcher.fetch_unit."""
+    return asyncio.run(fetch_frames_async(client, units, cache_dir, ttl, **fetcher_options))
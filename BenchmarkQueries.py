@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Compare dashboard query plans and timings on unindexed vs indexed/partitioned tables filled with synthetic rows
+
+import argparse
+import dataclasses
+import statistics
+import time
+
+from BulkLoader import connect_to_db
+from TableSchemas import GAME_LOGS_SCHEMA, SHOT_DATA_SCHEMA, create_table_sql, ensure_partitions
+
+SEASONS = list(range(2016, 2025))
+
+GAME_LOGS_FILL = """
+INSERT INTO {table} (player_id, player, team, gamecode, season, round, phase, game_sequence, points, row_type, row_number)
+SELECT
+    'P' || (g % {players}),
+    'Player ' || (g % {players}),
+    'T' || (g % 18),
+    (g / 30)::text,
+    {first_season} + (g % {seasons}),
+    (g / 30) % 34 + 1,
+    'RS',
+    g / ({players} * {seasons}) + 1,
+    g % 30,
+    CASE WHEN g % 15 = 0 THEN 'total' WHEN g % 15 = 1 THEN 'team' ELSE 'player' END,
+    1
+FROM generate_series(1, {rows}) AS g;
+"""
+
+SHOT_DATA_FILL = """
+INSERT INTO {table} (
+    season, phase, round, gamecode, num_anot, team_key, player_key, action_key, points, bin_key, fastbreak, second_chance
+)
+SELECT
+    {first_season} + (g % {seasons}),
+    'RS',
+    (g / 150) % 34 + 1,
+    (g / 150)::text,
+    g,
+    g % 18 + 1,
+    g % {players} + 1,
+    g % 12 + 1,
+    (ARRAY[0, 2, 3])[g % 3 + 1],
+    g % 13 + 1,
+    (g % 7 = 0)::int,
+    (g % 11 = 0)::int
+FROM generate_series(1, {rows}) AS g;
+"""
+
+QUERIES = {
+    'player_game_log': (
+        'game_logs',
+        "SELECT * FROM {table} WHERE player_id = 'P42' AND season = 2023 ORDER BY game_sequence",
+    ),
+    'team_round': (
+        'game_logs',
+        "SELECT * FROM {table} WHERE team = 'T3' AND season = 2022 AND round = 10",
+    ),
+    'season_totals': (
+        'game_logs',
+        "SELECT team, SUM(points) FROM {table} WHERE season = 2024 AND row_type = 'total' GROUP BY team",
+    ),
+    'player_shot_zones': (
+        'shot_data',
+        "SELECT bin_key, COUNT(*), SUM(points) FROM {table} WHERE player_key = 43 AND season = 2023 GROUP BY bin_key",
+    ),
+    'team_shot_zones': (
+        'shot_data',
+        "SELECT bin_key, COUNT(*), SUM(points) FROM {table} WHERE team_key = 4 AND season = 2023 GROUP BY bin_key",
+    ),
+}
+
+def create_benchmark_tables(cursor, variant: str, game_log_rows: int, shot_rows: int, players: int):
+    tuned = variant == 'tuned'
+    for dataset, schema, fill_sql, rows in [
+        ('game_logs', GAME_LOGS_SCHEMA, GAME_LOGS_FILL, game_log_rows),
+        ('shot_data', SHOT_DATA_SCHEMA, SHOT_DATA_FILL, shot_rows),
+    ]:
+        table_name = f"bench_{dataset}_{variant}"
+        if not tuned:
+            schema = dataclasses.replace(schema, indexes=())
+        cursor.execute(create_table_sql(table_name, schema, drop_existing=True, partitioned=tuned))
+        ensure_partitions(cursor, table_name, SEASONS)
+        cursor.execute(fill_sql.format(table=table_name, rows=rows, players=players,
+                                       first_season=SEASONS[0], seasons=len(SEASONS)))
+        cursor.execute(f"ANALYZE {table_name};")
+
+def time_query(cursor, sql: str, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        cursor.execute(sql)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def explain_query(cursor, sql: str) -> str:
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}")
+    return '\n'.join(row[0] for row in cursor.fetchall())
+
+def run_benchmark(game_log_rows: int, shot_rows: int, players: int, repeats: int, show_plans: bool, keep_tables: bool):
+    conn = connect_to_db()
+    cursor = conn.cursor()
+
+    try:
+        for variant in ['baseline', 'tuned']:
+            start = time.perf_counter()
+            create_benchmark_tables(cursor, variant, game_log_rows, shot_rows, players)
+            conn.commit()
+            print(f"Built {variant} tables in {time.perf_counter() - start:.1f}s")
+
+        print(f"\n{'query':<20}{'baseline ms':>14}{'tuned ms':>12}{'speedup':>10}")
+        for name, (dataset, sql) in QUERIES.items():
+            timings = {}
+            for variant in ['baseline', 'tuned']:
+                variant_sql = sql.format(table=f"bench_{dataset}_{variant}")
+                timings[variant] = time_query(cursor, variant_sql, repeats)
+                if show_plans:
+                    print(f"\n-- {name} ({variant})\n{explain_query(cursor, variant_sql)}")
+            speedup = timings['baseline'] / timings['tuned'] if timings['tuned'] > 0 else float('inf')
+            print(f"{name:<20}{timings['baseline']:>14.2f}{timings['tuned']:>12.2f}{speedup:>9.1f}x")
+
+        if not keep_tables:
+            for dataset in ['game_logs', 'shot_data']:
+                for variant in ['baseline', 'tuned']:
+                    cursor.execute(f"DROP TABLE IF EXISTS bench_{dataset}_{variant};")
+            conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dashboard queries against a local Postgres (DATABASE_URL).")
+    parser.add_argument('--game-log-rows', type=int, default=500_000)
+    parser.add_argument('--shot-rows', type=int, default=1_000_000)
+    parser.add_argument('--players', type=int, default=2_000)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--plans', action='store_true', help="Print EXPLAIN (ANALYZE, BUFFERS) for every query.")
+    parser.add_argument('--keep-tables', action='store_true')
+    args = parser.parse_args(argv)
+
+    run_benchmark(args.game_log_rows, args.shot_rows, args.players, args.repeats, args.plans, args.keep_tables)
+
+if __name__ == "__main__":
+    main()
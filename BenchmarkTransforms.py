@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Time and memory-profile the transform stages offline on synthetic data, and compare runs across commits
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+import GameLogs
+import ScheduleResults
+import ShotData
+from BulkLoader import CsvRowStream
+from SyntheticData import generate_boxscores, generate_game_reports, generate_shots
+from TableSchemas import GAME_LOGS_SCHEMA, SHOT_DATA_SCHEMA, SHOT_DIMENSIONS, iter_rows, prepare_frame
+
+ROW_WISE_LIMIT = 20_000
+MIN_REGRESSION_SECONDS = 0.01
+
+@dataclass(frozen=True)
+class Benchmark:
+    name: str
+    dataset: str
+    func: Callable
+
+def render_copy_rows(df: pd.DataFrame, schema) -> int:
+    """Everything copy_upsert does before the bytes reach Postgres."""
+    row_stream = CsvRowStream(iter_rows(prepare_frame(df, schema)))
+    while row_stream.read(1 << 16):
+        pass
+    return row_stream.row_count
+
+def with_dimension_codes(shots_df: pd.DataFrame) -> pd.DataFrame:
+    """Category codes stand in for the dimension keys the load looks up in Postgres."""
+    for dimension in SHOT_DIMENSIONS:
+        shots_df[dimension.key] = shots_df[dimension.source].astype('category').cat.codes + 1
+    return shots_df
+
+def classify_zones_row_wise(shots_df: pd.DataFrame) -> pd.Series:
+    return shots_df.head(ROW_WISE_LIMIT).apply(ShotData.classify_zones, axis=1, court_params=ShotData.COURT_PARAMS)
+
+def sort_for_game_sequence(boxscores_df: pd.DataFrame) -> pd.DataFrame:
+    return boxscores_df.sort_values(['Player', 'Season', 'Round'], ascending=[True, False, False])
+
+BENCHMARKS = [
+    Benchmark('classify_shots', 'shots', ShotData.classify_shots),
+    Benchmark('classify_zones', 'classified_shots', classify_zones_row_wise),
+    Benchmark('classify_zones_vectorized', 'classified_shots',
+              lambda df: ShotData.classify_zones_vectorized(df, ShotData.COURT_PARAMS)),
+    Benchmark('transform_shot_data', 'shots', ShotData.transform_shot_data),
+    Benchmark('calculate_game_sequence', 'sorted_boxscores', GameLogs.calculate_game_sequence),
+    Benchmark('transform_game_logs', 'boxscores', GameLogs.transform_game_logs),
+    Benchmark('calculate_player_trends', 'game_logs', GameLogs.calculate_player_trends),
+    Benchmark('calculate_advanced_stats', 'game_logs', lambda df: len(GameLogs.calculate_advanced_stats(df)[0])),
+    Benchmark('create_team_records_dataset', 'game_reports',
+              lambda df: ScheduleResults.create_team_records_dataset(df, 'E')),
+    Benchmark('render_game_logs_rows', 'game_logs',
+              lambda df: render_copy_rows(GameLogs.add_row_keys(df), GAME_LOGS_SCHEMA)),
+    Benchmark('render_shot_data_rows', 'transformed_shots', lambda df: render_copy_rows(df, SHOT_DATA_SCHEMA)),
+]
+
+def build_datasets(n_seasons: int, seed: int) -> dict:
+    shots = generate_shots(n_seasons, seed=seed)
+    boxscores = generate_boxscores(n_seasons, seed=seed)
+    classified_shots = ShotData.classify_shots(shots)
+    return {
+        'shots': shots,
+        'classified_shots': classified_shots,
+        'transformed_shots': with_dimension_codes(ShotData.transform_shot_data(shots.copy())),
+        'boxscores': boxscores,
+        'sorted_boxscores': sort_for_game_sequence(boxscores),
+        'game_logs': GameLogs.transform_game_logs(boxscores.copy()),
+        'game_reports': generate_game_reports(n_seasons, seed=seed),
+    }
+
+def output_rows(output) -> int:
+    if isinstance(output, (pd.DataFrame, pd.Series)):
+        return len(output)
+    return int(output)
+
+def run_benchmark(benchmark: Benchmark, input_df: pd.DataFrame, repeats: int) -> dict:
+    timings = []
+    for _ in range(repeats):
+        df = input_df.copy()
+        start = time.perf_counter()
+        output = benchmark.func(df)
+        timings.append(time.perf_counter() - start)
+
+    df = input_df.copy()
+    tracemalloc.start()
+    benchmark.func(df)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rows_in = min(len(input_df), ROW_WISE_LIMIT) if benchmark.name == 'classify_zones' else len(input_df)
+    return {
+        'stage': benchmark.name,
+        'rows_in': rows_in,
+        'rows_out': output_rows(output),
+        'seconds_median': statistics.median(timings),
+        'seconds_min': min(timings),
+        'rows_per_second': rows_in / statistics.median(timings) if statistics.median(timings) > 0 else None,
+        'peak_memory_mb': peak_bytes / 2 ** 20,
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(seasons: list, repeats: int, stages: list = None, seed: int = 0) -> dict:
+    results = []
+    for n_seasons in seasons:
+        start = time.perf_counter()
+        datasets = build_datasets(n_seasons, seed)
+        print(f"Generated {n_seasons} season(s) of synthetic data in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        for benchmark in BENCHMARKS:
+            if stages and benchmark.name not in stages:
+                continue
+            result = run_benchmark(benchmark, datasets[benchmark.dataset], repeats)
+            result['seasons'] = n_seasons
+            results.append(result)
+            print(f"{n_seasons:>4} seasons  {benchmark.name:<28}{result['seconds_median']:>9.3f}s"
+                  f"{result['peak_memory_mb']:>10.1f} MB", file=sys.stderr)
+
+    return {
+        'commit': git_commit(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'repeats': repeats,
+        'results': results,
+    }
+
+def compare_results(current: dict, baseline: dict, threshold: float) -> list:
+    baseline_results = {(result['stage'], result['seasons']): result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        previous = baseline_results.get((result['stage'], result['seasons']))
+        if previous is None or previous['seconds_min'] <= 0:
+            continue
+        # Best-of-N timings are far less noisy than medians, and millisecond stages jitter by more than the threshold
+        ratio = result['seconds_min'] / previous['seconds_min']
+        slower = ratio > 1 + threshold and result['seconds_min'] - previous['seconds_min'] > MIN_REGRESSION_SECONDS
+        flag = 'REGRESSION' if slower else ''
+        print(f"{result['seasons']:>4} seasons  {result['stage']:<28}{previous['seconds_min']:>9.3f}s"
+              f" -> {result['seconds_min']:>8.3f}s  {ratio:>5.2f}x  {flag}", file=sys.stderr)
+        if flag:
+            regressions.append(result['stage'])
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the transform stages on synthetic EuroLeague-shaped data.")
+    parser.add_argument('--seasons', type=int, nargs='+', default=[1], help="Scales to run, e.g. 1 10 100.")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--stages', nargs='+', choices=[benchmark.name for benchmark in BENCHMARKS])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the JSON results here instead of stdout.")
+    parser.add_argument('--compare', help="A previous JSON result to compare against.")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Slowdown ratio above which a stage counts as a regression.")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.seasons, args.repeats, args.stages, args.seed)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare_results(results, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
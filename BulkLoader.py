@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Stream rows into Postgres with COPY and merge them with one INSERT ... ON CONFLICT
+
+import io
+import logging
+import math
+import os
+import time
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+logger = logging.getLogger(__name__)
+
+def connect_to_db():
+    conn_str = os.getenv("DATABASE_URL")
+    if not conn_str:
+        raise ValueError("DATABASE_URL environment variable not set.")
+    return psycopg2.connect(conn_str)
+
+def create_connection_pool(max_connections: int) -> ThreadedConnectionPool:
+    conn_str = os.getenv("DATABASE_URL")
+    if not conn_str:
+        raise ValueError("DATABASE_URL environment variable not set.")
+    return ThreadedConnectionPool(1, max_connections, conn_str)
+
+def lock_shared_table(cursor, table_name: str):
+    """Serialize CREATE TABLE IF NOT EXISTS on a table that concurrent jobs share; held until commit."""
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (table_name,))
+
+def format_csv_value(val) -> str:
+    if val is None or (isinstance(val, float) and math.isnan(val)):
+        return ''
+    if isinstance(val, str):
+        return '"' + val.replace('"', '""') + '"'
+    return str(val)
+
+class CsvRowStream(io.TextIOBase):
+    """File-like object that renders rows as CSV lines only when COPY reads them."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = ''
+        self.row_count = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.buffer += ','.join(format_csv_value(val) for val in row) + '\n'
+            self.row_count += 1
+
+        if size < 0:
+            chunk, self.buffer = self.buffer, ''
+        else:
+            chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+def copy_upsert(cursor, table_name: str, columns: list, rows, conflict_columns: list, update_columns: list = None) -> int:
+    if update_columns is None:
+        update_columns = [col for col in columns if col not in conflict_columns]
+
+    staging_table = f"{table_name}_staging"
+    column_list = ', '.join(columns)
+    start = time.perf_counter()
+
+    cursor.execute(f"""
+    DROP TABLE IF EXISTS pg_temp.{staging_table};
+    CREATE TEMP TABLE {staging_table} ON COMMIT DROP AS
+        SELECT {column_list} FROM {table_name} WITH NO DATA;
+    """)
+
+    row_stream = CsvRowStream(rows)
+    cursor.copy_expert(f"COPY {staging_table} ({column_list}) FROM STDIN WITH (FORMAT csv)", row_stream)
+
+    update_set = ',\n        '.join(f"{col} = EXCLUDED.{col}" for col in update_columns)
+    # Skip rows that would be rewritten with identical values, so they leave no dead tuple or WAL behind
+    changed = (f"({', '.join(f'target.{col}' for col in update_columns)}) IS DISTINCT FROM "
+               f"({', '.join(f'EXCLUDED.{col}' for col in update_columns)})")
+    conflict_action = f"DO UPDATE SET\n        {update_set}\n    WHERE {changed}" if update_columns else "DO NOTHING"
+    cursor.execute(f"""
+    INSERT INTO {table_name} AS target ({column_list})
+    SELECT {column_list} FROM {staging_table}
+    ON CONFLICT ({', '.join(conflict_columns)}) {conflict_action};
+    DROP TABLE pg_temp.{staging_table};
+    """)
+
+    elapsed = time.perf_counter() - start
+    rows_per_second = row_stream.row_count / elapsed if elapsed > 0 else float('inf')
+    logger.info(f"Loaded {row_stream.row_count} rows into {table_name} in {elapsed:.2f}s ({rows_per_second:,.0f} rows/s)")
+    return row_stream.row_count
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Registry of the competitions the pipelines load: API code, table names, phase order and the seasons each dataset covers
+
+from dataclasses import dataclass
+from functools import cached_property
+
+DATASETS = ('game_logs', 'schedule_results', 'shot_data')
+
+@dataclass(frozen=True)
+class Competition:
+    code: str
+    slug: str
+    name: str
+    phases: tuple
+    postseason_phases: tuple
+    season_ranges: tuple
+
+    @cached_property
+    def phase_order(self) -> dict:
+        return {phase: order for order, phase in enumerate(self.phases)}
+
+    def table_name(self, dataset: str) -> str:
+        if dataset not in DATASETS:
+            raise ValueError(f"Unknown dataset {dataset}, expected one of {', '.join(DATASETS)}.")
+        return f"{dataset}_{self.slug}"
+
+    def season_range(self, dataset: str, start_season: int = None, end_season: int = None) -> tuple:
+        """The first and last season loaded for dataset, unless overridden."""
+        first_season, last_season = dict(self.season_ranges)[dataset]
+        return start_season or first_season, end_season or last_season
+
+COMPETITIONS = {
+    competition.code: competition for competition in (
+        Competition(
+            code='E',
+            slug='euroleague',
+            name='Euroleague',
+            phases=('RS', 'PI', 'PO', 'FF'),
+            postseason_phases=('PI', 'PO', 'FF'),
+            season_ranges=(('game_logs', (2016, 2024)), ('schedule_results', (2017, 2024)), ('shot_data', (2017, 2024))),
+        ),
+        Competition(
+            code='U',
+            slug='eurocup',
+            name='Eurocup',
+            phases=('RS', '8F', '4F'),
+            postseason_phases=('8F', '4F'),
+            season_ranges=(('game_logs', (2016, 2024)), ('schedule_results', (2017, 2024)), ('shot_data', (2017, 2024))),
+        ),
+    )
+}
+
+def get_competition(competition) -> Competition:
+    """Accept a registered code such as 'E' or a Competition, and return the Competition."""
+    if isinstance(competition, Competition):
+        return competition
+    if competition not in COMPETITIONS:
+        raise ValueError(f"Invalid competition {competition}. Must be one of {', '.join(COMPETITIONS)}.")
+    return COMPETITIONS[competition]
+
+# Tables derived from a competition's shot_data table, kept here so readers can name them without the ETL modules
+def shot_facts_table_name(table_name: str) -> str:
+    return table_name.replace('shot_data_', 'shot_facts_', 1)
+
+def shot_zone_table_names(table_name: str) -> tuple:
+    return table_name.replace('shot_data_', 'shot_zones_team_'), table_name.replace('shot_data_', 'shot_zones_player_')
+
+def shot_grid_table_names(table_name: str) -> tuple:
+    return (table_name.replace('shot_data_', 'shot_grids_league_'), table_name.replace('shot_data_', 'shot_grids_team_'),
+            table_name.replace('shot_data_', 'shot_grids_player_'))
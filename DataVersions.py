@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Per (table, season) data versions, bumped by the loaders in the transaction that commits the rows, for read-side caches
+
+from BulkLoader import lock_shared_table
+
+DATA_VERSIONS_TABLE = 'data_versions'
+
+def create_data_versions_table(cursor):
+    lock_shared_table(cursor, DATA_VERSIONS_TABLE)
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {DATA_VERSIONS_TABLE} (
+        table_name TEXT,
+        season INTEGER,
+        version BIGINT NOT NULL DEFAULT 1,
+        updated_at TIMESTAMPTZ DEFAULT now(),
+        PRIMARY KEY(table_name, season)
+    );
+    """)
+
+def bump_data_versions(cursor, table_name: str, seasons, replace_table: bool = False):
+    """Bump the version of every season of table_name a load wrote, in the load's own transaction.
+
+    A full reload (replace_table) may also have deleted seasons it no longer has, so every season
+    versioned before is bumped too."""
+    seasons = sorted({int(season) for season in seasons})
+    create_data_versions_table(cursor)
+    cursor.execute(f"""
+    INSERT INTO {DATA_VERSIONS_TABLE} (table_name, season)
+    SELECT %s, season FROM unnest(%s::INTEGER[]) AS season
+    ON CONFLICT (table_name, season) DO UPDATE SET
+        version = {DATA_VERSIONS_TABLE}.version + 1,
+        updated_at = now();
+    """, (table_name, seasons))
+    if replace_table:
+        cursor.execute(f"""
+        UPDATE {DATA_VERSIONS_TABLE} SET version = version + 1, updated_at = now()
+        WHERE table_name = %s AND season <> ALL(%s::INTEGER[]);
+        """, (table_name, seasons))
+
+def fetch_data_versions(cursor) -> dict:
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (DATA_VERSIONS_TABLE,))
+    if not cursor.fetchone()[0]:
+        return {}
+    cursor.execute(f"SELECT table_name, season, version FROM {DATA_VERSIONS_TABLE}")
+    return {(table_name, season): version for table_name, season, version in cursor.fetchall()}
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Per-stage timings, row counts, dropped rows and memory for the ETL jobs, reported as JSON and an etl_runs row
+
+import cProfile
+import datetime
+import json
+import logging
+import os
+import re
+import resource
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+import pandas as pd
+
+from BulkLoader import connect_to_db, lock_shared_table
+
+logger = logging.getLogger(__name__)
+
+REPORT_DIR = os.getenv("ETL_REPORT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "etl_reports"))
+PROFILE_STAGE = os.getenv("ETL_PROFILE_STAGE")
+ETL_RUNS_TABLE = 'etl_runs'
+
+_local = threading.local()
+
+@dataclass
+class StageMetrics:
+    name: str
+    parent: str = None
+    rows_in: int = None
+    rows_out: int = None
+    dropped: dict = field(default_factory=dict)
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    rss_mb: float = 0.0
+    rss_growth_mb: float = 0.0
+    status: str = 'running'
+    error: str = None
+    profile_path: str = None
+
+    def drop(self, count: int, reason: str):
+        if count:
+            self.dropped[reason] = self.dropped.get(reason, 0) + int(count)
+
+@dataclass
+class RunReport:
+    job: str
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    started_at: str = field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc).isoformat())
+    finished_at: str = None
+    status: str = 'running'
+    wall_seconds: float = 0.0
+    stages: list = field(default_factory=list)
+    profile_stage: str = None
+    report_dir: str = REPORT_DIR
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def current_rss_mb() -> float:
+    """Resident memory of the process right now, which unlike ru_maxrss goes down again when a stage frees memory."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE / (1024 * 1024)
+    except OSError:
+        # No /proc (macOS): the high-water mark is the best there is
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def row_count(obj) -> int:
+    if isinstance(obj, (pd.DataFrame, pd.Series, list, tuple)):
+        return len(obj)
+    return None
+
+def current_report() -> RunReport:
+    return getattr(_local, 'report', None)
+
+def profile_path(report: RunReport, stage_name: str) -> str:
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', stage_name)
+    return os.path.join(report.report_dir, f"{report.run_id}-{safe_name}.prof")
+
+@contextmanager
+def track(name: str, rows_in: int = None, threaded: bool = False):
+    """Time one stage and add it to the run report active on this thread, if any.
+
+    cpu_seconds is the CPU used by the calling thread, or with threaded, by the whole process, for stages that
+    fan out to their own threads (concurrent stages then count too). rss_mb is the resident memory when the
+    stage ended and rss_growth_mb how much it changed over the stage, negative when the stage freed memory."""
+    report = current_report()
+    open_stages = getattr(_local, 'open_stages', [])
+    metrics = StageMetrics(name, parent=open_stages[-1] if open_stages else None, rows_in=rows_in)
+    _local.open_stages = open_stages + [name]
+
+    profiler = None
+    if report is not None and report.profile_stage in (name, name.split(' ')[0]):
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    cpu_clock = time.process_time if threaded else time.thread_time
+    start_rss = current_rss_mb()
+    start_wall = time.perf_counter()
+    start_cpu = cpu_clock()
+    try:
+        yield metrics
+        metrics.status = 'done'
+    except Exception as e:
+        metrics.status = 'failed'
+        metrics.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _local.open_stages = open_stages
+        metrics.wall_seconds = time.perf_counter() - start_wall
+        metrics.cpu_seconds = cpu_clock() - start_cpu
+        metrics.rss_mb = current_rss_mb()
+        metrics.rss_growth_mb = metrics.rss_mb - start_rss
+
+        if profiler is not None:
+            profiler.disable()
+            metrics.profile_path = profile_path(report, name)
+            os.makedirs(report.report_dir, exist_ok=True)
+            profiler.dump_stats(metrics.profile_path)
+
+        if report is not None:
+            report.stages.append(metrics)
+        dropped = ''.join(f", dropped {count} ({reason})" for reason, count in metrics.dropped.items())
+        logger.info(
+            f"{name} {metrics.status} in {metrics.wall_seconds:.2f}s (cpu {metrics.cpu_seconds:.2f}s), "
+            f"rows {metrics.rows_in} -> {metrics.rows_out}{dropped}, RSS {metrics.rss_mb:.0f} MB ({metrics.rss_growth_mb:+.0f} MB)"
+        )
+
+@contextmanager
+def run_report(job: str, persist: bool = True, profile_stage: str = PROFILE_STAGE, report_dir: str = REPORT_DIR):
+    """Collect every stage tracked on this thread into one report, then write it out."""
+    previous = current_report()
+    report = RunReport(job, profile_stage=profile_stage, report_dir=report_dir)
+    _local.report = report
+    start = time.perf_counter()
+    try:
+        yield report
+        report.status = 'failed' if any(stage.status == 'failed' for stage in report.stages) else 'done'
+    except Exception:
+        report.status = 'failed'
+        raise
+    finally:
+        _local.report = previous
+        report.wall_seconds = time.perf_counter() - start
+        report.finished_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        if persist:
+            save_report(report)
+
+def write_report_json(report: RunReport) -> str:
+    os.makedirs(report.report_dir, exist_ok=True)
+    path = os.path.join(report.report_dir, f"{report.job.replace(':', '_')}-{report.run_id}.json")
+    with open(path, 'w') as f:
+        json.dump(asdict(report), f, indent=2)
+    return path
+
+def record_etl_run(report: RunReport, conn=None):
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_to_db()
+    cursor = conn.cursor()
+
+    try:
+        lock_shared_table(cursor, ETL_RUNS_TABLE)
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ETL_RUNS_TABLE} (
+            run_id TEXT PRIMARY KEY,
+            job TEXT,
+            status TEXT,
+            started_at TIMESTAMPTZ,
+            finished_at TIMESTAMPTZ,
+            wall_seconds REAL,
+            report JSONB
+        );
+        """)
+        cursor.execute(f"""
+        INSERT INTO {ETL_RUNS_TABLE} (run_id, job, status, started_at, finished_at, wall_seconds, report)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (run_id) DO UPDATE SET
+            status = EXCLUDED.status,
+            finished_at = EXCLUDED.finished_at,
+            wall_seconds = EXCLUDED.wall_seconds,
+            report = EXCLUDED.report;
+        """, (report.run_id, report.job, report.status, report.started_at, report.finished_at,
+              report.wall_seconds, json.dumps(asdict(report))))
+        conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+
+def save_report(report: RunReport):
+    # A failed report must never hide the outcome of the job itself, so only log here
+    try:
+        logger.info(f"Wrote {report.job} run report to {write_report_json(report)}")
+    except OSError as e:
+        logger.error(f"Writing the {report.job} run report failed: {e}")
+    try:
+        record_etl_run(report)
+    except Exception as e:
+        logger.error(f"Recording the {report.job} run in {ETL_RUNS_TABLE} failed: {e}")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Local HTTP stub that replays responses recorded by AsyncFetcher, with injected latency and failures, for offline fetch runs
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from AsyncFetcher import recorded_paths, request_key
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status: int, body: bytes, content_type: str = 'application/json', headers: dict = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        key = request_key(url.path, dict(parse_qsl(url.query)))
+        with server.lock:
+            server.stats['requests'] += 1
+            roll = server.random.random()
+            delay = server.latency + server.random.uniform(0, server.jitter)
+
+        time.sleep(delay)
+        if roll < server.disconnect_rate:
+            with server.lock:
+                server.stats['disconnects'] += 1
+            self.close_connection = True
+            self.connection.close()
+            return
+        if roll < server.disconnect_rate + server.failure_rate:
+            with server.lock:
+                server.stats['failures'] += 1
+            retry_after = {'Retry-After': '1'} if server.failure_status == 429 else None
+            self.send_body(server.failure_status, b'{"error": "injected failure"}', headers=retry_after)
+            return
+
+        meta_path, body_path = recorded_paths(server.responses_dir, key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            with server.lock:
+                server.stats['missing'] += 1
+            self.send_body(404, f'{{"error": "no recorded response for {key}"}}'.encode('utf-8'))
+            return
+        self.send_body(meta['status'], body, meta.get('content_type') or 'application/json')
+
+def start_stub_server(responses_dir: str, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                      failure_rate: float = 0.0, failure_status: int = 503, disconnect_rate: float = 0.0,
+                      seed: int = None) -> ThreadingHTTPServer:
+    """Serve in a daemon thread; the bound address is server.server_address and server.stats counts what happened."""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.responses_dir = responses_dir
+    server.latency = latency
+    server.jitter = jitter
+    server.failure_rate = failure_rate
+    server.failure_status = failure_status
+    server.disconnect_rate = disconnect_rate
+    server.random = random.Random(seed)
+    server.lock = threading.Lock()
+    server.stats = {'requests': 0, 'failures': 0, 'disconnects': 0, 'missing': 0}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def stub_base_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded euroleague_api responses over HTTP.")
+    parser.add_argument('responses_dir', help="A directory written by AsyncFetcher with EUROLEAGUE_RECORD_DIR set.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response.")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Up to this many more seconds, at random.")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Share of requests answered with --failure-status.")
+    parser.add_argument('--failure-status', type=int, default=503)
+    parser.add_argument('--disconnect-rate', type=float, default=0.0, help="Share of requests dropped without an answer.")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    server = start_stub_server(args.responses_dir, args.host, args.port, args.latency, args.jitter, args.failure_rate,
+                               args.failure_status, args.disconnect_rate, args.seed)
+    print(f"Replaying {args.responses_dir} on {stub_base_url(server)}, "
+          f"run the pipeline with EUROLEAGUE_FETCH_ENGINE=async EUROLEAGUE_API_BASE_URL={stub_base_url(server)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Parallel, resumable per-game fetching from euroleague_api with an on-disk raw-response cache
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import pandas as pd
+
+from EtlMetrics import track
+from RawSnapshots import write_season_snapshots
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("EUROLEAGUE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".euroleague_cache"))
+CURRENT_SEASON_TTL = 12 * 60 * 60
+MAX_WORKERS = 8
+FETCH_ENGINE = os.getenv("EUROLEAGUE_FETCH_ENGINE", "threads")
+
+GAME_METHODS = {
+    'boxscore': 'get_player_boxscore_stats_data',
+    'shots': 'get_game_shot_data',
+    'game_report': 'get_game_report',
+}
+
+@dataclass(frozen=True)
+class FetchUnit:
+    competition: str
+    dataset: str
+    season: int
+    gamecode: int
+    phase: str = None
+    round: int = None
+
+    def cache_key(self) -> str:
+        key = json.dumps([self.competition, self.dataset, self.season, self.gamecode])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def current_season(today: datetime.date = None) -> int:
+    today = today or datetime.date.today()
+    return today.year if today.month >= 8 else today.year - 1
+
+def cache_path(unit: FetchUnit, cache_dir: str) -> str:
+    key = unit.cache_key()
+    return os.path.join(cache_dir, unit.competition, unit.dataset, str(unit.season), key[:2], f"{key}.pkl.gz")
+
+def read_cache(path: str, season: int, ttl: float):
+    if not os.path.exists(path):
+        return None
+    if season >= current_season() and time.time() - os.path.getmtime(path) > ttl:
+        return None
+    return pd.read_pickle(path, compression='gzip')
+
+def write_cache(path: str, df: pd.DataFrame):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    df.to_pickle(tmp_path, compression='gzip')
+    os.replace(tmp_path, path)
+
+def season_fetch_units(client, dataset: str, season: int, cache_dir: str = CACHE_DIR, ttl: float = CURRENT_SEASON_TTL) -> list:
+    listing_unit = FetchUnit(client.competition, 'gamecodes', season, 0)
+    path = cache_path(listing_unit, cache_dir)
+    game_codes_df = read_cache(path, season, ttl)
+    if game_codes_df is None:
+        game_codes_df = client.get_gamecodes_season(season)
+        game_codes_df = game_codes_df[game_codes_df['played']]
+        game_codes_df = (
+            game_codes_df[['Phase', 'Round', 'gameCode']]
+            .drop_duplicates().sort_values(['gameCode', 'Round'])
+            .reset_index(drop=True)
+        )
+        write_cache(path, game_codes_df)
+
+    return [
+        FetchUnit(client.competition, dataset, season, int(game['gameCode']), game['Phase'], int(game['Round']))
+        for _, game in game_codes_df.iterrows()
+    ]
+
+def evict_cache(units: list, cache_dir: str = CACHE_DIR):
+    """Drop the cached frames of units, e.g. games rescored since they were cached, so the next fetch refetches them."""
+    for unit in units:
+        path = cache_path(unit, cache_dir)
+        if os.path.exists(path):
+            os.remove(path)
+
+def fetch_unit(client, unit: FetchUnit, cache_dir: str = CACHE_DIR, ttl: float = CURRENT_SEASON_TTL):
+    path = cache_path(unit, cache_dir)
+    df = read_cache(path, unit.season, ttl)
+    if df is not None:
+        return df
+
+    try:
+        df = getattr(client, GAME_METHODS[unit.dataset])(unit.season, unit.gamecode)
+    except Exception as e:
+        logger.error(f"Fetching {unit.dataset} for game {unit.gamecode}, season {unit.season} failed: {e}. Skip and continue.")
+        return None
+
+    add_game_columns(df, unit)
+    write_cache(path, df)
+    return df
+
+def add_game_columns(df: pd.DataFrame, unit: FetchUnit) -> pd.DataFrame:
+    if not df.empty:
+        if 'Phase' not in df.columns and unit.phase is not None:
+            df.insert(1, 'Phase', unit.phase)
+        if 'Round' not in df.columns and unit.round is not None:
+            df.insert(2, 'Round', unit.round)
+    return df
+
+def fetch_units(client, units: list, max_workers: int = MAX_WORKERS, cache_dir: str = CACHE_DIR, ttl: float = CURRENT_SEASON_TTL,
+                engine: str = None) -> pd.DataFrame:
+    dataset = units[0].dataset if units else 'games'
+    engine = engine or FETCH_ENGINE
+    if engine not in ('threads', 'async'):
+        raise ValueError(f"Unknown fetch engine {engine}, expected 'threads' or 'async'.")
+
+    with track(f"fetch {dataset}", rows_in=len(units), threaded=True) as metrics:
+        if engine == 'async':
+            # Imported here so aiohttp is only needed when the async engine is picked
+            from AsyncFetcher import fetch_frames
+            frames = fetch_frames(client, units, cache_dir, ttl)
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                frames = list(executor.map(lambda unit: fetch_unit(client, unit, cache_dir, ttl), units))
+
+        metrics.drop(sum(df is None for df in frames), 'game fetch failed')
+        metrics.drop(sum(df is not None and df.empty for df in frames), 'game returned no rows')
+        frames = [df for df in frames if df is not None and not df.empty]
+        fetched_df = pd.concat(frames, axis=0, ignore_index=True) if frames else pd.DataFrame([])
+        metrics.rows_out = len(fetched_df)
+    return fetched_df
+
+def fetch_seasons(client, dataset: str, start_season: int, end_season: int, max_workers: int = MAX_WORKERS,
+                  cache_dir: str = CACHE_DIR, ttl: float = CURRENT_SEASON_TTL, engine: str = None) -> pd.DataFrame:
+    units = []
+    for season in range(start_season, end_season + 1):
+        units.extend(season_fetch_units(client, dataset, season, cache_dir, ttl))
+    logger.info(f"Fetching {len(units)} {dataset} games for {client.competition} {start_season}-{end_season}")
+    fetched_df = fetch_units(client, units, max_workers, cache_dir, ttl, engine)
+    write_season_snapshots(client.competition, dataset, fetched_df)
+    return fetched_df
@@ -7,218 +7,440 @@
 # Insert Gamelogs into Neon Database 
 
 import pandas as pd
+import numpy as np
 from euroleague_api.boxscore_data import BoxScoreData
-import psycopg2
 from psycopg2.extras import execute_values
-import os
 
-def calculate_game_sequence(df: pd.DataFrame) -> pd.DataFrame:
+from BulkLoader import connect_to_db, lock_shared_table
+from Competitions import get_competition
+from DataVersions import bump_data_versions
+from EtlMetrics import run_report, track
+from GameFetcher import CACHE_DIR, FetchUnit, evict_cache, fetch_seasons, fetch_units
+from TableSchemas import (
+    ADVANCED_GAME_STATS_SCHEMA, ADVANCED_SEASON_STATS_SCHEMA, GAME_LOGS_SCHEMA, PLAYER_TRENDS_SCHEMA, TREND_STATS,
+    TREND_WINDOWS, create_table_sql, upsert_frame
+)
+from TableSwap import shadow_table_name, swap_in_shadow_tables
+
+SYNC_STATE_TABLE = 'game_logs_sync_state'
+TREND_SOURCE_COLUMNS = {
+    'Season': 'season', 'Phase': 'phase', 'Round': 'round', 'Gamecode': 'gamecode', 'Player_ID': 'player_id',
+    'Player': 'player', 'Team': 'team', 'Minutes': 'minutes', 'Points': 'points', 'Valuation': 'valuation',
+    'Plusminus': 'plusminus',
+}
+ADVANCED_SOURCE_COLUMNS = {
+    'Points': 'points', 'FieldGoalsMade2': 'fgm2', 'FieldGoalsAttempted2': 'fga2', 'FieldGoalsMade3': 'fgm3',
+    'FieldGoalsAttempted3': 'fga3', 'FreeThrowsAttempted': 'fta', 'OffensiveRebounds': 'orb', 'Turnovers': 'tov',
+}
+
+def calculate_game_sequence(df: pd.DataFrame, player_ids=None) -> pd.DataFrame:
     player_mask = ~df['Player_ID'].isin(['Team', 'Total'])
-    df.loc[player_mask, 'GameSequence'] = df[player_mask].groupby('Player_ID').cumcount() + 1
+    sequence_mask = player_mask
+    if player_ids is not None:
+        sequence_mask = player_mask & df['Player_ID'].isin(player_ids)
+    df.loc[sequence_mask, 'GameSequence'] = df[sequence_mask].groupby('Player_ID').cumcount() + 1
     df.loc[~player_mask, 'GameSequence'] = None
     return df
 
-def insert_game_logs_to_db(game_logs_df: pd.DataFrame, table_name: str):
-    conn_str = os.getenv("DATABASE_URL")
-    if not conn_str:
-        raise ValueError("DATABASE_URL environment variable not set.")
+def create_game_logs_table(cursor, table_name: str, drop_existing: bool = True):
+    cursor.execute(create_table_sql(table_name, GAME_LOGS_SCHEMA, drop_existing))
+
+def player_trends_table_name(table_name: str) -> str:
+    return table_name.replace('game_logs_', 'player_trends_', 1)
+
+def create_player_trends_table(cursor, table_name: str, drop_existing: bool = False):
+    cursor.execute(create_table_sql(player_trends_table_name(table_name), PLAYER_TRENDS_SCHEMA, drop_existing))
+
+def minutes_to_seconds(minutes: pd.Series) -> pd.Series:
+    parts = minutes.astype('string').str.extract(r'^\s*(\d+):(\d{1,2})\s*$')
+    return pd.to_numeric(parts[0]) * 60 + pd.to_numeric(parts[1])
+
+def calculate_player_trends(game_logs_df: pd.DataFrame) -> pd.DataFrame:
+    """Rolling last-N and season-to-date averages after each game a player actually played, oldest game first."""
+    trends = game_logs_df.loc[~game_logs_df['Player_ID'].isin(['Team', 'Total']), list(TREND_SOURCE_COLUMNS)]
+    trends = trends.rename(columns=TREND_SOURCE_COLUMNS)
+    trends['seconds_played'] = minutes_to_seconds(trends['minutes'])
+    trends = trends[trends['seconds_played'] > 0].drop(columns=['minutes'])
+    for column in ['season', 'round', 'points', 'valuation', 'plusminus']:
+        trends[column] = pd.to_numeric(trends[column], errors='coerce')
+
+    trends['game_order'] = pd.to_numeric(trends['gamecode'], errors='coerce')
+    trends = trends.sort_values(['player_id', 'season', 'round', 'game_order'], kind='stable', ignore_index=True)
+    stats = list(TREND_STATS)
+
+    by_player = trends.groupby('player_id', sort=False)[stats]
+    for window in TREND_WINDOWS:
+        # Dropping the player level leaves the original row labels, so the averages are assigned by index
+        rolling = by_player.rolling(window, min_periods=1).mean().reset_index(level=0, drop=True)
+        for stat in stats:
+            trends[f"last{window}_{stat}"] = rolling[stat]
+
+    season_keys = [trends['player_id'], trends['season']]
+    trends['season_games'] = trends.groupby(season_keys, sort=False).cumcount() + 1
+    season_totals = trends[stats].groupby(season_keys, sort=False).cumsum()
+    season_counts = trends[stats].notna().groupby(season_keys, sort=False).cumsum()
+    for stat in stats:
+        trends[f"season_avg_{stat}"] = season_totals[stat] / season_counts[stat]
+    return trends.drop(columns=['game_order'])
+
+def refresh_player_trends(cursor, game_logs_df: pd.DataFrame, table_name: str, player_ids=None):
+    """Rebuild the trend rows of player_ids (every player when None) from their full game history in game_logs_df."""
+    trends_table = player_trends_table_name(table_name)
+    with track(f"calculate_player_trends {table_name}", rows_in=len(game_logs_df)) as metrics:
+        trends = calculate_player_trends(game_logs_df)
+        metrics.drop(len(game_logs_df) - len(trends), 'team row or did not play')
+        metrics.rows_out = len(trends)
+
+    scope = None if player_ids is None else {'player_id': list(player_ids)}
+    upsert_frame(cursor, trends, trends_table, PLAYER_TRENDS_SCHEMA, delete_missing=True, scope=scope)
+
+def fetch_player_history(cursor, table_name: str, player_ids: list) -> pd.DataFrame:
+    columns = list(TREND_SOURCE_COLUMNS)
+    cursor.execute(f"""
+    SELECT {', '.join(TREND_SOURCE_COLUMNS.values())}
+    FROM {table_name}
+    WHERE row_type = 'player' AND player_id = ANY(%s)
+    """, (player_ids,))
+    return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+def advanced_table_names(table_name: str) -> tuple:
+    return (table_name.replace('game_logs_', 'advanced_game_stats_', 1),
+            table_name.replace('game_logs_', 'advanced_season_stats_', 1))
+
+def create_advanced_stats_tables(cursor, table_name: str, drop_existing: bool = False):
+    game_table, season_table = advanced_table_names(table_name)
+    cursor.execute(create_table_sql(game_table, ADVANCED_GAME_STATS_SCHEMA, drop_existing))
+    cursor.execute(create_table_sql(season_table, ADVANCED_SEASON_STATS_SCHEMA, drop_existing))
+
+def safe_divide(numerator: pd.Series, denominator: pd.Series) -> pd.Series:
+    return numerator / denominator.where(denominator != 0)
+
+def add_advanced_rates(stats: pd.DataFrame) -> pd.DataFrame:
+    """Rates from summed counts, so the same formulas serve one game and a whole season.
+
+    Usage is the share of the team's plays (FGA + 0.44 FTA + TOV) made while the player was on court. Pace and
+    the ratings are team measures, per 40 minutes and per 100 possessions, and stay empty on player rows."""
+    team = stats['row_type'] == 'total'
+    stats['efg_pct'] = safe_divide(stats['fgm'] + 0.5 * stats['fgm3'], stats['fga'])
+    stats['ts_pct'] = safe_divide(stats['points'], 2 * (stats['fga'] + 0.44 * stats['fta']))
+    stats['usage_rate'] = 100 * safe_divide(stats['plays'], stats['team_plays_on_court'])
+    # A team plays five players at once, so its seconds_played is five times the game clock
+    stats['pace'] = safe_divide(stats['possessions'] * 40 * 60 * 5, stats['seconds_played']).where(team)
+    stats['off_rating'] = (100 * safe_divide(stats['points'], stats['possessions'])).where(team)
+    stats['def_rating'] = (100 * safe_divide(stats['opponent_points'], stats['possessions'])).where(team)
+    stats['net_rating'] = stats['off_rating'] - stats['def_rating']
+    return stats
+
+def calculate_advanced_stats(game_logs_df: pd.DataFrame) -> tuple:
+    """Per-game and per-season advanced stats for every player who played and every team 'Total' row.
+
+    Possessions are FGA + 0.44 FTA - ORB + TOV, averaged over both teams of a game; a player is credited
+    with the share of them played while on court."""
+    rows = game_logs_df[game_logs_df['Player_ID'] != 'Team']
+    stats = pd.DataFrame({
+        'season': pd.to_numeric(rows['Season'], errors='coerce'),
+        'phase': rows['Phase'],
+        'round': pd.to_numeric(rows['Round'], errors='coerce'),
+        'gamecode': rows['Gamecode'].astype(str),
+        'team': rows['Team'],
+        'row_type': np.where(rows['Player_ID'] == 'Total', 'total', 'player'),
+        'player_id': rows['Player_ID'],
+        'player': rows['Player'],
+        'seconds_played': minutes_to_seconds(rows['Minutes']).fillna(0).astype(float),
+    })
+    for source, name in ADVANCED_SOURCE_COLUMNS.items():
+        stats[name] = pd.to_numeric(rows[source], errors='coerce').fillna(0).astype(float)
+    stats['fga'] = stats['fga2'] + stats['fga3']
+    stats['fgm'] = stats['fgm2'] + stats['fgm3']
+    stats['plays'] = stats['fga'] + 0.44 * stats['fta'] + stats['tov']
+    stats = stats[(stats['row_type'] == 'total') | (stats['seconds_played'] > 0)]
+
+    game_keys = ['season', 'gamecode']
+    teams = stats[stats['row_type'] == 'total']
+    sides = teams[game_keys + ['team', 'points', 'plays', 'seconds_played']].assign(estimate=teams['plays'] - teams['orb'])
+    opponents = sides[game_keys + ['team', 'points', 'estimate']].rename(
+        columns={'team': 'opponent', 'points': 'opponent_points', 'estimate': 'opponent_estimate'})
+    sides = sides.merge(opponents, on=game_keys)
+    sides = sides[sides['team'] != sides['opponent']]
+    sides['game_possessions'] = (sides['estimate'] + sides['opponent_estimate']) / 2
+    sides = sides.rename(columns={'plays': 'team_plays', 'seconds_played': 'team_seconds'})
+
+    stats = stats.merge(
+        sides[game_keys + ['team', 'opponent', 'opponent_points', 'game_possessions', 'team_plays', 'team_seconds']],
+        on=game_keys + ['team'], how='left'
+    )
+    on_court_share = safe_divide(stats['seconds_played'], stats['team_seconds'] / 5)
+    is_team = stats['row_type'] == 'total'
+    stats['possessions'] = np.where(is_team, stats['game_possessions'], stats['game_possessions'] * on_court_share)
+    stats['team_plays_on_court'] = np.where(is_team, stats['team_plays'], stats['team_plays'] * on_court_share)
+    stats['opponent_points'] = stats['opponent_points'].where(is_team)
+    game_stats = add_advanced_rates(stats)
+
+    season_keys = ['season', 'team', 'row_type', 'player_id']
+    summed = ['seconds_played', 'points', 'fgm', 'fgm3', 'fga', 'fta', 'plays', 'possessions', 'team_plays_on_court',
+              'opponent_points']
+    season_stats = game_stats.groupby(season_keys, sort=False).agg(
+        player=('player', 'last'), games=('gamecode', 'nunique'), **{column: (column, 'sum') for column in summed})
+    season_stats = add_advanced_rates(season_stats.reset_index())
+    return game_stats, season_stats
+
+def refresh_advanced_stats(cursor, game_logs_df: pd.DataFrame, table_name: str, seasons: list = None):
+    """Rebuild the advanced game and season rows of seasons (all of them when None) from game_logs_df."""
+    game_table, season_table = advanced_table_names(table_name)
+    with track(f"calculate_advanced_stats {table_name}", rows_in=len(game_logs_df)) as metrics:
+        game_stats, season_stats = calculate_advanced_stats(game_logs_df)
+        metrics.drop(len(game_logs_df) - len(game_stats), 'team row or did not play')
+        metrics.rows_out = len(game_stats) + len(season_stats)
+
+    scope = None if seasons is None else {'season': list(seasons)}
+    upsert_frame(cursor, game_stats, game_table, ADVANCED_GAME_STATS_SCHEMA, delete_missing=True, scope=scope)
+    upsert_frame(cursor, season_stats, season_table, ADVANCED_SEASON_STATS_SCHEMA, delete_missing=True, scope=scope)
+
+def fetch_season_game_logs(cursor, table_name: str, seasons: list) -> pd.DataFrame:
+    columns = {column.source: column.name for column in GAME_LOGS_SCHEMA.columns}
+    sources = ['Season', 'Phase', 'Round', 'Gamecode', 'Team', 'Player_ID', 'Player', 'Minutes', 'Points'] + [
+        source for source in ADVANCED_SOURCE_COLUMNS if source != 'Points']
+    cursor.execute(f"""
+    SELECT {', '.join(columns[source] for source in sources)}
+    FROM {table_name}
+    WHERE season = ANY(%s)
+    """, (seasons,))
+    return pd.DataFrame(cursor.fetchall(), columns=sources)
+
+def create_sync_state_table(cursor):
+    lock_shared_table(cursor, SYNC_STATE_TABLE)
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {SYNC_STATE_TABLE} (
+        table_name TEXT,
+        season INTEGER,
+        gamecode TEXT,
+        home_score INTEGER,
+        away_score INTEGER,
+        loaded_at TIMESTAMP DEFAULT now(),
+        PRIMARY KEY(table_name, season, gamecode)
+    );
+    """)
+
+def record_synced_games(cursor, table_name: str, games: list):
+    execute_values(cursor, f"""
+    INSERT INTO {SYNC_STATE_TABLE} (table_name, season, gamecode, home_score, away_score)
+    VALUES %s
+    ON CONFLICT (table_name, season, gamecode) DO UPDATE SET
+        home_score = EXCLUDED.home_score,
+        away_score = EXCLUDED.away_score,
+        loaded_at = now();
+    """, [(table_name,) + tuple(game) for game in games])
+
+def games_from_game_logs(game_logs_df: pd.DataFrame) -> list:
+    totals = game_logs_df[game_logs_df['Player_ID'] == 'Total']
+    scores = totals.pivot_table(index=['Season', 'Gamecode'], columns='Home', values='Points', aggfunc='first')
+    scores = scores.dropna(subset=[0, 1]) if {0, 1} <= set(scores.columns) else scores.iloc[0:0]
+    return [(int(season), str(gamecode), int(row[1]), int(row[0]))
+            for (season, gamecode), row in scores.iterrows()]
 
-    conn = psycopg2.connect(conn_str)
+def add_row_keys(game_logs_df: pd.DataFrame) -> pd.DataFrame:
+    game_logs_df = game_logs_df.copy()
+    game_logs_df['row_number'] = game_logs_df.groupby(['Player_ID', 'Gamecode', 'Season', 'Team']).cumcount() + 1
+    game_logs_df['RowType'] = np.select(
+        [game_logs_df['Player_ID'] == 'Team', game_logs_df['Player_ID'] == 'Total'],
+        ['team', 'total'],
+        default='player'
+    )
+    return game_logs_df
+
+def upsert_game_logs(cursor, game_logs_df: pd.DataFrame, table_name: str, delete_missing: bool = False):
+    upsert_frame(cursor, add_row_keys(game_logs_df), table_name, GAME_LOGS_SCHEMA, delete_missing)
+
+def insert_game_logs_to_db(game_logs_df: pd.DataFrame, table_name: str, swap: bool = False, conn=None) -> list:
+    """Replace the table with game_logs_df and return the seasons it holds."""
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_to_db()
     cursor = conn.cursor()
 
     try:
-        game_logs_df = game_logs_df.copy()
-        game_logs_df['row_number'] = game_logs_df.groupby(['Player_ID', 'Gamecode', 'Season', 'Team']).cumcount() + 1
+        load_table = shadow_table_name(table_name) if swap else table_name
+        # Only the shadow table starts empty; a live reload sends just the rows that changed
+        create_game_logs_table(cursor, load_table, drop_existing=swap)
+        create_player_trends_table(cursor, load_table, drop_existing=swap)
+        create_advanced_stats_tables(cursor, load_table, drop_existing=swap)
+        create_sync_state_table(cursor)
+        if not swap:
+            cursor.execute(f"DELETE FROM {SYNC_STATE_TABLE} WHERE table_name = %s;", (table_name,))
+        conn.commit()
 
-        cursor.execute(f"""
-        DROP TABLE IF EXISTS {table_name};
-        CREATE TABLE {table_name} (
-            id SERIAL PRIMARY KEY,
-            season INTEGER,
-            phase TEXT,
-            round INTEGER,
-            gamecode TEXT,
-            home INTEGER,
-            player_id TEXT,
-            is_starter REAL,
-            is_playing REAL,
-            team TEXT,
-            dorsal INTEGER,
-            player TEXT,
-            minutes TEXT,
-            points INTEGER,
-            field_goals_made_2 INTEGER,
-            field_goals_attempted_2 INTEGER,
-            field_goals_made_3 INTEGER,
-            field_goals_attempted_3 INTEGER,
-            free_throws_made INTEGER,
-            free_throws_attempted INTEGER,
-            offensive_rebounds INTEGER,
-            defensive_rebounds INTEGER,
-            total_rebounds INTEGER,
-            assistances INTEGER,
-            steals INTEGER,
-            turnovers INTEGER,
-            blocks_favour INTEGER,
-            blocks_against INTEGER,
-            fouls_commited INTEGER,
-            fouls_received INTEGER,
-            valuation INTEGER,
-            plusminus REAL,
-            game_sequence INTEGER,
-            season_round TEXT,
-            row_type TEXT DEFAULT 'player',
-            row_number INTEGER DEFAULT 1,
-            UNIQUE(player_id, gamecode, season, team, row_number)
-        );
-        """)
+        upsert_game_logs(cursor, game_logs_df, load_table, delete_missing=True)
+        refresh_player_trends(cursor, game_logs_df, load_table)
+        refresh_advanced_stats(cursor, game_logs_df, load_table)
+        if swap:
+            with track('commit'):
+                conn.commit()
+            with track('swap'):
+                swap_in_shadow_tables(cursor, [table_name, player_trends_table_name(table_name),
+                                               *advanced_table_names(table_name)])
+                cursor.execute(f"DELETE FROM {SYNC_STATE_TABLE} WHERE table_name = %s;", (table_name,))
+        record_synced_games(cursor, table_name, games_from_game_logs(game_logs_df))
+        seasons = sorted(int(season) for season in game_logs_df['Season'].dropna().unique())
+        bump_data_versions(cursor, table_name, seasons, replace_table=True)
+        with track('commit'):
+            conn.commit()
+        return seasons
+
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+
+def fetch_new_game_logs(boxdata: BoxScoreData, synced_games: dict, start_season: int, end_season: int,
+                        cache_dir: str = CACHE_DIR):
+    """Box scores of the games played or rescored since they were synced, fetched through GameFetcher's cache
+    and engines, with the (season, gamecode, home score, away score) of every game that returned rows."""
+    units = []
+    game_scores = {}
+    with track('list games boxscore', rows_in=0) as metrics:
+        for season in range(start_season, end_season + 1):
+            # Listed fresh every sync: the scores tell which games changed since they were synced
+            season_games = boxdata.get_gamecodes_season(season)
+            season_games = season_games[season_games['played']]
+            metrics.rows_in += len(season_games)
+
+            for _, game in season_games.iterrows():
+                gamecode = str(game['gameCode'])
+                scores = (int(game['homescore']), int(game['awayscore']))
+                if synced_games.get((season, gamecode)) == scores:
+                    metrics.drop(1, 'game already synced')
+                    continue
+                units.append(FetchUnit(boxdata.competition, 'boxscore', season, int(game['gameCode']), game['Phase'],
+                                       int(game['Round'])))
+                game_scores[(season, gamecode)] = scores
+        metrics.rows_out = len(units)
+
+    # A rescored game's cached box score is the one from before the correction
+    evict_cache([unit for unit in units if (unit.season, str(unit.gamecode)) in synced_games], cache_dir)
+    new_logs = fetch_units(boxdata, units, cache_dir=cache_dir) if units else pd.DataFrame()
+    if new_logs.empty:
+        return new_logs, []
+    returned = set(zip(new_logs['Season'].astype(int), new_logs['Gamecode'].astype(str)))
+    fetched_games = [key + scores for key, scores in game_scores.items() if key in returned]
+    return new_logs, fetched_games
+
+def sync_game_logs_to_db(competition_type: str, table_name: str, start_season: int = None, end_season: int = None, conn=None) -> list:
+    """Load the games played or rescored since the last sync and return the seasons they belong to."""
+    competition = get_competition(competition_type)
+    start_season, end_season = competition.season_range('game_logs', start_season, end_season)
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_to_db()
+    cursor = conn.cursor()
+
+    try:
+        create_game_logs_table(cursor, table_name, drop_existing=False)
+        create_player_trends_table(cursor, table_name)
+        create_advanced_stats_tables(cursor, table_name)
+        create_sync_state_table(cursor)
         conn.commit()
 
-        def safe_int(val):
-            if pd.isna(val) or val == 'DNP' or val == 'None':
-                return None
-            try:
-                return int(float(val))
-            except (ValueError, TypeError):
-                return None
-
-        def safe_float(val):
-            if pd.isna(val) or val == 'None':
-                return None
-            try:
-                return float(val)
-            except (ValueError, TypeError):
-                return None
-
-        def safe_str(val):
-            if pd.isna(val) or val == 'None':
-                return None
-            return str(val)
-
-        data_tuples = []
-        for _, row in game_logs_df.iterrows():
-            try:
-                if row["Player_ID"] == 'Team':
-                    row_type = 'team'
-                elif row["Player_ID"] == 'Total':
-                    row_type = 'total'
-                else:
-                    row_type = 'player'
-
-                data_tuples.append((
-                    safe_int(row["Season"]),
-                    safe_str(row["Phase"]),
-                    safe_int(row["Round"]),
-                    safe_str(row["Gamecode"]),
-                    safe_int(row["Home"]),
-                    safe_str(row["Player_ID"]),
-                    safe_float(row["IsStarter"]),
-                    safe_float(row["IsPlaying"]),
-                    safe_str(row["Team"]),
-                    safe_int(row["Dorsal"]),
-                    safe_str(row["Player"]),
-                    safe_str(row["Minutes"]),
-                    safe_int(row["Points"]),
-                    safe_int(row["FieldGoalsMade2"]),
-                    safe_int(row["FieldGoalsAttempted2"]),
-                    safe_int(row["FieldGoalsMade3"]),
-                    safe_int(row["FieldGoalsAttempted3"]),
-                    safe_int(row["FreeThrowsMade"]),
-                    safe_int(row["FreeThrowsAttempted"]),
-                    safe_int(row["OffensiveRebounds"]),
-                    safe_int(row["DefensiveRebounds"]),
-                    safe_int(row["TotalRebounds"]),
-                    safe_int(row["Assistances"]),
-                    safe_int(row["Steals"]),
-                    safe_int(row["Turnovers"]),
-                    safe_int(row["BlocksFavour"]),
-                    safe_int(row["BlocksAgainst"]),
-                    safe_int(row["FoulsCommited"]),
-                    safe_int(row["FoulsReceived"]),
-                    safe_int(row["Valuation"]),
-                    safe_float(row["Plusminus"]),
-                    safe_int(row["GameSequence"]),
-                    safe_str(row["SeasonRound"]),
-                    row_type,
-                    safe_int(row["row_number"])
-                ))
-            except Exception as e:
-                pass
-
-        insert_query = f"""
-        INSERT INTO {table_name} (
-            season, phase, round, gamecode, home, player_id, is_starter, is_playing,
-            team, dorsal, player, minutes, points, field_goals_made_2, field_goals_attempted_2,
-            field_goals_made_3, field_goals_attempted_3, free_throws_made, free_throws_attempted,
-            offensive_rebounds, defensive_rebounds, total_rebounds, assistances, steals,
-            turnovers, blocks_favour, blocks_against, fouls_commited, fouls_received,
-            valuation, plusminus, game_sequence, season_round, row_type, row_number
-        ) VALUES %s
-        ON CONFLICT (player_id, gamecode, season, team, row_number) DO UPDATE SET
-            phase = EXCLUDED.phase,
-            round = EXCLUDED.round,
-            home = EXCLUDED.home,
-            is_starter = EXCLUDED.is_starter,
-            is_playing = EXCLUDED.is_playing,
-            dorsal = EXCLUDED.dorsal,
-            player = EXCLUDED.player,
-            minutes = EXCLUDED.minutes,
-            points = EXCLUDED.points,
-            field_goals_made_2 = EXCLUDED.field_goals_made_2,
-            field_goals_attempted_2 = EXCLUDED.field_goals_attempted_2,
-            field_goals_made_3 = EXCLUDED.field_goals_made_3,
-            field_goals_attempted_3 = EXCLUDED.field_goals_attempted_3,
-            free_throws_made = EXCLUDED.free_throws_made,
-            free_throws_attempted = EXCLUDED.free_throws_attempted,
-            offensive_rebounds = EXCLUDED.offensive_rebounds,
-            defensive_rebounds = EXCLUDED.defensive_rebounds,
-            total_rebounds = EXCLUDED.total_rebounds,
-            assistances = EXCLUDED.assistances,
-            steals = EXCLUDED.steals,
-            turnovers = EXCLUDED.turnovers,
-            blocks_favour = EXCLUDED.blocks_favour,
-            blocks_against = EXCLUDED.blocks_against,
-            fouls_commited = EXCLUDED.fouls_commited,
-            fouls_received = EXCLUDED.fouls_received,
-            valuation = EXCLUDED.valuation,
-            plusminus = EXCLUDED.plusminus,
-            game_sequence = EXCLUDED.game_sequence,
-            season_round = EXCLUDED.season_round,
-            row_type = EXCLUDED.row_type;
-        """
-
-        execute_values(cursor, insert_query, data_tuples)
+        cursor.execute(f"""
+        SELECT season, gamecode, home_score, away_score
+        FROM {SYNC_STATE_TABLE}
+        WHERE table_name = %s
+        """, (table_name,))
+        synced_games = {(season, gamecode): (home_score, away_score)
+                        for season, gamecode, home_score, away_score in cursor.fetchall()}
+        # Nothing stays open on the connection while the new games are fetched
         conn.commit()
 
+        boxdata = BoxScoreData(competition=competition.code)
+        new_logs, fetched_games = fetch_new_game_logs(boxdata, synced_games, start_season, end_season)
+        if new_logs.empty:
+            return []
+
+        new_logs['Gamecode'] = new_logs['Gamecode'].astype(str)
+        new_player_ids = new_logs.loc[~new_logs['Player_ID'].isin(['Team', 'Total']), 'Player_ID'].unique().tolist()
+
+        cursor.execute(f"""
+        SELECT id, player_id, player, season, round, gamecode
+        FROM {table_name}
+        WHERE row_type = 'player' AND player_id = ANY(%s)
+        """, (new_player_ids,))
+        existing_logs = pd.DataFrame(cursor.fetchall(), columns=['id', 'Player_ID', 'Player', 'Season', 'Round', 'Gamecode'])
+        refetched_keys = pd.MultiIndex.from_tuples([game[:2] for game in fetched_games])
+        existing_logs = existing_logs[~pd.MultiIndex.from_frame(existing_logs[['Season', 'Gamecode']]).isin(refetched_keys)]
+
+        game_logs = pd.concat([new_logs, existing_logs], ignore_index=True) if not existing_logs.empty else new_logs.assign(id=None)
+        with track('calculate_game_sequence', rows_in=len(game_logs)) as metrics:
+            game_logs = game_logs.sort_values(['Player', 'Season', 'Round'], ascending=[True, False, False])
+            game_logs = calculate_game_sequence(game_logs, player_ids=new_player_ids)
+            metrics.rows_out = len(game_logs)
+
+        is_new = game_logs['id'].isna()
+        new_logs = game_logs[is_new].drop(columns=['id'])
+        new_logs['SeasonRound'] = new_logs['Season'].astype(str) + '-' + new_logs['Round'].astype(str)
+        upsert_game_logs(cursor, new_logs, table_name)
+
+        sequence_updates = game_logs.loc[~is_new, ['id', 'GameSequence']]
+        with track(f"update game_sequence {table_name}", rows_in=len(sequence_updates)) as metrics:
+            execute_values(cursor, f"""
+            UPDATE {table_name} AS g SET game_sequence = v.game_sequence, row_hash = NULL
+            FROM (VALUES %s) AS v(id, game_sequence)
+            WHERE g.id = v.id AND g.game_sequence IS DISTINCT FROM v.game_sequence
+            """, [(int(row_id), int(sequence)) for row_id, sequence in sequence_updates.itertuples(index=False)])
+            metrics.rows_out = len(sequence_updates)
+
+        refresh_player_trends(cursor, fetch_player_history(cursor, table_name, new_player_ids), table_name, new_player_ids)
+        synced_seasons = sorted({int(game[0]) for game in fetched_games})
+        refresh_advanced_stats(cursor, fetch_season_game_logs(cursor, table_name, synced_seasons), table_name, synced_seasons)
+        record_synced_games(cursor, table_name, fetched_games)
+        bump_data_versions(cursor, table_name, synced_seasons)
+        with track('commit'):
+            conn.commit()
+        return synced_seasons
+
     except Exception as e:
         conn.rollback()
         raise e
     finally:
         cursor.close()
-        conn.close()
+        if own_conn:
+            conn.close()
+
+def game_logs_table_name(competition_type: str) -> str:
+    return get_competition(competition_type).table_name('game_logs')
+
+def fetch_game_logs(competition_type: str, start_season: int = None, end_season: int = None) -> pd.DataFrame:
+    competition = get_competition(competition_type)
+    boxdata = BoxScoreData(competition=competition.code)
+    return fetch_seasons(boxdata, 'boxscore', *competition.season_range('game_logs', start_season, end_season))
 
-def update_euro_leagues_game_logs(competition_type: str):
-    if competition_type == 'E':
-        table_name = 'game_logs_euroleague'
-    elif competition_type == 'U':
-        table_name = 'game_logs_eurocup'
-    else:
-        raise ValueError("Invalid competition_type. Must be 'E' for Euroleague or 'U' for Eurocup.")
+def transform_game_logs(boxscore_data: pd.DataFrame) -> pd.DataFrame:
+    with track('calculate_game_sequence', rows_in=len(boxscore_data)) as metrics:
+        game_logs = boxscore_data.sort_values(['Player', 'Season', 'Round'], ascending=[True, False, False])
+        game_logs = calculate_game_sequence(game_logs)
+        game_logs['SeasonRound'] = game_logs['Season'].astype(str) + '-' + game_logs['Round'].astype(str)
+        metrics.rows_out = len(game_logs)
+    return game_logs
 
-    boxdata = BoxScoreData(competition=competition_type)
-    boxscore_data = boxdata.get_player_boxscore_stats_multiple_seasons(2016, 2024)
+def update_euro_leagues_game_logs(competition_type: str, incremental: bool = False, swap: bool = False):
+    competition = get_competition(competition_type)
+    table_name = game_logs_table_name(competition)
 
-    game_logs = boxscore_data.sort_values(['Player', 'Season', 'Round'], ascending=[True, False, False])
-    game_logs = calculate_game_sequence(game_logs)
-    game_logs['SeasonRound'] = game_logs['Season'].astype(str) + '-' + game_logs['Round'].astype(str)
+    with run_report(f"game_logs:{competition.code}"):
+        if incremental:
+            sync_game_logs_to_db(competition, table_name)
+            return
 
-    insert_game_logs_to_db(game_logs, table_name)
+        game_logs = transform_game_logs(fetch_game_logs(competition))
+        insert_game_logs_to_db(game_logs, table_name, swap)
 
-# Update Euroleague game logs
-update_euro_leagues_game_logs('E')
+if __name__ == "__main__":
+    # Update Euroleague game logs
+    update_euro_leagues_game_logs('E', incremental=True)
 
-# Update Eurocup game logs
-update_euro_leagues_game_logs('U')
+    # Update Eurocup game logs
+    update_euro_leagues_game_logs('U', incremental=True)
 
 
 # In[ ]:
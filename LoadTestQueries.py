@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Load test of the dashboard queries through QueryService, without and with the result cache
+
+import argparse
+import random
+import statistics
+import threading
+import time
+
+from BulkLoader import connect_to_db
+from Competitions import get_competition, shot_zone_table_names
+from QueryService import QueryService
+
+def sample_requests(competition_type: str, keys: int, seed: int) -> list:
+    """Up to keys (method, kwargs) requests per query, for players, teams and seasons that are loaded."""
+    competition = get_competition(competition_type)
+    player_zone_table = shot_zone_table_names(competition.table_name('shot_data'))[1]
+    conn = connect_to_db()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f"""
+        SELECT player_id, season FROM (SELECT DISTINCT player_id, season FROM {competition.table_name('game_logs')}
+                                       WHERE row_type = 'player' AND player_id IS NOT NULL) keys
+        ORDER BY md5(player_id || season || %s) LIMIT %s
+        """, (seed, keys))
+        players = cursor.fetchall()
+        cursor.execute(f"""
+        SELECT team, season FROM (SELECT DISTINCT team, season FROM {competition.table_name('schedule_results')}) keys
+        ORDER BY md5(team || season || %s) LIMIT %s
+        """, (seed, keys))
+        teams = cursor.fetchall()
+        cursor.execute(f"""
+        SELECT id_player, season FROM (SELECT DISTINCT id_player, season FROM {player_zone_table}) keys
+        ORDER BY md5(id_player || season || %s) LIMIT %s
+        """, (seed, keys))
+        shooters = cursor.fetchall()
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    return (
+        [('player_season_splits', {'player_id': player_id, 'season': season}) for player_id, season in players]
+        + [('team_schedule', {'team': team, 'season': season}) for team, season in teams]
+        + [('shot_zones', {'player_id': player_id, 'season': season}) for player_id, season in shooters]
+    )
+
+def run_load(service: QueryService, competition_type: str, requests: list, threads: int, duration: float, seed: int) -> tuple:
+    """Every thread sends random requests for duration seconds; returns the latencies (ms), the failed requests as
+    (method, kwargs, exception) and the elapsed seconds."""
+    latencies = [[] for _ in range(threads)]
+    errors = [[] for _ in range(threads)]
+    deadline = time.perf_counter() + duration
+
+    def worker(thread_latencies: list, thread_errors: list, rng: random.Random):
+        while time.perf_counter() < deadline:
+            method, kwargs = rng.choice(requests)
+            start = time.perf_counter()
+            try:
+                getattr(service, method)(competition_type, **kwargs)
+            except Exception as e:
+                thread_errors.append((method, kwargs, e))
+                continue
+            thread_latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(latencies[i], errors[i], random.Random(seed + i)))
+               for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return ([latency for thread_latencies in latencies for latency in thread_latencies],
+            [error for thread_errors in errors for error in thread_errors], time.perf_counter() - start)
+
+def run_load_test(competition_type: str, keys: int, threads: int, duration: float, max_connections: int, seed: int):
+    requests = sample_requests(competition_type, keys, seed)
+    if not requests:
+        raise ValueError(f"No loaded data to query for competition {competition_type}.")
+    print(f"{len(requests)} distinct requests, {threads} threads, {duration:.0f}s per run")
+
+    results = {}
+    for variant, cache_size in [('uncached', 0), ('cached', len(requests))]:
+        service = QueryService(max_connections, cache_size)
+        try:
+            latencies, errors, elapsed = run_load(service, competition_type, requests, threads, duration, seed)
+        finally:
+            service.close()
+        if errors:
+            method, kwargs, error = errors[0]
+            raise RuntimeError(f"{len(errors)} of {len(errors) + len(latencies)} {variant} requests failed, "
+                               f"the first {method}({kwargs}): {type(error).__name__}: {error}")
+        if len(latencies) < 2:
+            raise ValueError(f"Only {len(latencies)} {variant} requests completed, run for longer to get percentiles.")
+        percentiles = statistics.quantiles(latencies, n=100)
+        results[variant] = (len(latencies), len(latencies) / elapsed, percentiles[49], percentiles[98])
+
+    print(f"\n{'run':<10}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for variant, (count, throughput, p50, p99) in results.items():
+        print(f"{variant:<10}{count:>10}{throughput:>10.0f}{p50:>10.3f}{p99:>10.3f}")
+    uncached, cached = results['uncached'], results['cached']
+    print(f"\nthroughput {cached[1] / uncached[1]:.1f}x, p50 {uncached[2] / cached[2]:.1f}x, p99 {uncached[3] / cached[3]:.1f}x")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the dashboard queries against a loaded Postgres (DATABASE_URL).")
+    parser.add_argument('--competition', default='E')
+    parser.add_argument('--keys', type=int, default=200, help="Distinct players, teams and shooters to query.")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--max-connections', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    run_load_test(args.competition, args.keys, args.threads, args.duration, args.max_connections, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Nightly refresh: run the game log, schedule and shot jobs for every competition concurrently
+
+import argparse
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable
+
+import pandas as pd
+
+import AnalyticsSnapshot
+import GameLogs
+import PlayerSimilarity
+import ScheduleResults
+import ShotData
+from BulkLoader import connect_to_db, create_connection_pool
+from Competitions import COMPETITIONS, DATASETS, Competition, get_competition
+from DataVersions import bump_data_versions
+from EtlMetrics import PROFILE_STAGE, REPORT_DIR, RunReport, StageMetrics, row_count, run_report, track
+from RawSnapshots import missing_seasons, read_seasons
+from TableSwap import restore_previous_tables, table_seasons
+
+logger = logging.getLogger(__name__)
+
+RAW_DATASETS = {'game_logs': 'boxscore', 'schedule_results': 'game_report', 'shot_data': 'shots'}
+
+@dataclass(frozen=True)
+class Stage:
+    """One node of the job graph. The output of `depends_on` is passed as the first argument;
+    the stages in `after` only have to finish first."""
+    name: str
+    kind: str
+    func: Callable
+    args: tuple = ()
+    depends_on: str = None
+    after: tuple = ()
+
+def load_shot_data(shot_data_df: pd.DataFrame, table_name: str, swap: bool = False, conn=None):
+    if not shot_data_df.empty:
+        ShotData.insert_shot_data_to_db(shot_data_df, table_name, swap, conn=conn)
+
+def refresh_player_similarity(seasons: list, competition_type: str, conn=None):
+    # A sync that found no new games leaves every season's features as they were
+    if seasons:
+        PlayerSimilarity.refresh_player_similarity(competition_type, seasons, conn=conn)
+
+def export_shot_data(_, competition_type: str, export_dir: str, conn=None):
+    ShotData.export_shot_data_parquet(competition_type, export_dir, conn=conn)
+
+def read_raw_snapshots(competition: Competition, dataset: str) -> pd.DataFrame:
+    return read_seasons(competition.code, RAW_DATASETS[dataset], *competition.season_range(dataset))
+
+def unsnapshotted_seasons(competitions: list, datasets: list) -> dict:
+    """(competition, dataset) -> seasons without a raw snapshot, which transform_only cannot reload."""
+    missing = {}
+    for competition in map(get_competition, competitions):
+        for dataset in datasets:
+            seasons = missing_seasons(competition.code, RAW_DATASETS[dataset], *competition.season_range(dataset))
+            if seasons:
+                missing[(competition.code, dataset)] = seasons
+    return missing
+
+def fetch_stage(competition: Competition, dataset: str, fetch: Callable, transform_only: bool = False) -> Stage:
+    if transform_only:
+        return Stage(f'{dataset}:{competition.code}:fetch', 'fetch', read_raw_snapshots, (competition, dataset))
+    return Stage(f'{dataset}:{competition.code}:fetch', 'fetch', fetch, (competition,))
+
+def build_stages(competitions: list, datasets: list, full_game_logs: bool = False, stream_shot_data: bool = True,
+                 reload_shot_seasons: bool = False, swap_tables: bool = False, parquet_dir: str = None,
+                 transform_only: bool = False, player_similarity: bool = True, snapshot_path: str = None) -> list:
+    """With transform_only the fetch stages read the raw snapshots of the last fetch instead of calling the API,
+    which needs the full game log reload and the non-streaming shot load. With snapshot_path the run ends by
+    exporting every competition's tables there, once all of them loaded."""
+    if transform_only:
+        full_game_logs, stream_shot_data = True, False
+
+    stages = []
+    for competition in map(get_competition, competitions):
+        code = competition.code
+        game_logs_stage = f'game_logs:{code}:load' if full_game_logs else f'game_logs:{code}:sync'
+        if 'game_logs' in datasets:
+            table_name = GameLogs.game_logs_table_name(competition)
+            if full_game_logs:
+                stages += [
+                    fetch_stage(competition, 'game_logs', GameLogs.fetch_game_logs, transform_only),
+                    Stage(f'game_logs:{code}:transform', 'transform', GameLogs.transform_game_logs,
+                          depends_on=f'game_logs:{code}:fetch'),
+                    Stage(f'game_logs:{code}:load', 'load', GameLogs.insert_game_logs_to_db, (table_name, swap_tables),
+                          depends_on=f'game_logs:{code}:transform'),
+                ]
+            else:
+                stages.append(Stage(f'game_logs:{code}:sync', 'load', GameLogs.sync_game_logs_to_db,
+                                    (competition, table_name)))
+
+        if 'schedule_results' in datasets:
+            table_name = ScheduleResults.schedule_results_table_name(competition)
+            stages += [
+                fetch_stage(competition, 'schedule_results', ScheduleResults.fetch_game_reports, transform_only),
+                Stage(f'schedule_results:{code}:transform', 'transform', ScheduleResults.create_team_records_dataset,
+                      (competition,), depends_on=f'schedule_results:{code}:fetch'),
+                Stage(f'schedule_results:{code}:load', 'load', ScheduleResults.insert_schedule_results_to_db,
+                      (table_name, swap_tables), depends_on=f'schedule_results:{code}:transform'),
+            ]
+
+        if 'shot_data' in datasets and stream_shot_data:
+            stages.append(Stage(f'shot_data:{code}:stream', 'load', ShotData.stream_shot_data_to_db,
+                                (competition, ShotData.shot_data_table_name(competition), None, None, None,
+                                 reload_shot_seasons)))
+        elif 'shot_data' in datasets:
+            table_name = ShotData.shot_data_table_name(competition)
+            stages += [
+                fetch_stage(competition, 'shot_data', ShotData.fetch_shot_data, transform_only),
+                Stage(f'shot_data:{code}:transform', 'transform', ShotData.transform_shot_data,
+                      depends_on=f'shot_data:{code}:fetch'),
+                Stage(f'shot_data:{code}:load', 'load', load_shot_data, (table_name, swap_tables),
+                      depends_on=f'shot_data:{code}:transform'),
+            ]
+        shot_stage = f'shot_data:{code}:stream' if stream_shot_data else f'shot_data:{code}:load'
+        if 'shot_data' in datasets and parquet_dir is not None:
+            stages.append(Stage(f'shot_data:{code}:export', 'load', export_shot_data, (competition, parquet_dir),
+                                depends_on=shot_stage))
+        if 'game_logs' in datasets and player_similarity:
+            # Only the seasons the game log stage loaded are rebuilt; their shot zones load first when shot data runs too
+            stages.append(Stage(f'player_similarity:{code}:refresh', 'load', refresh_player_similarity, (competition,),
+                                depends_on=game_logs_stage, after=(shot_stage,) if 'shot_data' in datasets else ()))
+    if snapshot_path is not None:
+        stages.append(Stage('analytics_snapshot:export', 'load', AnalyticsSnapshot.export_analytics_snapshot,
+                            (list(competitions), snapshot_path),
+                            after=tuple(stage.name for stage in stages if stage.kind == 'load')))
+    return stages
+
+def swapped_table_names(competitions: list, datasets: list) -> list:
+    table_names = []
+    for competition in competitions:
+        if 'game_logs' in datasets:
+            game_logs_table = GameLogs.game_logs_table_name(competition)
+            table_names += [game_logs_table, GameLogs.player_trends_table_name(game_logs_table),
+                            *GameLogs.advanced_table_names(game_logs_table)]
+        if 'schedule_results' in datasets:
+            schedule_table = ScheduleResults.schedule_results_table_name(competition)
+            table_names += [schedule_table, ScheduleResults.standings_table_name(schedule_table),
+                            ScheduleResults.head_to_head_table_name(schedule_table)]
+        if 'shot_data' in datasets:
+            shot_table = ShotData.shot_data_table_name(competition)
+            table_names += [ShotData.shot_facts_table_name(shot_table), *ShotData.shot_zone_table_names(shot_table),
+                            *ShotData.shot_grid_table_names(shot_table)]
+    return table_names
+
+def restore_previous(competitions: list, datasets: list):
+    conn = connect_to_db()
+    cursor = conn.cursor()
+    try:
+        # The shot_data_* views hold on to the tables they were created over, so rebuild them around the restore
+        shot_tables = []
+        if 'shot_data' in datasets:
+            shot_tables = [ShotData.shot_data_table_name(competition) for competition in competitions]
+        for shot_table in shot_tables:
+            ShotData.drop_shot_data_view(cursor, shot_table)
+        restore_previous_tables(cursor, swapped_table_names(competitions, datasets))
+        for shot_table in shot_tables:
+            ShotData.create_shot_data_view(cursor, shot_table)
+            # Shot reads are versioned under the view's name, which restore_previous_tables does not see
+            bump_data_versions(cursor, shot_table, table_seasons(cursor, shot_table), replace_table=True)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        conn.close()
+
+def run_instrumented(name: str, func: Callable, args: tuple, kwargs: dict, profile_stage: str, report_dir: str,
+                     threaded: bool = False):
+    """Run one stage in a worker and hand its stage metrics back with the output."""
+    with run_report(name, persist=False, profile_stage=profile_stage, report_dir=report_dir) as report:
+        with track(name, rows_in=row_count(args[0]) if args else None, threaded=threaded) as metrics:
+            output = func(*args, **kwargs)
+            metrics.rows_out = row_count(output)
+    return output, report.stages
+
+def run_with_pooled_connection(conn_pool, name: str, func: Callable, args: tuple, profile_stage: str, report_dir: str):
+    conn = conn_pool.getconn()
+    try:
+        return run_instrumented(name, func, args, {'conn': conn}, profile_stage, report_dir)
+    finally:
+        conn_pool.putconn(conn)
+
+def run_stages(stages: list, workers: int = 4, db_concurrency: int = 4, report: RunReport = None) -> dict:
+    """Run fetches on threads, transforms on processes and loads on a bounded pool of DB connections."""
+    pending = list(stages)
+    running = {}
+    outputs = {}
+    status = {}
+    started = {}
+
+    conn_pool = create_connection_pool(db_concurrency) if any(stage.kind == 'load' for stage in stages) else None
+
+    with ThreadPoolExecutor(max_workers=workers) as fetch_pool, \
+            ProcessPoolExecutor(max_workers=workers) as transform_pool, \
+            ThreadPoolExecutor(max_workers=db_concurrency) as load_pool:
+        try:
+            while pending or running:
+                for stage in list(pending):
+                    required = ((stage.depends_on,) if stage.depends_on is not None else ()) + stage.after
+                    if any(status.get(name) in ('failed', 'skipped') for name in required):
+                        status[stage.name] = 'skipped'
+                        pending.remove(stage)
+                        continue
+                    if stage.depends_on is not None and stage.depends_on not in outputs:
+                        continue
+                    if any(status.get(name) != 'done' for name in stage.after):
+                        continue
+
+                    args = stage.args
+                    if stage.depends_on is not None:
+                        args = (outputs.pop(stage.depends_on),) + args
+
+                    profile_stage = report.profile_stage if report is not None else None
+                    report_dir = report.report_dir if report is not None else REPORT_DIR
+                    if stage.kind == 'fetch':
+                        # Fetches fan out to their own threads, so their CPU is the process's
+                        future = fetch_pool.submit(run_instrumented, stage.name, stage.func, args, {}, profile_stage,
+                                                   report_dir, threaded=True)
+                    elif stage.kind == 'transform':
+                        future = transform_pool.submit(run_instrumented, stage.name, stage.func, args, {}, profile_stage, report_dir)
+                    else:
+                        future = load_pool.submit(run_with_pooled_connection, conn_pool, stage.name, stage.func, args,
+                                                  profile_stage, report_dir)
+
+                    running[future] = stage
+                    started[stage.name] = time.perf_counter()
+                    pending.remove(stage)
+
+                if not running:
+                    for stage in pending:
+                        status[stage.name] = 'skipped'
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    elapsed = time.perf_counter() - started[stage.name]
+                    try:
+                        outputs[stage.name], stage_metrics = future.result()
+                        status[stage.name] = 'done'
+                        logger.info(f"{stage.name} finished in {elapsed:.1f}s")
+                    except Exception as e:
+                        stage_metrics = [StageMetrics(stage.name, wall_seconds=elapsed, status='failed',
+                                                      error=f"{type(e).__name__}: {e}")]
+                        status[stage.name] = 'failed'
+                        logger.exception(f"{stage.name} failed after {elapsed:.1f}s")
+                    if report is not None:
+                        report.stages.extend(stage_metrics)
+        finally:
+            if conn_pool is not None:
+                conn_pool.closeall()
+
+    return status
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Refresh the Euroleague/Eurocup tables in the Neon database.")
+    parser.add_argument('--competitions', nargs='+', choices=list(COMPETITIONS), default=list(COMPETITIONS))
+    parser.add_argument('--datasets', nargs='+', choices=DATASETS, default=list(DATASETS))
+    parser.add_argument('--full-game-logs', action='store_true',
+                        help="Reload every game log season instead of syncing new games only.")
+    parser.add_argument('--stream-shot-data', action=argparse.BooleanOptionalAction, default=True,
+                        help="Fetch, classify and load shots one season at a time to keep memory flat.")
+    parser.add_argument('--reload-shot-seasons', action='store_true',
+                        help="Truncate and reload each streamed shot season instead of upserting into it.")
+    parser.add_argument('--parquet-dir',
+                        help="Also export the shots as Parquet partitioned by competition and season under this directory.")
+    parser.add_argument('--transform-only', action='store_true',
+                        help="Rerun the transforms and loads on the raw snapshots of the last fetch without calling the API. "
+                             "Implies --full-game-logs and --no-stream-shot-data. Every season needs a snapshot: game logs are "
+                             "only snapshotted by a --full-game-logs fetch, not by the default sync.")
+    parser.add_argument('--player-similarity', action=argparse.BooleanOptionalAction, default=True,
+                        help="Rebuild the player features and most-similar-player tables once the game logs "
+                             "and shots are loaded.")
+    parser.add_argument('--snapshot-path',
+                        help="Also export every table the dashboards read to this read-only SQLite file once all loads "
+                             "finished, replacing the previous snapshot atomically.")
+    parser.add_argument('--swap-tables', action='store_true',
+                        help="Build full reloads in shadow tables and rename them in atomically, keeping the old table. "
+                             "Needs --full-game-logs and --no-stream-shot-data when those datasets are loaded.")
+    parser.add_argument('--restore-previous', action='store_true',
+                        help="Undo the last --swap-tables run for the selected tables and exit.")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="Concurrent fetch threads and transform processes.")
+    parser.add_argument('--db-concurrency', type=int, default=4,
+                        help="Maximum number of loads writing to the database at once.")
+    parser.add_argument('--report-dir', default=REPORT_DIR, help="Where run reports and profiles are written.")
+    parser.add_argument('--profile-stage', default=PROFILE_STAGE,
+                        help="Dump a cProfile of every stage with this name, e.g. classify_zones or copy_upsert.")
+    args = parser.parse_args(argv)
+
+    full_game_logs = args.full_game_logs or args.transform_only
+    stream_shot_data = args.stream_shot_data and not args.transform_only
+    if args.swap_tables and 'game_logs' in args.datasets and not full_game_logs:
+        parser.error("--swap-tables needs --full-game-logs: the incremental game log sync writes in place.")
+    if args.swap_tables and 'shot_data' in args.datasets and stream_shot_data:
+        parser.error("--swap-tables needs --no-stream-shot-data: streamed shots are written in place.")
+    if args.reload_shot_seasons and not stream_shot_data:
+        parser.error("--reload-shot-seasons only applies to streamed shot loads.")
+    if args.transform_only and not args.restore_previous:
+        missing = unsnapshotted_seasons(args.competitions, args.datasets)
+        if missing:
+            parser.error("--transform-only needs a raw snapshot of every season, run a full fetch first. Missing: " +
+                         '; '.join(f"{dataset} {code} {', '.join(map(str, seasons))}"
+                                   for (code, dataset), seasons in missing.items()))
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    if args.restore_previous:
+        restore_previous(args.competitions, args.datasets)
+        return 0
+
+    stages = build_stages(args.competitions, args.datasets, args.full_game_logs, args.stream_shot_data,
+                          args.reload_shot_seasons, args.swap_tables, args.parquet_dir, args.transform_only,
+                          args.player_similarity, args.snapshot_path)
+    with run_report('pipeline', profile_stage=args.profile_stage, report_dir=args.report_dir) as report:
+        status = run_stages(stages, workers=args.workers, db_concurrency=args.db_concurrency, report=report)
+
+    for name, result in status.items():
+        logger.info(f"{name}: {result}")
+    return 1 if any(result != 'done' for result in status.values()) else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Per player-season feature vectors from the game logs and shot zones, and the most similar player-seasons for each
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from BulkLoader import connect_to_db
+from Competitions import get_competition, shot_zone_table_names
+from EtlMetrics import run_report, track
+from GameLogs import game_logs_table_name, minutes_to_seconds, safe_divide
+from ShotData import relation_kind, shot_data_table_name
+from TableSchemas import (
+    PLAYER_FEATURES_SCHEMA, PLAYER_RATE_COLUMNS, PLAYER_SIMILARITY_SCHEMA, ZONE_BINS, ZONE_SHARE_COLUMNS,
+    create_table_sql, upsert_frame
+)
+
+TOP_K = int(os.getenv("PLAYER_SIMILARITY_TOP_K", "10"))
+MIN_MINUTES = int(os.getenv("PLAYER_SIMILARITY_MIN_MINUTES", "100"))
+BLOCK_SIZE = 1024
+PER40_SOURCES = {
+    'points_per40': 'points', 'fga2_per40': 'field_goals_attempted_2', 'fga3_per40': 'field_goals_attempted_3',
+    'fta_per40': 'free_throws_attempted', 'orb_per40': 'offensive_rebounds', 'drb_per40': 'defensive_rebounds',
+    'ast_per40': 'assistances', 'stl_per40': 'steals', 'tov_per40': 'turnovers', 'blk_per40': 'blocks_favour',
+    'fouls_per40': 'fouls_commited', 'fouls_drawn_per40': 'fouls_received',
+}
+PCT_SOURCES = {
+    'fg2_pct': ('field_goals_made_2', 'field_goals_attempted_2'),
+    'fg3_pct': ('field_goals_made_3', 'field_goals_attempted_3'),
+    'ft_pct': ('free_throws_made', 'free_throws_attempted'),
+}
+COUNT_COLUMNS = sorted(set(PER40_SOURCES.values()) | {column for pair in PCT_SOURCES.values() for column in pair})
+FEATURE_COLUMNS = PLAYER_RATE_COLUMNS + ZONE_SHARE_COLUMNS
+
+def similarity_table_names(table_name: str) -> tuple:
+    return (table_name.replace('game_logs_', 'player_features_', 1),
+            table_name.replace('game_logs_', 'player_similarity_', 1))
+
+def create_similarity_tables(cursor, table_name: str, drop_existing: bool = False):
+    features_table, similarity_table = similarity_table_names(table_name)
+    cursor.execute(create_table_sql(features_table, PLAYER_FEATURES_SCHEMA, drop_existing))
+    cursor.execute(create_table_sql(similarity_table, PLAYER_SIMILARITY_SCHEMA, drop_existing))
+
+def fetch_player_games(cursor, table_name: str, seasons: list) -> pd.DataFrame:
+    columns = ['season', 'round', 'gamecode', 'player_id', 'player', 'team', 'minutes'] + COUNT_COLUMNS
+    cursor.execute(f"""
+    SELECT {', '.join(columns)}
+    FROM {table_name}
+    WHERE row_type = 'player' AND season = ANY(%s)
+    """, (seasons,))
+    return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+def fetch_zone_attempts(cursor, zone_table: str, seasons: list) -> pd.DataFrame:
+    columns = ['season', 'player_id', 'bin', 'attempts']
+    if relation_kind(cursor, zone_table) is None:
+        return pd.DataFrame([], columns=columns)
+    cursor.execute(f"""
+    SELECT season, TRIM(id_player), bin, SUM(attempts)
+    FROM {zone_table}
+    WHERE season = ANY(%s)
+    GROUP BY season, TRIM(id_player), bin
+    """, (seasons,))
+    return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+def fetch_player_features(cursor, features_table: str) -> pd.DataFrame:
+    columns = PLAYER_FEATURES_SCHEMA.column_names
+    cursor.execute(f"SELECT {', '.join(columns)} FROM {features_table} ORDER BY season, player_id")
+    features = pd.DataFrame(cursor.fetchall(), columns=columns)
+    features[list(FEATURE_COLUMNS)] = features[list(FEATURE_COLUMNS)].astype(float)
+    return features
+
+def calculate_player_features(player_games: pd.DataFrame, zone_attempts: pd.DataFrame,
+                              min_seconds: int = MIN_MINUTES * 60) -> pd.DataFrame:
+    """Per-40 box score rates, shooting percentages and the share of shots from each zone, per player and season.
+
+    Players under min_seconds are left out, their rates are mostly noise. Shares are over the shots with a
+    known zone and stay empty for a player without any."""
+    games = player_games.assign(
+        player_id=player_games['player_id'].str.strip(),
+        seconds_played=minutes_to_seconds(player_games['minutes']),
+        game_order=pd.to_numeric(player_games['gamecode'], errors='coerce'),
+    )
+    games = games[games['seconds_played'] > 0]
+    games[COUNT_COLUMNS] = games[COUNT_COLUMNS].apply(pd.to_numeric, errors='coerce').fillna(0)
+    # Sorted by game, so a player traded mid-season is listed with the team they finished with
+    games = games.sort_values(['season', 'round', 'game_order'], kind='stable')
+
+    features = games.groupby(['season', 'player_id'], sort=False).agg(
+        player=('player', 'last'), team=('team', 'last'), games=('gamecode', 'nunique'),
+        **{column: (column, 'sum') for column in ['seconds_played'] + COUNT_COLUMNS}
+    ).reset_index()
+    features = features[features['seconds_played'] >= min_seconds]
+    for name, source in PER40_SOURCES.items():
+        features[name] = features[source] * 40 * 60 / features['seconds_played']
+    for name, (made, attempted) in PCT_SOURCES.items():
+        features[name] = safe_divide(features[made], features[attempted])
+
+    zones = zone_attempts.pivot_table(index=['season', 'player_id'], columns='bin', values='attempts',
+                                      aggfunc='sum', fill_value=0)
+    zones = zones.reindex(columns=ZONE_BINS, fill_value=0).astype(float)
+    known = zones[ZONE_BINS[1:]]
+    shares = known.div(known.sum(axis=1).where(known.sum(axis=1) > 0), axis=0)
+    shares.columns = list(ZONE_SHARE_COLUMNS)
+    shares['shot_attempts'] = zones.sum(axis=1)
+
+    features = features.merge(shares.reset_index(), on=['season', 'player_id'], how='left')
+    features['shot_attempts'] = features['shot_attempts'].fillna(0)
+    return features[PLAYER_FEATURES_SCHEMA.column_names]
+
+def standardized_vectors(features: pd.DataFrame) -> np.ndarray:
+    """Z-scores within each season, so eras with a different pace compare fairly, scaled to unit length.
+
+    A feature a player has no value for counts as the season average."""
+    values = features[list(FEATURE_COLUMNS)].astype(float)
+    by_season = values.groupby(features['season'].to_numpy())
+    spread = by_season.transform('std', ddof=0)
+    z_scores = ((values - by_season.transform('mean')) / spread.where(spread > 0)).fillna(0)
+    vectors = z_scores.to_numpy(dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+def nearest_neighbours(vectors: np.ndarray, groups: np.ndarray, k: int, block_size: int = BLOCK_SIZE) -> tuple:
+    """The k rows with the highest cosine similarity to every row, never from the row's own group.
+
+    Works through block_size rows at a time, so only a block of the similarity matrix is ever in memory.
+    Returns (indices, similarities), best first, with -1 where there are fewer than k candidates."""
+    n = len(vectors)
+    k = min(k, n)
+    indices = np.full((n, k), -1, dtype=np.int64)
+    similarities = np.full((n, k), np.nan, dtype=np.float32)
+    if k == 0:
+        return indices, similarities
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        block = vectors[start:stop] @ vectors.T
+        block[groups[start:stop, None] == groups[None, :]] = -np.inf
+
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_similarities = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_similarities, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_similarities = np.take_along_axis(top_similarities, order, axis=1)
+
+        found = np.isfinite(top_similarities)
+        indices[start:stop] = np.where(found, top, -1)
+        similarities[start:stop] = np.where(found, top_similarities, np.nan)
+    return indices, similarities
+
+def calculate_player_similarity(features: pd.DataFrame, top_k: int = TOP_K) -> pd.DataFrame:
+    """The top_k most similar player-seasons of every player-season, from any season but never the same player."""
+    features = features.reset_index(drop=True)
+    labels = features[['season', 'player_id', 'player', 'team']]
+    indices, similarities = nearest_neighbours(standardized_vectors(features), pd.factorize(features['player_id'])[0], top_k)
+
+    query = np.repeat(np.arange(len(features)), indices.shape[1])
+    neighbour = indices.ravel()
+    found = neighbour >= 0
+    similar = labels.iloc[query[found]].reset_index(drop=True)
+    similar['rank'] = np.tile(np.arange(1, indices.shape[1] + 1), len(features))[found]
+    similar[['similar_season', 'similar_player_id', 'similar_player', 'similar_team']] = (
+        labels.iloc[neighbour[found]].to_numpy())
+    # Rounded, so a small change in one season does not rewrite every neighbour list that touches it
+    similar['similarity'] = similarities.ravel()[found].round(4)
+    return similar
+
+def refresh_player_similarity(competition_type: str, seasons: list = None, top_k: int = TOP_K, conn=None):
+    """Rebuild the features of seasons (every loaded season when None), then the neighbours of every player-season.
+
+    A season's features only depend on its own games, so a sync only needs its own seasons rebuilt; the
+    neighbour lists are recomputed in full, which takes well under a second, and only the changed rows are written."""
+    table_name = game_logs_table_name(competition_type)
+    features_table, similarity_table = similarity_table_names(table_name)
+    zone_table = shot_zone_table_names(shot_data_table_name(competition_type))[1]
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_to_db()
+    cursor = conn.cursor()
+
+    try:
+        create_similarity_tables(cursor, table_name)
+        conn.commit()
+
+        if seasons is None:
+            cursor.execute(f"SELECT DISTINCT season FROM {table_name} WHERE season IS NOT NULL")
+            seasons = [season for season, in cursor.fetchall()]
+        seasons = sorted(int(season) for season in seasons)
+
+        player_games = fetch_player_games(cursor, table_name, seasons)
+        with track(f"calculate_player_features {features_table}", rows_in=len(player_games)) as metrics:
+            features = calculate_player_features(player_games, fetch_zone_attempts(cursor, zone_table, seasons))
+            metrics.rows_out = len(features)
+        upsert_frame(cursor, features, features_table, PLAYER_FEATURES_SCHEMA, delete_missing=True,
+                     scope={'season': seasons})
+
+        features = fetch_player_features(cursor, features_table)
+        with track(f"calculate_player_similarity {similarity_table}", rows_in=len(features)) as metrics:
+            similar = calculate_player_similarity(features, top_k)
+            metrics.rows_out = len(similar)
+        upsert_frame(cursor, similar, similarity_table, PLAYER_SIMILARITY_SCHEMA, delete_missing=True)
+        with track('commit'):
+            conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+
+def update_player_similarity(competition_type: str, seasons: list = None):
+    competition = get_competition(competition_type)
+    with run_report(f"player_similarity:{competition.code}"):
+        refresh_player_similarity(competition, seasons)
+
+if __name__ == "__main__":
+    # Update Euroleague player similarity
+    update_player_similarity('E')
+
+    # Update Eurocup player similarity
+    update_player_similarity('U')
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Read API for the dashboards: typed queries on pooled connections, cached until the data version of what they read changes
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import psycopg2
+from psycopg2.pool import PoolError
+
+from BulkLoader import create_connection_pool
+from Competitions import get_competition, shot_zone_table_names
+from DataVersions import fetch_data_versions
+
+logger = logging.getLogger(__name__)
+
+MAX_CONNECTIONS = int(os.getenv("QUERY_MAX_CONNECTIONS", "8"))
+CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "86400"))
+VERSION_CHECK_SECONDS = float(os.getenv("QUERY_VERSION_CHECK_SECONDS", "2"))
+
+_MISSING = object()
+
+@dataclass(frozen=True)
+class PlayerSplit:
+    split: str
+    value: str
+    games: int
+    minutes: float
+    points: float
+    rebounds: float
+    assists: float
+    valuation: float
+    plusminus: float
+
+@dataclass(frozen=True)
+class ScheduleGame:
+    round: int
+    phase: str
+    game_date: str
+    gamecode: str
+    opponent: str
+    opponentcode: str
+    location: str
+    result: str
+    team_score: int
+    opponent_score: int
+    record: str
+
+@dataclass(frozen=True)
+class ShotZone:
+    bin: str
+    attempts: int
+    makes: int
+    points: int
+    fg_pct: float
+    share: float
+
+PLAYER_SPLITS_SQL = """
+WITH games AS (
+    SELECT
+        phase, home, points, total_rebounds, assistances, valuation, plusminus,
+        split_part(trim(minutes), ':', 1)::INTEGER * 60 + split_part(trim(minutes), ':', 2)::INTEGER AS seconds
+    FROM {table}
+    WHERE player_id = %s AND season = %s AND row_type = 'player'
+        AND minutes ~ '^[[:space:]]*[0-9]+:[0-9]{{1,2}}[[:space:]]*$'
+)
+SELECT
+    CASE WHEN GROUPING(phase) = 0 THEN 'phase' WHEN GROUPING(home) = 0 THEN 'location' ELSE 'season' END,
+    CASE WHEN GROUPING(phase) = 0 THEN phase
+         WHEN GROUPING(home) = 0 THEN CASE home WHEN 1 THEN 'home' ELSE 'away' END
+         ELSE 'all' END,
+    COUNT(*),
+    AVG(seconds)::FLOAT8 / 60,
+    AVG(points)::FLOAT8,
+    AVG(total_rebounds)::FLOAT8,
+    AVG(assistances)::FLOAT8,
+    AVG(valuation)::FLOAT8,
+    AVG(plusminus)::FLOAT8
+FROM games
+WHERE seconds > 0
+GROUP BY GROUPING SETS ((), (phase), (home))
+ORDER BY 1, 2
+"""
+
+TEAM_SCHEDULE_SQL = """
+SELECT round, phase, game_date, gamecode, opponent, opponentcode, location, result, team_score, opponent_score, record
+FROM {table}
+WHERE team = %s AND season = %s
+ORDER BY round, gamecode
+"""
+
+SHOT_ZONES_SQL = """
+SELECT bin, SUM(attempts), SUM(makes), SUM(points)
+FROM {table}
+WHERE {key_column} = %s AND season = %s{phase_filter}
+GROUP BY bin
+ORDER BY bin
+"""
+
+class ResultCache:
+    """Thread-safe LRU of query results, each kept for at most ttl seconds. A max_size of 0 disables it."""
+
+    def __init__(self, max_size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return _MISSING
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+class QueryService:
+    """The dashboard queries, each cached under the data version of the (table, season) it reads.
+
+    Loaders bump that version in the transaction that commits new rows, so a result is reused until the
+    rows behind it change and no longer; other seasons and tables keep their cached results. The versions
+    are re-read at most every version_check_seconds, which bounds how long a result can lag a load."""
+
+    def __init__(self, max_connections: int = MAX_CONNECTIONS, cache_size: int = CACHE_SIZE, ttl: float = CACHE_TTL,
+                 version_check_seconds: float = VERSION_CHECK_SECONDS):
+        self.pool = create_connection_pool(max_connections)
+        # The pool raises instead of waiting when every connection is out, so callers queue here for one
+        self.pool_slots = threading.BoundedSemaphore(max_connections)
+        self.cache = ResultCache(cache_size, ttl)
+        self.version_check_seconds = version_check_seconds
+        self.versions = {}
+        self.versions_checked = None
+        self.version_lock = threading.Lock()
+
+    def close(self):
+        self.pool.closeall()
+
+    @contextmanager
+    def connection(self):
+        with self.pool_slots:
+            conn = self.pool.getconn()
+            try:
+                # Autocommit, so an idle reader never holds a transaction open against a loader's DDL
+                if not conn.autocommit:
+                    conn.set_session(readonly=True, autocommit=True)
+                yield conn
+            finally:
+                self.pool.putconn(conn)
+
+    def query(self, sql: str, params: tuple) -> list:
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+
+    def data_version(self, table_name: str, season: int) -> int:
+        with self.version_lock:
+            now = time.monotonic()
+            if self.versions_checked is None or now - self.versions_checked >= self.version_check_seconds:
+                with self.connection() as conn:
+                    with conn.cursor() as cursor:
+                        self.versions = fetch_data_versions(cursor)
+                self.versions_checked = now
+            return self.versions.get((table_name, season), 0)
+
+    def cached(self, name: str, table_name: str, season: int, args: tuple, run):
+        key = (name, args, self.data_version(table_name, season))
+        result = self.cache.get(key)
+        if result is _MISSING:
+            result = run()
+            self.cache.put(key, result)
+        return result
+
+    def player_season_splits(self, competition_type: str, player_id: str, season: int) -> tuple:
+        """Per-game averages of a player's season, overall and split by phase and by home/away."""
+        table_name = get_competition(competition_type).table_name('game_logs')
+        sql = PLAYER_SPLITS_SQL.format(table=table_name)
+        return self.cached('player_season_splits', table_name, season, (table_name, player_id, season),
+                           lambda: tuple(PlayerSplit(*row) for row in self.query(sql, (player_id, season))))
+
+    def team_schedule(self, competition_type: str, team: str, season: int) -> tuple:
+        """Every game of a team's season in round order, with the running record."""
+        table_name = get_competition(competition_type).table_name('schedule_results')
+        sql = TEAM_SCHEDULE_SQL.format(table=table_name)
+        return self.cached('team_schedule', table_name, season, (table_name, team, season),
+                           lambda: tuple(ScheduleGame(*row) for row in self.query(sql, (team, season))))
+
+    def shot_zones(self, competition_type: str, season: int, team: str = None, player_id: str = None,
+                   phase: str = None) -> tuple:
+        """Attempts, percentage and share of shots per zone for one team (its shot data code) or one player, in one
+        phase or all."""
+        if (team is None) == (player_id is None):
+            raise ValueError("Pass exactly one of team and player_id.")
+        table_name = get_competition(competition_type).table_name('shot_data')
+        team_zone_table, player_zone_table = shot_zone_table_names(table_name)
+        sql = SHOT_ZONES_SQL.format(
+            table=team_zone_table if team is not None else player_zone_table,
+            key_column='team' if team is not None else 'id_player',
+            phase_filter=' AND phase = %s' if phase is not None else '',
+        )
+        params = (team if team is not None else player_id, season) + ((phase,) if phase is not None else ())
+
+        def run():
+            rows = self.query(sql, params)
+            total = sum(attempts for _, attempts, _, _ in rows)
+            return tuple(
+                ShotZone(bin_name, int(attempts), int(makes), int(points),
+                         makes / attempts if attempts else None, attempts / total if total else None)
+                for bin_name, attempts, makes, points in rows
+            )
+        return self.cached('shot_zones', table_name, season, (table_name, team, player_id, phase), run)
+
+# Path -> (QueryService method, {parameter: type}) for the HTTP endpoint
+ROUTES = {
+    '/player_splits': ('player_season_splits', {'competition_type': str, 'player_id': str, 'season': int}),
+    '/team_schedule': ('team_schedule', {'competition_type': str, 'team': str, 'season': int}),
+    '/shot_zones': ('shot_zones', {'competition_type': str, 'season': int, 'team': str, 'player_id': str, 'phase': str}),
+}
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def send_json(self, status: int, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path not in ROUTES:
+            self.send_json(404, {'error': f"Unknown path {url.path}, expected one of {', '.join(ROUTES)}."})
+            return
+        method, parameters = ROUTES[url.path]
+        query = dict(parse_qsl(url.query))
+        query.setdefault('competition_type', query.pop('competition', None))
+        try:
+            kwargs = {name: cast(query[name]) for name, cast in parameters.items() if query.get(name) is not None}
+            rows = getattr(self.server.service, method)(**kwargs)
+        except (TypeError, ValueError) as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        except (psycopg2.Error, PoolError) as e:
+            # The database error stays in the log; the client only learns the query failed
+            logger.error(f"{url.path} {kwargs} failed: {type(e).__name__}: {e}")
+            self.send_json(500, {'error': f"Query {method} failed, try again later."})
+            return
+        self.send_json(200, [asdict(row) for row in rows])
+
+def start_query_server(service: QueryService, host: str = '127.0.0.1', port: int = 8080) -> ThreadingHTTPServer:
+    """Serve the queries as JSON in a daemon thread, e.g. GET /team_schedule?competition=E&team=...&season=2024."""
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.service = service
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the dashboard queries over HTTP on a local port.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-connections', type=int, default=MAX_CONNECTIONS)
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help="Cached results kept, 0 to disable the cache.")
+    parser.add_argument('--ttl', type=float, default=CACHE_TTL, help="Seconds a cached result is kept at most.")
+    parser.add_argument('--version-check-seconds', type=float, default=VERSION_CHECK_SECONDS,
+                        help="How often the data versions are re-read.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    service = QueryService(args.max_connections, args.cache_size, args.ttl, args.version_check_seconds)
+    server = start_query_server(service, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"Serving {', '.join(ROUTES)} on http://{host}:{port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    finally:
+        service.close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Raw fetched frames kept per competition/season as uncompressed Arrow files, so transforms can rerun without the API
+
+import datetime
+import glob
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from EtlMetrics import track
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.getenv("EUROLEAGUE_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".euroleague_snapshots"))
+MIXED_COLUMNS_KEY = b'mixed_columns'
+MIXED_TYPE_SUFFIX = '__type'
+MIXED_VALUE_PARSERS = {
+    'str': str,
+    'int': int,
+    'float': float,
+    'bool': lambda value: value == 'True',
+    'json': json.loads,
+}
+
+def season_snapshot_dir(competition: str, dataset: str, season: int, snapshot_dir: str = SNAPSHOT_DIR) -> str:
+    return os.path.join(snapshot_dir, competition, dataset, f"season={season}")
+
+def snapshot_path(competition: str, dataset: str, season: int, fetch_date: datetime.date, snapshot_dir: str = SNAPSHOT_DIR) -> str:
+    return os.path.join(season_snapshot_dir(competition, dataset, season, snapshot_dir), f"fetched={fetch_date.isoformat()}.arrow")
+
+def to_arrow_table(df: pd.DataFrame) -> 'pa.Table':
+    """Arrow wants one type per column, so object columns it cannot type (numbers mixed with 'DNP') are stored
+    as strings next to a column tagging each value's type, and listed in the schema metadata for read_snapshot
+    to rebuild the original values from."""
+    # pyarrow is only needed once snapshots are written or read, so the fetchers import without it
+    import pyarrow as pa
+
+    mixed_columns = []
+    df = df.copy(deep=False)
+    for column in df.columns[df.dtypes == object]:
+        try:
+            pa.array(df[column], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            mixed_columns.append(column)
+            tags = df[column].map(mixed_value_tag)
+            df[column] = [encode_mixed_value(value, tag) for value, tag in zip(df[column], tags)]
+            df[f"{column}{MIXED_TYPE_SUFFIX}"] = tags
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[MIXED_COLUMNS_KEY] = json.dumps(mixed_columns).encode('utf-8')
+    return table.replace_schema_metadata(metadata)
+
+def mixed_value_tag(value) -> str:
+    # None is a missing value; NaN is a float and comes back as one
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return 'bool'
+    if isinstance(value, (int, np.integer)):
+        return 'int'
+    if isinstance(value, (float, np.floating)):
+        return 'float'
+    if isinstance(value, (list, dict)):
+        return 'json'
+    return 'str'
+
+def encode_mixed_value(value, tag: str) -> str:
+    if tag is None:
+        return None
+    return json.dumps(value) if tag == 'json' else str(value)
+
+def parse_mixed_value(value):
+    for parse in (int, float):
+        try:
+            return parse(value)
+        except ValueError:
+            pass
+    return value
+
+def restore_mixed_column(values: pd.Series, tags: pd.Series = None) -> pd.Series:
+    values = values.astype(object).where(values.notna(), None)
+    if tags is None:
+        # Snapshots written before the type tags: numbers are parsed back, anything else stays a string
+        parsed = {value: parse_mixed_value(value) for value in values.dropna().unique()}
+        return values.map(parsed).where(values.notna(), None)
+    tags = tags.astype(object).where(tags.notna(), None)
+    keys = list(zip(tags, values))
+    parsed = {(tag, value): MIXED_VALUE_PARSERS[tag](value) if tag is not None else None for tag, value in set(keys)}
+    return pd.Series([parsed[key] for key in keys], index=values.index, dtype=object)
+
+def write_season_snapshot(competition: str, dataset: str, season: int, df: pd.DataFrame,
+                          fetch_date: datetime.date = None, snapshot_dir: str = SNAPSHOT_DIR) -> str:
+    """Replace the season's snapshot with df; the fetch date in the file name tells readers how fresh it is."""
+    import pyarrow.feather as feather
+
+    path = snapshot_path(competition, dataset, season, fetch_date or datetime.date.today(), snapshot_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    # Uncompressed, so readers can memory-map the columns instead of decoding them
+    feather.write_feather(to_arrow_table(df.reset_index(drop=True)), tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+    for old_path in glob.glob(os.path.join(os.path.dirname(path), 'fetched=*.arrow')):
+        if old_path != path:
+            os.remove(old_path)
+    return path
+
+def write_season_snapshots(competition: str, dataset: str, fetched_df: pd.DataFrame, snapshot_dir: str = SNAPSHOT_DIR) -> list:
+    if fetched_df.empty or 'Season' not in fetched_df.columns:
+        return []
+    with track(f"write_snapshots {dataset}", rows_in=len(fetched_df)) as metrics:
+        paths = [
+            write_season_snapshot(competition, dataset, int(season), season_df, snapshot_dir=snapshot_dir)
+            for season, season_df in fetched_df.groupby('Season', sort=True)
+        ]
+        metrics.rows_out = len(fetched_df)
+    return paths
+
+def latest_snapshot(competition: str, dataset: str, season: int, snapshot_dir: str = SNAPSHOT_DIR) -> str:
+    paths = sorted(glob.glob(os.path.join(season_snapshot_dir(competition, dataset, season, snapshot_dir), 'fetched=*.arrow')))
+    return paths[-1] if paths else None
+
+def read_snapshot(path: str) -> pd.DataFrame:
+    import pyarrow.feather as feather
+
+    # Memory-mapped: numeric columns without nulls come back as views of the file rather than copies
+    table = feather.read_table(path, memory_map=True)
+    mixed_columns = json.loads((table.schema.metadata or {}).get(MIXED_COLUMNS_KEY, b'[]'))
+    df = table.to_pandas(split_blocks=True)
+    for column in mixed_columns:
+        tag_column = f"{column}{MIXED_TYPE_SUFFIX}"
+        df[column] = restore_mixed_column(df[column], df.pop(tag_column) if tag_column in df.columns else None)
+    return df
+
+def missing_seasons(competition: str, dataset: str, start_season: int, end_season: int, snapshot_dir: str = SNAPSHOT_DIR) -> list:
+    return [season for season in range(start_season, end_season + 1)
+            if latest_snapshot(competition, dataset, season, snapshot_dir) is None]
+
+def read_seasons(competition: str, dataset: str, start_season: int, end_season: int, snapshot_dir: str = SNAPSHOT_DIR) -> pd.DataFrame:
+    """The latest snapshot of every season in the range, concatenated like a fresh fetch_seasons result.
+
+    Raises when a season has no snapshot: the full reloads fed from here delete every season they are not given."""
+    missing = missing_seasons(competition, dataset, start_season, end_season, snapshot_dir)
+    if missing:
+        raise ValueError(f"No {dataset} snapshot for {competition} seasons {', '.join(map(str, missing))}, "
+                         f"run a full fetch first.")
+    seasons = range(start_season, end_season + 1)
+    with track(f"read_snapshots {dataset}", rows_in=len(seasons)) as metrics:
+        frames = [read_snapshot(latest_snapshot(competition, dataset, season, snapshot_dir)) for season in seasons]
+        snapshot_df = pd.concat(frames, axis=0, ignore_index=True)
+        metrics.rows_out = len(snapshot_df)
+    return snapshot_df
@@ -8,216 +8,206 @@
 
 
 import pandas as pd
+import numpy as np
 from euroleague_api.game_stats import GameStats
-import psycopg2
-from psycopg2.extras import execute_values
-import os
 
-def create_team_records_dataset(df: pd.DataFrame, competition_type: str) -> pd.DataFrame:
-    all_team_records = []
-    all_teams = set(df['local.club.name'].unique()).union(df['road.club.name'].unique())
-
-    if competition_type == 'E':
-        phase_order = {'RS': 0, 'PI': 1, 'PO': 2, 'FF': 3}
-    elif competition_type == 'U':
-        phase_order = {'RS': 0, '8F': 1, '4F': 2}
-    else:
-        raise ValueError("Invalid competition_type. Must be 'E' for Euroleague or 'U' for Eurocup.")
-
-    for team in all_teams:
-        team_games = df[(df['local.club.name'] == team) | (df['road.club.name'] == team)].copy()
-
-        team_games['PhaseOrder'] = team_games['Phase'].map(phase_order)
-        team_games = team_games.sort_values(['Season', 'PhaseOrder', 'Round', 'localDate'])
-
-        for season, season_games in team_games.groupby('Season'):
-            wins = 0
-            losses = 0
-            current_phase_group = None
-
-            for idx, game in season_games.iterrows():
-                if game['Phase'] == 'RS':
-                    phase_group = 'RS'
-                elif competition_type == 'E' and game['Phase'] in ['PI', 'PO', 'FF']:
-                    phase_group = 'POSTSEASON'
-                elif competition_type == 'U' and game['Phase'] in ['8F', '4F']:
-                    phase_group = 'POSTSEASON'
-                else:
-                    phase_group = game['Phase']
-
-                if current_phase_group != phase_group:
-                    current_phase_group = phase_group
-                    wins = 0
-                    losses = 0
-
-                if game['local.club.name'] == team:
-                    location = 'Home'
-                    team_score = game['local.score']
-                    opponent_score = game['road.score']
-                    opponent = game['road.club.name']
-                    team_code = game['local.club.code']
-                    team_image = game['local.club.images.crest']
-                    opponent_code = game['road.club.code']
-                    opponent_image = game['road.club.images.crest']
-                else:
-                    location = 'Away'
-                    team_score = game['road.score']
-                    opponent_score = game['local.score']
-                    opponent = game['local.club.name']
-                    team_code = game['road.club.code']
-                    team_image = game['road.club.images.crest']
-                    opponent_code = game['local.club.code']
-                    opponent_image = game['local.club.images.crest']
-
-                if team_score > opponent_score:
-                    result = 'Win'
-                    wins += 1
-                elif team_score < opponent_score:
-                    result = 'Loss'
-                    losses += 1
-                else:
-                    result = 'Draw'
-
-                record = f"{wins}-{losses}"
-
-                all_team_records.append({
-                    'Team': team,
-                    'TeamCode': team_code,
-                    'TeamImage': team_image,
-                    'Date': game['localDate'],
-                    'Opponent': opponent,
-                    'OpponentCode': opponent_code,
-                    'OpponentImage': opponent_image,
-                    'Round': game['Round'],
-                    'Result': result,
-                    'Location': location,
-                    'Record': record,
-                    'Team_Score': team_score,
-                    'Opponent_Score': opponent_score,
-                    'Gamecode': game['Gamecode'],
-                    'Season': game['Season'],
-                    'Phase': game['Phase'],
-                    'PhaseGroup': phase_group
-                })
-
-    team_records_df = pd.DataFrame(all_team_records)
-    team_records_df = team_records_df.sort_values(['Team', 'Season', 'PhaseGroup', 'Round', 'Date'])
+from BulkLoader import connect_to_db
+from Competitions import get_competition
+from DataVersions import bump_data_versions
+from EtlMetrics import run_report, track
+from GameFetcher import fetch_seasons
+from TableSchemas import HEAD_TO_HEAD_SCHEMA, SCHEDULE_RESULTS_SCHEMA, STANDINGS_SCHEMA, create_table_sql, upsert_frame
+from TableSwap import shadow_table_name, swap_in_shadow_tables
 
-    return team_records_df
+RUNNING_COLUMNS = ['Games', 'Wins', 'Losses', 'PointsFor', 'PointsAgainst', 'HomeWins', 'HomeLosses', 'AwayWins', 'AwayLosses']
+STANDINGS_KEYS = ['Season', 'PhaseGroup', 'Round', 'Team']
 
+def create_team_records_dataset(df: pd.DataFrame, competition_type: str) -> pd.DataFrame:
+    competition = get_competition(competition_type)
+
+    with track('create_team_records_dataset', rows_in=len(df)) as metrics:
+        games = df.reset_index(drop=True)
+        team_perspectives = []
+        for location, team_side, opponent_side in [('Home', 'local', 'road'), ('Away', 'road', 'local')]:
+            team_perspectives.append(pd.DataFrame({
+                'Team': games[f'{team_side}.club.name'],
+                'TeamCode': games[f'{team_side}.club.code'],
+                'TeamImage': games[f'{team_side}.club.images.crest'],
+                'Date': games['localDate'],
+                'Opponent': games[f'{opponent_side}.club.name'],
+                'OpponentCode': games[f'{opponent_side}.club.code'],
+                'OpponentImage': games[f'{opponent_side}.club.images.crest'],
+                'Round': games['Round'],
+                'Location': location,
+                'Team_Score': games[f'{team_side}.score'],
+                'Opponent_Score': games[f'{opponent_side}.score'],
+                'Gamecode': games['Gamecode'],
+                'Season': games['Season'],
+                'Phase': games['Phase'],
+                'GameOrder': games.index,
+            }))
+        team_records_df = pd.concat(team_perspectives, ignore_index=True)
+        # A game is only listed once per team, from the home side when a club plays itself.
+        duplicate_side = (team_records_df['Location'] == 'Away') & (team_records_df['Team'] == team_records_df['Opponent'])
+        metrics.drop((team_records_df['Team'].isna() & ~duplicate_side).sum(), 'missing team')
+        metrics.drop(duplicate_side.sum(), 'club played itself')
+        team_records_df = team_records_df[team_records_df['Team'].notna() & ~duplicate_side]
+
+        team_records_df['PhaseOrder'] = team_records_df['Phase'].map(competition.phase_order)
+        team_records_df['PhaseGroup'] = np.where(
+            team_records_df['Phase'] == 'RS', 'RS',
+            np.where(team_records_df['Phase'].isin(competition.postseason_phases), 'POSTSEASON', team_records_df['Phase'])
+        )
+        team_records_df['Result'] = np.select(
+            [team_records_df['Team_Score'] > team_records_df['Opponent_Score'],
+             team_records_df['Team_Score'] < team_records_df['Opponent_Score']],
+            ['Win', 'Loss'],
+            default='Draw'
+        )
+
+        team_records_df = team_records_df.sort_values(['Team', 'Season', 'PhaseOrder', 'Round', 'Date', 'GameOrder'])
+        # Running records restart every time a team's season moves into a new phase group.
+        previous_group = team_records_df.groupby(['Team', 'Season'])['PhaseGroup'].shift()
+        phase_run = team_records_df['PhaseGroup'].ne(previous_group).cumsum()
+        won = team_records_df['Result'] == 'Win'
+        lost = team_records_df['Result'] == 'Loss'
+        home = team_records_df['Location'] == 'Home'
+        running = pd.DataFrame({
+            'Games': 1,
+            'Wins': won.astype(int),
+            'Losses': lost.astype(int),
+            'PointsFor': team_records_df['Team_Score'],
+            'PointsAgainst': team_records_df['Opponent_Score'],
+            'HomeWins': (won & home).astype(int),
+            'HomeLosses': (lost & home).astype(int),
+            'AwayWins': (won & ~home).astype(int),
+            'AwayLosses': (lost & ~home).astype(int),
+        }, index=team_records_df.index).groupby(phase_run).cumsum()
+        team_records_df[RUNNING_COLUMNS] = running[RUNNING_COLUMNS]
+        team_records_df['Record'] = team_records_df['Wins'].astype(str) + '-' + team_records_df['Losses'].astype(str)
+        # The streak is the run of identical results ending with this game, e.g. W3
+        streak_run = (team_records_df['Result'].ne(team_records_df['Result'].shift()) | phase_run.ne(phase_run.shift())).cumsum()
+        team_records_df['Streak'] = (
+            team_records_df['Result'].str[0] + (team_records_df.groupby(streak_run).cumcount() + 1).astype(str)
+        )
+
+        team_records_df = team_records_df.sort_values(['Team', 'Season', 'PhaseGroup', 'Round', 'Date'])
+        team_records_df = team_records_df[[
+            'Team', 'TeamCode', 'TeamImage', 'Date', 'Opponent', 'OpponentCode', 'OpponentImage',
+            'Round', 'Result', 'Location', 'Record', 'Team_Score', 'Opponent_Score', 'Gamecode',
+            'Season', 'Phase', 'PhaseGroup', *RUNNING_COLUMNS, 'Streak'
+        ]].reset_index(drop=True)
+        metrics.rows_out = len(team_records_df)
 
-def insert_schedule_results_to_db(team_records_df: pd.DataFrame, table_name: str):
-    conn_str = os.getenv("DATABASE_URL")
-    if not conn_str:
-        raise ValueError("DATABASE_URL environment variable not set.")
+    return team_records_df
 
-    conn = psycopg2.connect(conn_str)
+def create_standings_datasets(team_records_df: pd.DataFrame) -> tuple:
+    """Standings after every round a phase group played, and head-to-head totals, from the running team records.
+
+    Each team gets a row for every round of its season's phase group, carrying its record forward through the
+    rounds it did not play, so the standings after any round are one lookup."""
+    with track('create_standings_datasets', rows_in=len(team_records_df)) as metrics:
+        group_keys = ['Season', 'PhaseGroup']
+        played = team_records_df.sort_values(STANDINGS_KEYS + ['Date']).drop_duplicates(STANDINGS_KEYS, keep='last')
+        rounds = played[group_keys + ['Round', 'Phase']].drop_duplicates(group_keys + ['Round'])
+        teams = played[group_keys + ['Team', 'TeamCode']].drop_duplicates(group_keys + ['Team'])
+        standings_df = (
+            rounds.merge(teams, on=group_keys)
+            .merge(played[STANDINGS_KEYS + RUNNING_COLUMNS + ['Streak']], on=STANDINGS_KEYS, how='left')
+            .sort_values(['Team'] + group_keys + ['Round'])
+        )
+        carried = standings_df.groupby(['Team'] + group_keys)[RUNNING_COLUMNS + ['Streak']].ffill()
+        standings_df[RUNNING_COLUMNS] = carried[RUNNING_COLUMNS].fillna(0).astype(int)
+        standings_df['Streak'] = carried['Streak']
+        standings_df['WinPct'] = (standings_df['Wins'] / (standings_df['Wins'] + standings_df['Losses'])).where(
+            standings_df['Wins'] + standings_df['Losses'] > 0)
+        standings_df['PointDiff'] = standings_df['PointsFor'] - standings_df['PointsAgainst']
+        standings_df = standings_df.reset_index(drop=True)
+
+        # One row per conflict key: a team or opponent whose code changed within a season keeps its latest code
+        head_to_head_df = (
+            team_records_df.sort_values('Date', kind='stable').assign(
+                Games=1,
+                Wins=team_records_df['Result'].eq('Win').astype(int),
+                Losses=team_records_df['Result'].eq('Loss').astype(int),
+            )
+            .groupby(group_keys + ['Team', 'Opponent'], dropna=False)
+            .agg(TeamCode=('TeamCode', 'last'), OpponentCode=('OpponentCode', 'last'), Games=('Games', 'sum'),
+                 Wins=('Wins', 'sum'), Losses=('Losses', 'sum'), PointsFor=('Team_Score', 'sum'),
+                 PointsAgainst=('Opponent_Score', 'sum'))
+            .reset_index()
+        )
+        head_to_head_df['PointDiff'] = head_to_head_df['PointsFor'] - head_to_head_df['PointsAgainst']
+        metrics.rows_out = len(standings_df) + len(head_to_head_df)
+
+    return standings_df, head_to_head_df
+
+def insert_schedule_results_to_db(team_records_df: pd.DataFrame, table_name: str, swap: bool = False, conn=None):
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_to_db()
     cursor = conn.cursor()
 
     try:
-        cursor.execute(f"""
-        DROP TABLE IF EXISTS {table_name};
-        CREATE TABLE {table_name} (
-            id SERIAL PRIMARY KEY,
-            team TEXT,
-            teamcode TEXT,
-            teamlogo TEXT,
-            game_date TEXT,
-            opponent TEXT,
-            opponentcode TEXT,
-            opponentlogo TEXT,
-            round INTEGER,
-            result TEXT,
-            location TEXT,
-            record TEXT,
-            team_score INTEGER,
-            opponent_score INTEGER,
-            gamecode TEXT,
-            season INTEGER,
-            phase TEXT,
-            UNIQUE(team, gamecode, season)
-        );
-        """)
+        standings_df, head_to_head_df = create_standings_datasets(team_records_df)
+        loads = [
+            (table_name, SCHEDULE_RESULTS_SCHEMA, team_records_df),
+            (standings_table_name(table_name), STANDINGS_SCHEMA, standings_df),
+            (head_to_head_table_name(table_name), HEAD_TO_HEAD_SCHEMA, head_to_head_df),
+        ]
+        for name, schema, _ in loads:
+            cursor.execute(create_table_sql(shadow_table_name(name) if swap else name, schema, drop_existing=swap))
         conn.commit()
 
-        def safe_int(val):
-            if pd.isna(val):
-                return None
-            try:
-                return int(val)
-            except (ValueError, TypeError):
-                return None
-
-        data_tuples = []
-        for _, row in team_records_df.iterrows():
-            data_tuples.append((
-                row["Team"],
-                row["TeamCode"],
-                row["TeamImage"],
-                row["Date"],
-                row["Opponent"],
-                row["OpponentCode"],
-                row["OpponentImage"],
-                safe_int(row["Round"]),
-                row["Result"],
-                row["Location"],
-                row["Record"],
-                safe_int(row["Team_Score"]),
-                safe_int(row["Opponent_Score"]),
-                row["Gamecode"],
-                safe_int(row["Season"]),
-                row["Phase"]
-            ))
-
-        insert_query = f"""
-        INSERT INTO {table_name} (
-            team, teamcode, teamlogo, game_date, opponent, opponentcode, 
-            opponentlogo, round, result, location, record, team_score, 
-            opponent_score, gamecode, season, phase
-        ) VALUES %s
-        ON CONFLICT (team, gamecode, season) DO UPDATE SET
-            teamcode = EXCLUDED.teamcode,
-            teamlogo = EXCLUDED.teamlogo,
-            game_date = EXCLUDED.game_date,
-            opponent = EXCLUDED.opponent,
-            opponentcode = EXCLUDED.opponentcode,
-            opponentlogo = EXCLUDED.opponentlogo,
-            round = EXCLUDED.round,
-            result = EXCLUDED.result,
-            location = EXCLUDED.location,
-            record = EXCLUDED.record,
-            team_score = EXCLUDED.team_score,
-            opponent_score = EXCLUDED.opponent_score,
-            phase = EXCLUDED.phase;
-        """
-
-        execute_values(cursor, insert_query, data_tuples)
-        conn.commit()
+        for name, schema, df in loads:
+            upsert_frame(cursor, df, shadow_table_name(name) if swap else name, schema, delete_missing=True)
+        seasons = team_records_df['Season'].dropna().unique()
+        if not swap:
+            bump_data_versions(cursor, table_name, seasons, replace_table=True)
+        with track('commit'):
+            conn.commit()
+        if swap:
+            with track('swap'):
+                swap_in_shadow_tables(cursor, [name for name, _, _ in loads])
+                bump_data_versions(cursor, table_name, seasons, replace_table=True)
+                conn.commit()
 
     except Exception as e:
         conn.rollback()
         raise e
     finally:
         cursor.close()
-        conn.close()
+        if own_conn:
+            conn.close()
+
+def schedule_results_table_name(competition_type: str) -> str:
+    return get_competition(competition_type).table_name('schedule_results')
+
+def standings_table_name(table_name: str) -> str:
+    return table_name.replace('schedule_results_', 'standings_', 1)
+
+def head_to_head_table_name(table_name: str) -> str:
+    return table_name.replace('schedule_results_', 'head_to_head_', 1)
+
+def fetch_game_reports(competition_type: str, start_season: int = None, end_season: int = None) -> pd.DataFrame:
+    competition = get_competition(competition_type)
+    gs = GameStats(competition.code)
+    return fetch_seasons(gs, 'game_report', *competition.season_range('schedule_results', start_season, end_season))
 
-def update_euro_leagues_schedule_results(competition_type: str):
-    if competition_type == 'E':
-        table_name = 'schedule_results_euroleague'
-    elif competition_type == 'U':
-        table_name = 'schedule_results_eurocup'
-    else:
-        raise ValueError("Invalid competition_type. Must be 'E' for Euroleague or 'U' for Eurocup.")
+def update_euro_leagues_schedule_results(competition_type: str, swap: bool = False):
+    competition = get_competition(competition_type)
+    table_name = schedule_results_table_name(competition)
 
-    gs = GameStats(competition_type)
-    gamestats = gs.get_game_reports_range_seasons(2017, 2024)
+    with run_report(f"schedule_results:{competition.code}"):
+        gamestats = fetch_game_reports(competition)
 
-    team_records_df = create_team_records_dataset(gamestats, competition_type)
-    insert_schedule_results_to_db(team_records_df, table_name)
+        team_records_df = create_team_records_dataset(gamestats, competition)
+        insert_schedule_results_to_db(team_records_df, table_name, swap)
 
-update_euro_leagues_schedule_results('E')
+if __name__ == "__main__":
+    update_euro_leagues_schedule_results('E', swap=True)
 
-update_euro_leagues_schedule_results('U')
+    update_euro_leagues_schedule_results('U', swap=True)
 
 
 # In[ ]:
@@ -7,13 +7,28 @@
 # Insert shot data into Neon Database
 
 import pandas as pd
-import time
-import psycopg2
-from psycopg2.extras import execute_values
 import os
 import math
+import logging
+import numpy as np
 
 from euroleague_api.shot_data import ShotData
+from psycopg2.extras import execute_values
+
+from BulkLoader import connect_to_db, lock_shared_table
+from Competitions import get_competition, shot_facts_table_name, shot_grid_table_names, shot_zone_table_names
+from DataVersions import bump_data_versions
+from EtlMetrics import run_report, track
+from GameFetcher import fetch_seasons, fetch_units, season_fetch_units
+from RawSnapshots import write_season_snapshot
+from TableSchemas import (
+    SHOT_DATA_SCHEMA, SHOT_DIMENSIONS, SHOT_GRIDS_LEAGUE_SCHEMA, SHOT_GRIDS_PLAYER_SCHEMA, SHOT_GRIDS_TEAM_SCHEMA,
+    SHOT_ZONES_PLAYER_SCHEMA, SHOT_ZONES_TEAM_SCHEMA, ZONE_BINS, Dimension,
+    create_dimension_sql, create_table_sql, iter_rows, reload_partition, upsert_frame
+)
+from TableSwap import old_table_name, rename_table_family, shadow_table_name, swap_in_shadow_tables, table_exists
+
+logger = logging.getLogger(__name__)
 
 COURT_PARAMS = {
     'basket_x': 0,
@@ -23,17 +38,56 @@ COURT_PARAMS = {
     'corner_intersection_y': 157.5,
     'restricted_area_radius': 125,
 }
+# Court area covered by the shot grids, in the COURT_PARAMS coordinates relative to the basket; shots beyond it
+# (heaves from the back court) land in the border cells
+SHOT_GRID = {
+    'x_range': (-750, 750),
+    'y_range': (-150, 1250),
+    'cell_size': 50,
+}
+
+SHOT_CATEGORY_COLUMNS = ['Phase', 'Gamecode', 'TEAM', 'ID_PLAYER', 'PLAYER', 'ID_ACTION', 'ACTION', 'ZONE', 'CONSOLE']
+SHOT_INTEGER_COLUMNS = ['Season', 'Round', 'NUM_ANOT', 'POINTS', 'COORD_X', 'COORD_Y', 'FASTBREAK', 'SECOND_CHANCE',
+                        'POINTS_OFF_TURNOVER', 'MINUTE', 'POINTS_A', 'POINTS_B']
+PARQUET_DIR = os.getenv("SHOT_DATA_PARQUET_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "parquet", "shot_data"))
+
+def to_small_integers(values: pd.Series) -> pd.Series:
+    if not pd.api.types.is_numeric_dtype(values):
+        # Parse each distinct string once instead of once per row
+        categories = values.astype('category')
+        numbers = pd.to_numeric(categories.cat.categories.to_series(), errors='coerce').to_numpy(dtype=float)
+        codes = categories.cat.codes.to_numpy()
+        values = pd.Series(np.where(codes >= 0, numbers[codes], np.nan), index=values.index)
+    return pd.to_numeric(values, errors='coerce', downcast='integer')
+
+def compact_shot_data(shot_data_df: pd.DataFrame, category_columns=SHOT_CATEGORY_COLUMNS,
+                      integer_columns=SHOT_INTEGER_COLUMNS) -> pd.DataFrame:
+    """Store the repeated strings as categories and the counters and coordinates as the smallest int that fits."""
+    for column in category_columns:
+        if column in shot_data_df.columns:
+            shot_data_df[column] = shot_data_df[column].astype('category')
+    for column in integer_columns:
+        if column in shot_data_df.columns:
+            shot_data_df[column] = to_small_integers(shot_data_df[column])
+    return shot_data_df
+
+def category_contains(values: pd.Series, patterns: list) -> np.ndarray:
+    """Case-insensitive str.contains run on each distinct value rather than on every row."""
+    categories = values.astype('category')
+    names = categories.cat.categories.astype(str).str.lower()
+    matches = np.zeros(len(names), dtype=bool)
+    for pattern in patterns:
+        matches |= np.asarray(names.str.contains(pattern, regex=False), dtype=bool)
+    codes = categories.cat.codes.to_numpy()
+    return np.where(codes >= 0, matches[codes], False)
 
 def classify_shots(data_df: pd.DataFrame) -> pd.DataFrame:
-    filtered_df = data_df[
-        ~(
-            data_df['ID_ACTION'].str.lower().str.contains("ft", na=False) |
-            data_df['ID_ACTION'].str.lower().str.contains("free", na=False) |
-            data_df['ACTION'].str.lower().str.contains("free throw", na=False) |
-            data_df['ACTION'].str.lower().str.contains("ft", na=False)
-        )
-    ].copy()
-    filtered_df['made'] = filtered_df['POINTS'].apply(lambda p: 1 if p > 0 else 0)
+    is_free_throw = (
+        category_contains(data_df['ID_ACTION'], ["ft", "free"]) |
+        category_contains(data_df['ACTION'], ["free throw", "ft"])
+    )
+    filtered_df = data_df[~is_free_throw].copy()
+    filtered_df['made'] = (filtered_df['POINTS'] > 0).astype('int8')
     return filtered_df
 
 def classify_zones(shot_data_row, court_params):
@@ -89,144 +143,480 @@ def classify_zones(shot_data_row, court_params):
 
     return bin_zone
 
-def insert_shot_data_to_db(shot_data_df: pd.DataFrame, table_name: str):
-    conn_str = os.getenv("DATABASE_URL")
-    if not conn_str:
-        raise ValueError("DATABASE_URL environment variable not set.")
-    conn = psycopg2.connect(conn_str)
+def classify_zones_vectorized(shot_data_df: pd.DataFrame, court_params) -> pd.Series:
+    x = pd.to_numeric(shot_data_df['COORD_X'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    y = pd.to_numeric(shot_data_df['COORD_Y'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+    dx = x - court_params['basket_x']
+    dy = y - court_params['basket_y']
+    distance = np.sqrt(dx**2 + dy**2)
+    angle = np.degrees(np.arctan2(dx, dy))
+
+    unknown = np.isnan(x) | np.isnan(y)
+    corner_3 = (np.abs(x) >= court_params['corner_line_x']) & (y <= court_params['corner_intersection_y'])
+    arc_3 = ~corner_3 & (distance >= court_params['three_point_radius']) & (y > court_params['corner_intersection_y'])
+    two_pt = ~(corner_3 | arc_3)
+    at_rim = two_pt & (distance <= court_params['restricted_area_radius'])
+    short_2 = two_pt & ~at_rim & (distance <= 300)
+    mid_2 = two_pt & ~at_rim & ~short_2
+
+    conditions = [
+        unknown,
+        corner_3 & (x < 0),
+        corner_3,
+        arc_3 & (angle < -30),
+        arc_3 & (angle > 30),
+        arc_3,
+        at_rim,
+        short_2 & (x < -50),
+        short_2 & (x > 50),
+        short_2,
+        mid_2 & (x < -50),
+        mid_2 & (x > 50),
+        mid_2,
+    ]
+    codes = np.select(conditions, np.arange(len(ZONE_BINS)), default=0)
+
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories=ZONE_BINS),
+        index=shot_data_df.index,
+        name='Bin'
+    )
+
+def shot_grid_shape(grid: dict = SHOT_GRID) -> tuple:
+    (x_min, x_max), (y_min, y_max) = grid['x_range'], grid['y_range']
+    return (y_max - y_min) // grid['cell_size'], (x_max - x_min) // grid['cell_size']
+
+def shot_grid_edges(court_params: dict = COURT_PARAMS, grid: dict = SHOT_GRID) -> tuple:
+    """The x and y cell edges in court coordinates, as numpy.histogram2d takes them."""
+    rows, columns = shot_grid_shape(grid)
+    x_min, y_min = grid['x_range'][0] + court_params['basket_x'], grid['y_range'][0] + court_params['basket_y']
+    return (x_min + grid['cell_size'] * np.arange(columns + 1), y_min + grid['cell_size'] * np.arange(rows + 1))
+
+def grid_cell_sql(x: str, y: str, court_params: dict = COURT_PARAMS, grid: dict = SHOT_GRID) -> str:
+    """SQL for the row-major cell of (x, y), clamped to the grid like numpy.histogram2d on clipped coordinates."""
+    rows, columns = shot_grid_shape(grid)
+    x_edges, y_edges = shot_grid_edges(court_params, grid)
+    size = grid['cell_size']
+    column = f"LEAST(GREATEST(FLOOR(({x} - {x_edges[0]}) / {size}::REAL), 0), {columns - 1})"
+    row = f"LEAST(GREATEST(FLOOR(({y} - {y_edges[0]}) / {size}::REAL), 0), {rows - 1})"
+    return f"({row} * {columns} + {column})::SMALLINT"
+
+def dense_shot_grid(cells, values, grid: dict = SHOT_GRID) -> np.ndarray:
+    """Expand a stored sparse grid into a (rows, columns) array, y by x."""
+    rows, columns = shot_grid_shape(grid)
+    dense = np.zeros(rows * columns, dtype=np.int64)
+    dense[np.asarray(cells, dtype=np.int64)] = values
+    return dense.reshape(rows, columns)
+
+def shot_data_select(facts_table: str) -> str:
+    """The original one-row-per-shot layout of shot_data_*, with the dimension strings joined back in."""
+    dimensions = {dimension.key: dimension for dimension in SHOT_DIMENSIONS}
+    select_columns = ['f.id']
+    joins = []
+    for column in SHOT_DATA_SCHEMA.columns:
+        dimension = dimensions.get(column.name)
+        if dimension is None:
+            select_columns.append(f"f.{column.name}")
+            continue
+        select_columns.append(f"{dimension.table}.{dimension.natural}")
+        if dimension.label:
+            select_columns.append(f"{dimension.table}.{dimension.label}")
+        joins.append(f"LEFT JOIN {dimension.table} ON {dimension.table}.{dimension.key} = f.{dimension.key}")
+    return f"SELECT {', '.join(select_columns)}\nFROM {facts_table} f\n" + '\n'.join(joins)
+
+def relation_kind(cursor, name: str) -> str:
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def drop_shot_data_view(cursor, table_name: str):
+    if relation_kind(cursor, table_name) == 'v':
+        cursor.execute(f"DROP VIEW {table_name};")
+
+def create_shot_data_view(cursor, table_name: str):
+    if relation_kind(cursor, table_name) in ('r', 'p'):
+        # A shot table from before the fact/dimension split: keep it as the previous version
+        if table_exists(cursor, old_table_name(table_name)):
+            cursor.execute(f"DROP TABLE {old_table_name(table_name)};")
+        rename_table_family(cursor, table_name, old_table_name(table_name))
+        logger.info(f"Kept the old {table_name} table as {old_table_name(table_name)}")
+    cursor.execute(f"CREATE OR REPLACE VIEW {table_name} AS\n{shot_data_select(shot_facts_table_name(table_name))};")
+
+def create_shot_zone_tables(cursor, table_name: str, drop_existing: bool = False):
+    team_zone_table, player_zone_table = shot_zone_table_names(table_name)
+    cursor.execute(create_table_sql(team_zone_table, SHOT_ZONES_TEAM_SCHEMA, drop_existing))
+    cursor.execute(create_table_sql(player_zone_table, SHOT_ZONES_PLAYER_SCHEMA, drop_existing))
+
+def create_shot_grid_tables(cursor, table_name: str, drop_existing: bool = False):
+    league_grid_table, team_grid_table, player_grid_table = shot_grid_table_names(table_name)
+    cursor.execute(create_table_sql(league_grid_table, SHOT_GRIDS_LEAGUE_SCHEMA, drop_existing))
+    cursor.execute(create_table_sql(team_grid_table, SHOT_GRIDS_TEAM_SCHEMA, drop_existing))
+    cursor.execute(create_table_sql(player_grid_table, SHOT_GRIDS_PLAYER_SCHEMA, drop_existing))
+
+def create_shot_data_tables(cursor, table_name: str, drop_existing: bool = False):
+    for dimension in SHOT_DIMENSIONS:
+        lock_shared_table(cursor, dimension.table)
+        cursor.execute(create_dimension_sql(dimension))
+    cursor.execute(create_table_sql(shot_facts_table_name(table_name), SHOT_DATA_SCHEMA, drop_existing))
+    create_shot_zone_tables(cursor, table_name, drop_existing)
+    create_shot_grid_tables(cursor, table_name, drop_existing)
+
+def encode_dimension(cursor, dimension: Dimension, shot_data_df: pd.DataFrame) -> pd.Series:
+    source_columns = [dimension.source] + ([dimension.label_source] if dimension.label else [])
+    columns = [dimension.natural] + ([dimension.label] if dimension.label else [])
+    values = shot_data_df[source_columns].dropna(subset=[dimension.source]).drop_duplicates(subset=[dimension.source])
+    # Sorted so that concurrent loads lock new dimension rows in the same order
+    values = values.astype('string').sort_values(dimension.source)
+    rows = list(iter_rows(values))
+    if not rows:
+        return pd.Series(pd.NA, index=shot_data_df.index, dtype='Int64')
+
+    # Only insert unseen values: ON CONFLICT alone would use up a key for every known value on every load
+    execute_values(cursor, f"""
+    INSERT INTO {dimension.table} ({', '.join(columns)})
+    SELECT * FROM (VALUES %s) AS v({', '.join(columns)})
+    WHERE NOT EXISTS (SELECT 1 FROM {dimension.table} d WHERE d.{dimension.natural} = v.{dimension.natural})
+    ON CONFLICT ({dimension.natural}) DO NOTHING
+    """, rows)
+    if dimension.label:
+        execute_values(cursor, f"""
+        UPDATE {dimension.table} AS d SET {dimension.label} = v.{dimension.label}
+        FROM (VALUES %s) AS v({', '.join(columns)})
+        WHERE d.{dimension.natural} = v.{dimension.natural} AND d.{dimension.label} IS DISTINCT FROM v.{dimension.label}
+        """, rows)
+
+    cursor.execute(f"SELECT {dimension.natural}, {dimension.key} FROM {dimension.table} WHERE {dimension.natural} = ANY(%s)",
+                   ([row[0] for row in rows],))
+    keys = dict(cursor.fetchall())
+    return shot_data_df[dimension.source].astype('category').map(keys).astype('Int64')
+
+def encode_shot_dimensions(cursor, shot_data_df: pd.DataFrame) -> pd.DataFrame:
+    """Add the team_key, player_key, action_key and bin_key columns, registering any new strings."""
+    with track('encode_shot_dimensions', rows_in=len(shot_data_df)) as metrics:
+        for dimension in SHOT_DIMENSIONS:
+            shot_data_df[dimension.key] = encode_dimension(cursor, dimension, shot_data_df)
+        metrics.rows_out = len(shot_data_df)
+    return shot_data_df
+
+def refresh_shot_zone_table(cursor, table_name: str, zone_table: str, key_column: str, keys: list, label_columns: list = ()):
+    cursor.execute(f"""
+    DROP TABLE IF EXISTS pg_temp.{zone_table}_keys;
+    CREATE TEMP TABLE {zone_table}_keys (season INTEGER, phase TEXT, {key_column} TEXT) ON COMMIT DROP;
+    """)
+    execute_values(cursor, f"INSERT INTO {zone_table}_keys (season, phase, {key_column}) VALUES %s", keys)
+
+    label_names = ''.join(f"{col}, " for col in label_columns)
+    label_values = ''.join(f"MAX(s.{col}), " for col in label_columns)
+    cursor.execute(f"""
+    DELETE FROM {zone_table} z
+    USING {zone_table}_keys k
+    WHERE z.season = k.season AND z.phase = k.phase AND z.{key_column} = k.{key_column};
+
+    INSERT INTO {zone_table} (
+        season, phase, {key_column}, {label_names}bin, attempts, makes, points,
+        fastbreak_attempts, fastbreak_makes, fastbreak_points,
+        second_chance_attempts, second_chance_makes, second_chance_points
+    )
+    SELECT
+        s.season, s.phase, s.{key_column}, {label_values}s.bin,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE s.points > 0),
+        COALESCE(SUM(s.points), 0),
+        COUNT(*) FILTER (WHERE s.fastbreak = 1),
+        COUNT(*) FILTER (WHERE s.fastbreak = 1 AND s.points > 0),
+        COALESCE(SUM(s.points) FILTER (WHERE s.fastbreak = 1), 0),
+        COUNT(*) FILTER (WHERE s.second_chance = 1),
+        COUNT(*) FILTER (WHERE s.second_chance = 1 AND s.points > 0),
+        COALESCE(SUM(s.points) FILTER (WHERE s.second_chance = 1), 0)
+    FROM ({shot_data_select(shot_facts_table_name(table_name))}) s
+    JOIN {zone_table}_keys k
+        ON s.season = k.season AND s.phase = k.phase AND s.{key_column} = k.{key_column}
+    GROUP BY s.season, s.phase, s.{key_column}, s.bin;
+
+    DROP TABLE pg_temp.{zone_table}_keys;
+    """)
+
+def touched_shot_keys(shot_data_df: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        'season': pd.to_numeric(shot_data_df['Season'], errors='coerce').astype('Int64'),
+        'phase': shot_data_df['Phase'].astype('string'),
+        'team': shot_data_df['TEAM'].astype('string'),
+        'id_player': shot_data_df['ID_PLAYER'].astype('string'),
+    })
+
+def refresh_shot_zone_aggregates(cursor, shot_data_df: pd.DataFrame, table_name: str):
+    team_zone_table, player_zone_table = shot_zone_table_names(table_name)
+    with track(f"refresh_shot_zones {table_name}", rows_in=len(shot_data_df)) as metrics:
+        shot_keys = touched_shot_keys(shot_data_df)
+
+        team_keys = shot_keys[['season', 'phase', 'team']].drop_duplicates().dropna()
+        player_keys = shot_keys[['season', 'phase', 'id_player']].drop_duplicates().dropna()
+
+        refresh_shot_zone_table(cursor, table_name, team_zone_table, 'team', list(iter_rows(team_keys)))
+        refresh_shot_zone_table(cursor, table_name, player_zone_table, 'id_player', list(iter_rows(player_keys)), ['player'])
+        metrics.rows_out = len(team_keys) + len(player_keys)
+
+def refresh_shot_grid_table(cursor, table_name: str, grid_table: str, key_columns: list, keys: list, label_columns: list = ()):
+    """Rebuild the grids of keys (season, phase, *key_columns) from every shot with coordinates, binned in SQL."""
+    key_names = ['season', 'phase'] + list(key_columns)
+    key_sql = ', '.join(key_names)
+    key_types = ''.join(f", {column} TEXT" for column in key_columns)
+    key_match = ' AND '.join(f"s.{column} = k.{column}" for column in key_names)
+    stored_match = ' AND '.join(f"g.{column} = k.{column}" for column in key_names)
+    label_names = ''.join(f"{col}, " for col in label_columns)
+    inner_labels = ''.join(f"MAX(s.{col}) AS {col}, " for col in label_columns)
+    outer_labels = ''.join(f"MAX({col}), " for col in label_columns)
+    cursor.execute(f"""
+    DROP TABLE IF EXISTS pg_temp.{grid_table}_keys;
+    CREATE TEMP TABLE {grid_table}_keys (season INTEGER, phase TEXT{key_types}) ON COMMIT DROP;
+    """)
+    execute_values(cursor, f"INSERT INTO {grid_table}_keys ({key_sql}) VALUES %s", keys)
+
+    cursor.execute(f"""
+    DELETE FROM {grid_table} g
+    USING {grid_table}_keys k
+    WHERE {stored_match};
+
+    INSERT INTO {grid_table} (
+        {key_sql}, {label_names}attempts, makes, points, cells, cell_attempts, cell_makes, cell_points
+    )
+    SELECT
+        {key_sql}, {outer_labels}SUM(attempts), SUM(makes), SUM(points),
+        ARRAY_AGG(cell ORDER BY cell), ARRAY_AGG(attempts ORDER BY cell),
+        ARRAY_AGG(makes ORDER BY cell), ARRAY_AGG(points ORDER BY cell)
+    FROM (
+        SELECT
+            {', '.join(f's.{column}' for column in key_names)}, {inner_labels}
+            {grid_cell_sql('s.coord_x', 's.coord_y')} AS cell,
+            COUNT(*) AS attempts,
+            COUNT(*) FILTER (WHERE s.points > 0) AS makes,
+            COALESCE(SUM(s.points), 0) AS points
+        FROM ({shot_data_select(shot_facts_table_name(table_name))}) s
+        JOIN {grid_table}_keys k ON {key_match}
+        WHERE s.coord_x IS NOT NULL AND s.coord_y IS NOT NULL
+        GROUP BY {', '.join(f's.{column}' for column in key_names)}, cell
+    ) c
+    GROUP BY {key_sql};
+
+    DROP TABLE pg_temp.{grid_table}_keys;
+    """)
+
+def refresh_shot_grids(cursor, shot_data_df: pd.DataFrame, table_name: str):
+    """Rebuild the league, team and player court grids of every (season, phase) key the shots in shot_data_df touch."""
+    league_grid_table, team_grid_table, player_grid_table = shot_grid_table_names(table_name)
+    with track(f"refresh_shot_grids {table_name}", rows_in=len(shot_data_df)) as metrics:
+        shot_keys = touched_shot_keys(shot_data_df)
+
+        league_keys = shot_keys[['season', 'phase']].drop_duplicates().dropna()
+        team_keys = shot_keys[['season', 'phase', 'team']].drop_duplicates().dropna()
+        player_keys = shot_keys[['season', 'phase', 'id_player']].drop_duplicates().dropna()
+
+        refresh_shot_grid_table(cursor, table_name, league_grid_table, [], list(iter_rows(league_keys)))
+        refresh_shot_grid_table(cursor, table_name, team_grid_table, ['team'], list(iter_rows(team_keys)))
+        refresh_shot_grid_table(cursor, table_name, player_grid_table, ['id_player'], list(iter_rows(player_keys)), ['player'])
+        metrics.rows_out = len(league_keys) + len(team_keys) + len(player_keys)
+
+def clear_shot_aggregates(cursor, table_name: str):
+    for aggregate_table in (*shot_zone_table_names(table_name), *shot_grid_table_names(table_name)):
+        cursor.execute(f"DELETE FROM {aggregate_table};")
+
+def insert_shot_data_to_db(shot_data_df: pd.DataFrame, table_name: str, swap: bool = False, conn=None):
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_to_db()
     cursor = conn.cursor()
 
     try:
-        cursor.execute(f"""
-        DROP TABLE IF EXISTS {table_name};
-        CREATE TABLE {table_name} (
-            id SERIAL PRIMARY KEY,
-            season INTEGER,
-            phase TEXT,
-            round INTEGER,
-            gamecode TEXT,
-            num_anot INTEGER,
-            team TEXT,
-            id_player TEXT,
-            player TEXT,
-            id_action TEXT,
-            action TEXT,
-            points INTEGER,
-            coord_x INTEGER,
-            coord_y INTEGER,
-            zone TEXT,
-            bin TEXT,
-            fastbreak INTEGER,
-            second_chance INTEGER,
-            points_off_turnover INTEGER,
-            minute INTEGER,
-            console TEXT,
-            points_a INTEGER,
-            points_b INTEGER,
-            utc TEXT,
-            UNIQUE(id_player, gamecode, season, num_anot)
-        );
-        """)
+        load_table = shadow_table_name(table_name) if swap else table_name
+        create_shot_data_tables(cursor, load_table, drop_existing=swap)
+        if not swap:
+            create_shot_data_view(cursor, table_name)
         conn.commit()
 
-        def safe_int(val):
-            if pd.isna(val):
-                return None
-            try:
-                return int(val)
-            except (ValueError, TypeError):
-                return None
-
-        def safe_str(val):
-            if pd.isna(val):
-                return None
-            return str(val)
-
-        data_tuples = []
-        for _, row in shot_data_df.iterrows():
-            data_tuples.append((
-                safe_int(row["Season"]),
-                safe_str(row["Phase"]),
-                safe_int(row["Round"]),
-                safe_str(row["Gamecode"]),
-                safe_int(row["NUM_ANOT"]),
-                safe_str(row["TEAM"]),
-                safe_str(row["ID_PLAYER"]),
-                safe_str(row["PLAYER"]),
-                safe_str(row["ID_ACTION"]),
-                safe_str(row["ACTION"]),
-                safe_int(row["POINTS"]),
-                safe_int(row["COORD_X"]),
-                safe_int(row["COORD_Y"]),
-                safe_str(row["ZONE"]) if "ZONE" in row else None,
-                safe_str(row["Bin"]),
-                safe_int(row["FASTBREAK"]),
-                safe_int(row["SECOND_CHANCE"]),
-                safe_int(row["POINTS_OFF_TURNOVER"]),
-                safe_int(row["MINUTE"]),
-                safe_str(row["CONSOLE"]),
-                safe_int(row["POINTS_A"]),
-                safe_int(row["POINTS_B"]),
-                safe_str(row["UTC"])
-            ))
-
-        insert_query = f"""
-        INSERT INTO {table_name} (
-            season, phase, round, gamecode, num_anot, team, id_player, player,
-            id_action, action, points, coord_x, coord_y, zone, bin, fastbreak,
-            second_chance, points_off_turnover, minute, console, points_a,
-            points_b, utc
-        ) VALUES %s
-        ON CONFLICT (id_player, gamecode, season, num_anot) DO UPDATE SET
-            phase = EXCLUDED.phase,
-            round = EXCLUDED.round,
-            team = EXCLUDED.team,
-            player = EXCLUDED.player,
-            id_action = EXCLUDED.id_action,
-            action = EXCLUDED.action,
-            points = EXCLUDED.points,
-            coord_x = EXCLUDED.coord_x,
-            coord_y = EXCLUDED.coord_y,
-            zone = EXCLUDED.zone,
-            bin = EXCLUDED.bin,
-            fastbreak = EXCLUDED.fastbreak,
-            second_chance = EXCLUDED.second_chance,
-            points_off_turnover = EXCLUDED.points_off_turnover,
-            minute = EXCLUDED.minute,
-            console = EXCLUDED.console,
-            points_a = EXCLUDED.points_a,
-            points_b = EXCLUDED.points_b,
-            utc = EXCLUDED.utc;
-        """
-
-        execute_values(cursor, insert_query, data_tuples)
+        encode_shot_dimensions(cursor, shot_data_df)
+        # Dimension rows are append-only, so commit them now instead of holding their locks for the whole load
         conn.commit()
+        upsert_frame(cursor, shot_data_df, shot_facts_table_name(load_table), SHOT_DATA_SCHEMA, delete_missing=True)
+        if not swap:
+            # The facts now hold only the reloaded seasons, so every aggregate row is rebuilt. Deleted in the load
+            # transaction, readers keep seeing the old aggregates until the commit
+            clear_shot_aggregates(cursor, load_table)
+        refresh_shot_zone_aggregates(cursor, shot_data_df, load_table)
+        refresh_shot_grids(cursor, shot_data_df, load_table)
+        seasons = pd.to_numeric(shot_data_df['Season'], errors='coerce').dropna().unique()
+        if not swap:
+            bump_data_versions(cursor, table_name, seasons, replace_table=True)
+        with track('commit'):
+            conn.commit()
+        if swap:
+            with track('swap'):
+                swap_in_shadow_tables(cursor, [shot_facts_table_name(table_name), *shot_zone_table_names(table_name),
+                                               *shot_grid_table_names(table_name)])
+                create_shot_data_view(cursor, table_name)
+                bump_data_versions(cursor, table_name, seasons, replace_table=True)
+                conn.commit()
 
     except Exception as e:
         conn.rollback()
         raise e
     finally:
         cursor.close()
-        conn.close()
+        if own_conn:
+            conn.close()
 
-def update_euro_leagues_shot_data(competition_type: str):
-    if competition_type == 'E':
-        table_name = 'shot_data_euroleague'
-    elif competition_type == 'U':
-        table_name = 'shot_data_eurocup'
-    else:
-        raise ValueError("Invalid competition_type. Must be 'E' for Euroleague or 'U' for Eurocup.")
+def shot_data_table_name(competition_type: str) -> str:
+    return get_competition(competition_type).table_name('shot_data')
 
-    shotdata_api = ShotData(competition=competition_type)
-    shot_data_df = shotdata_api.get_game_shot_data_multiple_seasons(2017, 2024)
+def fetch_shot_data(competition_type: str, start_season: int = None, end_season: int = None) -> pd.DataFrame:
+    competition = get_competition(competition_type)
+    shotdata_api = ShotData(competition=competition.code)
+    return fetch_seasons(shotdata_api, 'shots', *competition.season_range('shot_data', start_season, end_season))
 
-    if not shot_data_df.empty:
+def transform_shot_data(shot_data_df: pd.DataFrame) -> pd.DataFrame:
+    if shot_data_df.empty:
+        return shot_data_df
+    with track('compact_shot_data', rows_in=len(shot_data_df)) as metrics:
+        shot_data_df = compact_shot_data(shot_data_df)
+        metrics.rows_out = len(shot_data_df)
+
+    with track('classify_shots', rows_in=len(shot_data_df)) as metrics:
         shot_data_df = classify_shots(shot_data_df)
-        shot_data_df['Bin'] = shot_data_df.apply(lambda row: classify_zones(row, COURT_PARAMS), axis=1)
-        insert_shot_data_to_db(shot_data_df, table_name)
+        metrics.rows_out = len(shot_data_df)
+        metrics.drop(metrics.rows_in - metrics.rows_out, 'free throw')
+
+    with track('classify_zones', rows_in=len(shot_data_df)) as metrics:
+        shot_data_df['Bin'] = classify_zones_vectorized(shot_data_df, COURT_PARAMS)
+        metrics.rows_out = len(shot_data_df)
+    return shot_data_df
+
+def stream_shot_data_to_db(competition_type: str, table_name: str, start_season: int = None, end_season: int = None,
+                           games_per_chunk: int = None, reload_seasons: bool = False, conn=None):
+    competition = get_competition(competition_type)
+    start_season, end_season = competition.season_range('shot_data', start_season, end_season)
+    if reload_seasons and games_per_chunk is not None:
+        raise ValueError("reload_seasons replaces a whole season at once and cannot be combined with games_per_chunk.")
+
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_to_db()
+    cursor = conn.cursor()
+
+    try:
+        create_shot_data_tables(cursor, table_name)
+        create_shot_data_view(cursor, table_name)
+        conn.commit()
+        facts_table = shot_facts_table_name(table_name)
+
+        shotdata_api = ShotData(competition=competition.code)
+        for season in range(start_season, end_season + 1):
+            units = season_fetch_units(shotdata_api, 'shots', season)
+            chunk_size = games_per_chunk or max(len(units), 1)
+
+            for chunk_start in range(0, len(units), chunk_size):
+                chunk_units = units[chunk_start:chunk_start + chunk_size]
+                # Tracked per chunk: its RSS and RSS growth show whether memory stays flat from one chunk to the next
+                chunk_name = (f"stream {table_name} season {season} "
+                              f"games {chunk_start + 1}-{chunk_start + len(chunk_units)}")
+                with track(chunk_name, rows_in=len(chunk_units)) as chunk_metrics:
+                    shot_data_df = fetch_units(shotdata_api, chunk_units)
+                    if len(chunk_units) == len(units) and not shot_data_df.empty:
+                        write_season_snapshot(competition.code, 'shots', season, shot_data_df)
+                    shot_data_df = transform_shot_data(shot_data_df)
+                    rows = 0
+                    if not shot_data_df.empty:
+                        encode_shot_dimensions(cursor, shot_data_df)
+                        conn.commit()
+                    if reload_seasons and not shot_data_df.empty:
+                        rows = reload_partition(cursor, shot_data_df, facts_table, SHOT_DATA_SCHEMA, season)
+                        for aggregate_table in shot_zone_table_names(table_name) + shot_grid_table_names(table_name):
+                            cursor.execute(f"DELETE FROM {aggregate_table} WHERE season = %s;", (season,))
+                        refresh_shot_zone_aggregates(cursor, shot_data_df, table_name)
+                        refresh_shot_grids(cursor, shot_data_df, table_name)
+                    elif not shot_data_df.empty:
+                        rows = upsert_frame(cursor, shot_data_df, facts_table, SHOT_DATA_SCHEMA)
+                        if rows:
+                            refresh_shot_zone_aggregates(cursor, shot_data_df, table_name)
+                            refresh_shot_grids(cursor, shot_data_df, table_name)
+                    if rows:
+                        bump_data_versions(cursor, table_name, [season])
+                    with track('commit'):
+                        conn.commit()
+                    del shot_data_df
+                    chunk_metrics.rows_out = rows
+
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+
+def export_shot_data_parquet(competition_type: str, export_dir: str = PARQUET_DIR, seasons: list = None, conn=None) -> list:
+    """Write <export_dir>/competition=<code>/season=<season>/shots.parquet for the analytics notebooks.
+
+    Each season file is replaced atomically, so a reader never sees a half-written one."""
+    competition = get_competition(competition_type)
+    table_name = shot_data_table_name(competition)
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_to_db()
+    cursor = conn.cursor()
+
+    try:
+        if seasons is None:
+            cursor.execute(f"SELECT DISTINCT season FROM {shot_facts_table_name(table_name)} ORDER BY season;")
+            seasons = [row[0] for row in cursor.fetchall()]
+
+        paths = []
+        with track(f"export_parquet {table_name}", rows_in=0) as metrics:
+            for season in seasons:
+                cursor.execute(f"SELECT * FROM {table_name} WHERE season = %s ORDER BY gamecode, num_anot;", (season,))
+                columns = [desc[0] for desc in cursor.description]
+                season_df = pd.DataFrame(cursor.fetchall(), columns=columns).drop(columns=['id', 'season'])
+                season_df = compact_shot_data(season_df, [col.lower() for col in SHOT_CATEGORY_COLUMNS] + ['bin'],
+                                              [col.lower() for col in SHOT_INTEGER_COLUMNS])
+
+                season_dir = os.path.join(export_dir, f"competition={competition.code}", f"season={season}")
+                os.makedirs(season_dir, exist_ok=True)
+                path = os.path.join(season_dir, 'shots.parquet')
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                season_df.to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, path)
+                paths.append(path)
+                metrics.rows_in += len(season_df)
+            metrics.rows_out = metrics.rows_in
+        conn.commit()
+        return paths
+
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+
+def update_euro_leagues_shot_data(competition_type: str, streaming: bool = False, swap: bool = False,
+                                  export_dir: str = None):
+    competition = get_competition(competition_type)
+    table_name = shot_data_table_name(competition)
+
+    with run_report(f"shot_data:{competition.code}"):
+        if streaming:
+            stream_shot_data_to_db(competition, table_name)
+        else:
+            shot_data_df = transform_shot_data(fetch_shot_data(competition))
+            if not shot_data_df.empty:
+                insert_shot_data_to_db(shot_data_df, table_name, swap)
+
+        if export_dir is not None:
+            export_shot_data_parquet(competition, export_dir)
 
-update_euro_leagues_shot_data('E')
-update_euro_leagues_shot_data('U')
+if __name__ == "__main__":
+    update_euro_leagues_shot_data('E', streaming=True)
+    update_euro_leagues_shot_data('U', streaming=True)
 
 
 # In[ ]:
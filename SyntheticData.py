@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Offline generators for DataFrames shaped like the euroleague_api box score, shot and game report responses
+
+import numpy as np
+import pandas as pd
+
+from GameLogs import transform_game_logs
+
+BOXSCORE_STATS = [
+    'FieldGoalsMade2', 'FieldGoalsAttempted2', 'FieldGoalsMade3', 'FieldGoalsAttempted3',
+    'FreeThrowsMade', 'FreeThrowsAttempted', 'OffensiveRebounds', 'DefensiveRebounds', 'TotalRebounds',
+    'Assistances', 'Steals', 'Turnovers', 'BlocksFavour', 'BlocksAgainst', 'FoulsCommited', 'FoulsReceived',
+]
+
+POSTSEASON_ROUNDS = {
+    'E': [('PI', 1, 2), ('PO', 5, 4), ('FF', 2, 2)],
+    'U': [('8F', 3, 8), ('4F', 3, 4)],
+}
+
+SHOT_ACTIONS = pd.DataFrame([
+    ('2FGM', 'Two Pointer', 2, 0.20),
+    ('2FGA', 'Missed Two Pointer', 0, 0.20),
+    ('LAYUPMD', 'Layup Made', 2, 0.08),
+    ('LAYUPATT', 'Missed Layup', 0, 0.05),
+    ('DUNK', 'Dunk', 2, 0.03),
+    ('3FGM', 'Three Pointer', 3, 0.09),
+    ('3FGA', 'Missed Three Pointer', 0, 0.16),
+    ('FTM', 'Free Throw In', 1, 0.14),
+    ('FTA', 'Free Throw Missed', 0, 0.05),
+], columns=['ID_ACTION', 'ACTION', 'POINTS', 'weight'])
+
+def season_range(n_seasons: int, last_season: int = 2024) -> range:
+    return range(last_season - n_seasons + 1, last_season + 1)
+
+def team_name(team: int) -> str:
+    return f"SYNTHETIC CLUB {team:02d}"
+
+def team_code(team: int) -> str:
+    return f"S{team:02d}"
+
+def player_id(team, slot, season) -> np.ndarray:
+    # Rosters turn over every three seasons so players carry game sequences across seasons
+    return np.char.add('P', np.char.zfill((np.asarray(team) * 1000 + np.asarray(slot) * 50 + np.asarray(season) // 3 % 50).astype(str), 6))
+
+def generate_schedule(n_seasons: int, competition_type: str = 'E', n_teams: int = 18, seed: int = 0) -> pd.DataFrame:
+    """One row per game: a double round robin regular season followed by the competition's playoff phases."""
+    if competition_type not in POSTSEASON_ROUNDS:
+        raise ValueError("Invalid competition_type. Must be 'E' for Euroleague or 'U' for Eurocup.")
+    if n_teams % 2:
+        raise ValueError("n_teams must be even.")
+
+    rng = np.random.default_rng(seed)
+    games = []
+    for season in season_range(n_seasons):
+        teams = rng.permutation(n_teams)
+        rounds = []
+        for leg in range(2):
+            for _ in range(n_teams - 1):
+                home, away = teams[:n_teams // 2], teams[n_teams // 2:][::-1]
+                rounds.append((home, away) if leg == 0 else (away, home))
+                teams = np.concatenate([teams[:1], teams[-1:], teams[1:-1]])
+        for phase, n_rounds, n_games in POSTSEASON_ROUNDS[competition_type]:
+            for _ in range(n_rounds):
+                seeded = rng.permutation(n_teams)[:n_games * 2]
+                rounds.append((seeded[:n_games], seeded[n_games:]))
+
+        phases = ['RS'] * (2 * (n_teams - 1)) + [
+            phase for phase, n_rounds, _ in POSTSEASON_ROUNDS[competition_type] for _ in range(n_rounds)
+        ]
+        gamecode = 0
+        for round_number, ((home, away), phase) in enumerate(zip(rounds, phases), start=1):
+            for home_team, away_team in zip(home, away):
+                gamecode += 1
+                games.append((season, phase, round_number, gamecode, int(home_team), int(away_team)))
+
+    schedule = pd.DataFrame(games, columns=['Season', 'Phase', 'Round', 'Gamecode', 'HomeTeam', 'AwayTeam'])
+    start_dates = pd.to_datetime(schedule['Season'].astype(str) + '-10-01')
+    schedule['Date'] = start_dates + pd.to_timedelta((schedule['Round'] - 1) * 7 + schedule['Gamecode'] % 3, unit='D')
+    return schedule
+
+def generate_boxscores(n_seasons: int, competition_type: str = 'E', n_teams: int = 18, players_per_team: int = 12,
+                       seed: int = 0) -> pd.DataFrame:
+    """Rows like BoxScoreData.get_player_boxscore_stats_data: players, then a 'Team' and a 'Total' row per side."""
+    rng = np.random.default_rng(seed)
+    schedule = generate_schedule(n_seasons, competition_type, n_teams, seed)
+
+    sides = pd.concat([
+        schedule.assign(Home=1, TeamIndex=schedule['HomeTeam']),
+        schedule.assign(Home=0, TeamIndex=schedule['AwayTeam']),
+    ], ignore_index=True)
+    players = sides.loc[sides.index.repeat(players_per_team)].reset_index(drop=True)
+    slot = np.tile(np.arange(players_per_team), len(sides))
+    n_rows = len(players)
+
+    playing = slot < players_per_team - rng.integers(0, 3, n_rows)
+    seconds = np.where(playing, rng.integers(60, 36 * 60, n_rows), 0)
+
+    players['Player_ID'] = player_id(players['TeamIndex'], slot, players['Season'])
+    players['IsStarter'] = (slot < 5).astype(float)
+    players['IsPlaying'] = playing.astype(float)
+    players['Team'] = [team_code(team) for team in players['TeamIndex']]
+    players['Dorsal'] = slot * 3 % 55
+    players['Player'] = np.char.add(np.char.add('PLAYER ', players['Player_ID'].to_numpy().astype(str)), ', SYNTHETIC')
+    players['Minutes'] = np.where(playing, [f"{s // 60:02d}:{s % 60:02d}" for s in seconds], 'DNP')
+
+    attempts2 = rng.binomial(10, 0.5, n_rows) * playing
+    attempts3 = rng.binomial(7, 0.5, n_rows) * playing
+    free_throws = rng.binomial(6, 0.4, n_rows) * playing
+    players['FieldGoalsAttempted2'] = attempts2
+    players['FieldGoalsMade2'] = rng.binomial(attempts2, 0.52)
+    players['FieldGoalsAttempted3'] = attempts3
+    players['FieldGoalsMade3'] = rng.binomial(attempts3, 0.36)
+    players['FreeThrowsAttempted'] = free_throws
+    players['FreeThrowsMade'] = rng.binomial(free_throws, 0.77)
+    players['OffensiveRebounds'] = rng.poisson(1, n_rows) * playing
+    players['DefensiveRebounds'] = rng.poisson(2.5, n_rows) * playing
+    players['TotalRebounds'] = players['OffensiveRebounds'] + players['DefensiveRebounds']
+    for stat, mean in [('Assistances', 2), ('Steals', 0.8), ('Turnovers', 1.3), ('BlocksFavour', 0.3),
+                       ('BlocksAgainst', 0.3), ('FoulsCommited', 2.2), ('FoulsReceived', 2.2)]:
+        players[stat] = rng.poisson(mean, n_rows) * playing
+    players['Points'] = 2 * players['FieldGoalsMade2'] + 3 * players['FieldGoalsMade3'] + players['FreeThrowsMade']
+    players['Valuation'] = (
+        players['Points'] + players['TotalRebounds'] + players['Assistances'] + players['Steals']
+        + players['BlocksFavour'] + players['FoulsReceived']
+        - (players['FieldGoalsAttempted2'] - players['FieldGoalsMade2'])
+        - (players['FieldGoalsAttempted3'] - players['FieldGoalsMade3'])
+        - (players['FreeThrowsAttempted'] - players['FreeThrowsMade'])
+        - players['Turnovers'] - players['BlocksAgainst'] - players['FoulsCommited']
+    )
+    players['Plusminus'] = rng.integers(-15, 16, n_rows).astype(float) * playing
+    players['RowOrder'] = slot
+
+    side_keys = ['Season', 'Phase', 'Round', 'Gamecode', 'Home', 'Team']
+    stat_columns = BOXSCORE_STATS + ['Points', 'Valuation']
+    totals = players.groupby(side_keys, sort=False)[stat_columns].sum().reset_index()
+    totals = totals.assign(Player_ID='Total', Player='Total', Dorsal='TOTAL', Minutes='200:00',
+                           IsStarter=np.nan, IsPlaying=np.nan, Plusminus=np.nan, RowOrder=players_per_team + 1)
+    team_rows = totals[side_keys].assign(Player_ID='Team', Player='Team', Dorsal='TEAM', Minutes='',
+                                         IsStarter=np.nan, IsPlaying=np.nan, Plusminus=np.nan,
+                                         RowOrder=players_per_team)
+    team_rows[stat_columns] = 0
+    team_rows['OffensiveRebounds'] = rng.poisson(1, len(team_rows))
+    team_rows['TotalRebounds'] = team_rows['OffensiveRebounds']
+
+    boxscores = pd.concat([players, team_rows, totals], ignore_index=True)
+    boxscores = boxscores.sort_values(['Season', 'Gamecode', 'Home', 'RowOrder'], ascending=[True, True, False, True])
+    return boxscores[
+        ['Season', 'Phase', 'Round', 'Gamecode', 'Home', 'Player_ID', 'IsStarter', 'IsPlaying', 'Team', 'Dorsal',
+         'Player', 'Minutes', 'Points'] + BOXSCORE_STATS + ['Valuation', 'Plusminus']
+    ].reset_index(drop=True)
+
+def generate_shots(n_seasons: int, competition_type: str = 'E', n_teams: int = 18, players_per_team: int = 12,
+                   shots_per_game: int = 150, seed: int = 0) -> pd.DataFrame:
+    """Rows like ShotData.get_game_shot_data, free throws included, with court coordinates in centimetres."""
+    rng = np.random.default_rng(seed)
+    schedule = generate_schedule(n_seasons, competition_type, n_teams, seed)
+
+    shots = schedule.loc[schedule.index.repeat(shots_per_game)].reset_index(drop=True)
+    n_rows = len(shots)
+    shot_number = np.tile(np.arange(shots_per_game), len(schedule))
+    is_home = rng.random(n_rows) < 0.5
+    team = np.where(is_home, shots['HomeTeam'], shots['AwayTeam'])
+    slot = rng.integers(0, players_per_team - 2, n_rows)
+
+    actions = SHOT_ACTIONS.iloc[rng.choice(len(SHOT_ACTIONS), n_rows, p=SHOT_ACTIONS['weight'] / SHOT_ACTIONS['weight'].sum())]
+    points = actions['POINTS'].to_numpy()
+    is_three = actions['ID_ACTION'].str.startswith('3').to_numpy()
+    is_free_throw = actions['ID_ACTION'].str.startswith('FT').to_numpy()
+    is_rim = actions['ID_ACTION'].isin(['LAYUPMD', 'LAYUPATT', 'DUNK']).to_numpy()
+
+    angle = rng.uniform(0, np.pi, n_rows)
+    radius = np.select(
+        [is_rim, is_three],
+        [rng.uniform(0, 120, n_rows), rng.uniform(680, 850, n_rows)],
+        default=rng.uniform(60, 660, n_rows)
+    )
+    coord_x = np.where(is_free_throw, 0, np.round(radius * np.cos(angle))).astype(int)
+    coord_y = np.where(is_free_throw, 0, np.round(radius * np.sin(angle))).astype(int)
+    minute = np.minimum(shot_number * 40 // shots_per_game + 1, 40)
+    points_a = pd.Series(np.where(is_home, points, 0)).groupby(shots['Gamecode'].astype(str) + shots['Season'].astype(str)).cumsum()
+    points_b = pd.Series(np.where(is_home, 0, points)).groupby(shots['Gamecode'].astype(str) + shots['Season'].astype(str)).cumsum()
+
+    return pd.DataFrame({
+        'Season': shots['Season'],
+        'Phase': shots['Phase'],
+        'Round': shots['Round'],
+        'Gamecode': shots['Gamecode'],
+        'NUM_ANOT': shot_number * 4 + 1,
+        'TEAM': [team_code(t) for t in team],
+        'ID_PLAYER': player_id(team, slot, shots['Season']),
+        'PLAYER': np.char.add(np.char.add('PLAYER ', player_id(team, slot, shots['Season'])), ', SYNTHETIC'),
+        'ID_ACTION': actions['ID_ACTION'].to_numpy(),
+        'ACTION': actions['ACTION'].to_numpy(),
+        'POINTS': points,
+        'COORD_X': coord_x,
+        'COORD_Y': coord_y,
+        'ZONE': np.where(is_free_throw, ' ', np.array(list('ABCDEFGHIJ'))[np.minimum(radius // 90, 9).astype(int)]),
+        'FASTBREAK': np.where(rng.random(n_rows) < 0.08, '1', '0'),
+        'SECOND_CHANCE': np.where(rng.random(n_rows) < 0.12, '1', '0'),
+        'POINTS_OFF_TURNOVER': np.where(rng.random(n_rows) < 0.15, '1', '0'),
+        'MINUTE': minute,
+        'CONSOLE': [f"{9 - (m - 1) % 10:02d}:{s:02d}" for m, s in zip(minute, rng.integers(0, 60, n_rows))],
+        'POINTS_A': points_a.to_numpy(),
+        'POINTS_B': points_b.to_numpy(),
+        'UTC': (shots['Date'] + pd.Timedelta(hours=19) + pd.to_timedelta(minute * 90, unit='s')).dt.strftime('%Y%m%d%H%M%S'),
+    })
+
+def generate_game_reports(n_seasons: int, competition_type: str = 'E', n_teams: int = 18, seed: int = 0) -> pd.DataFrame:
+    """Rows like GameStats.get_game_report with the flattened local.* / road.* club columns."""
+    rng = np.random.default_rng(seed)
+    schedule = generate_schedule(n_seasons, competition_type, n_teams, seed)
+    home_score = rng.integers(60, 105, len(schedule))
+    away_score = rng.integers(60, 105, len(schedule))
+
+    reports = schedule[['Season', 'Phase', 'Round', 'Gamecode']].copy()
+    reports['localDate'] = (schedule['Date'] + pd.Timedelta(hours=20)).dt.strftime('%Y-%m-%dT%H:%M:%S')
+    for side, teams, score in [('local', schedule['HomeTeam'], home_score), ('road', schedule['AwayTeam'], away_score)]:
+        reports[f'{side}.club.code'] = [team_code(team) for team in teams]
+        reports[f'{side}.club.name'] = [team_name(team) for team in teams]
+        reports[f'{side}.club.images.crest'] = [f"https://media-cdn.incrowdsports.com/{team_code(team)}.png" for team in teams]
+        reports[f'{side}.score'] = score
+    return reports
+
+def generate_game_logs(n_seasons: int, competition_type: str = 'E', seed: int = 0) -> pd.DataFrame:
+    return transform_game_logs(generate_boxscores(n_seasons, competition_type, seed=seed))
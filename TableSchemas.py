@@ -0,0 +1,585 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Column schemas for the Neon tables and the columnar converter that feeds them
+
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from BulkLoader import copy_upsert
+from EtlMetrics import track
+
+PARTITION_BY_SEASON = os.getenv("PARTITION_BY_SEASON", "0") == "1"
+ROW_HASH_COLUMN = 'row_hash'
+
+@dataclass(frozen=True)
+class Column:
+    source: str
+    name: str
+    sql_type: str
+    null_values: tuple = ()
+    default: str = None
+
+@dataclass(frozen=True)
+class TableSchema:
+    columns: tuple
+    conflict_columns: tuple
+    indexes: tuple = ()
+    partition_column: str = None
+    hashed: bool = True
+
+    @property
+    def column_names(self) -> list:
+        return [col.name for col in self.columns]
+
+GAME_LOGS_SCHEMA = TableSchema(
+    columns=(
+        Column('Season', 'season', 'INTEGER', ('DNP', 'None')),
+        Column('Phase', 'phase', 'TEXT', ('None',)),
+        Column('Round', 'round', 'INTEGER', ('DNP', 'None')),
+        Column('Gamecode', 'gamecode', 'TEXT', ('None',)),
+        Column('Home', 'home', 'INTEGER', ('DNP', 'None')),
+        Column('Player_ID', 'player_id', 'TEXT', ('None',)),
+        Column('IsStarter', 'is_starter', 'REAL', ('None',)),
+        Column('IsPlaying', 'is_playing', 'REAL', ('None',)),
+        Column('Team', 'team', 'TEXT', ('None',)),
+        Column('Dorsal', 'dorsal', 'INTEGER', ('DNP', 'None')),
+        Column('Player', 'player', 'TEXT', ('None',)),
+        Column('Minutes', 'minutes', 'TEXT', ('None',)),
+        Column('Points', 'points', 'INTEGER', ('DNP', 'None')),
+        Column('FieldGoalsMade2', 'field_goals_made_2', 'INTEGER', ('DNP', 'None')),
+        Column('FieldGoalsAttempted2', 'field_goals_attempted_2', 'INTEGER', ('DNP', 'None')),
+        Column('FieldGoalsMade3', 'field_goals_made_3', 'INTEGER', ('DNP', 'None')),
+        Column('FieldGoalsAttempted3', 'field_goals_attempted_3', 'INTEGER', ('DNP', 'None')),
+        Column('FreeThrowsMade', 'free_throws_made', 'INTEGER', ('DNP', 'None')),
+        Column('FreeThrowsAttempted', 'free_throws_attempted', 'INTEGER', ('DNP', 'None')),
+        Column('OffensiveRebounds', 'offensive_rebounds', 'INTEGER', ('DNP', 'None')),
+        Column('DefensiveRebounds', 'defensive_rebounds', 'INTEGER', ('DNP', 'None')),
+        Column('TotalRebounds', 'total_rebounds', 'INTEGER', ('DNP', 'None')),
+        Column('Assistances', 'assistances', 'INTEGER', ('DNP', 'None')),
+        Column('Steals', 'steals', 'INTEGER', ('DNP', 'None')),
+        Column('Turnovers', 'turnovers', 'INTEGER', ('DNP', 'None')),
+        Column('BlocksFavour', 'blocks_favour', 'INTEGER', ('DNP', 'None')),
+        Column('BlocksAgainst', 'blocks_against', 'INTEGER', ('DNP', 'None')),
+        Column('FoulsCommited', 'fouls_commited', 'INTEGER', ('DNP', 'None')),
+        Column('FoulsReceived', 'fouls_received', 'INTEGER', ('DNP', 'None')),
+        Column('Valuation', 'valuation', 'INTEGER', ('DNP', 'None')),
+        Column('Plusminus', 'plusminus', 'REAL', ('None',)),
+        Column('GameSequence', 'game_sequence', 'INTEGER', ('DNP', 'None')),
+        Column('SeasonRound', 'season_round', 'TEXT', ('None',)),
+        Column('RowType', 'row_type', 'TEXT', default="'player'"),
+        Column('row_number', 'row_number', 'INTEGER', ('DNP', 'None'), default='1'),
+    ),
+    conflict_columns=('player_id', 'gamecode', 'season', 'team', 'row_number'),
+    indexes=(
+        ('player_id', 'season', 'game_sequence'),
+        ('team', 'season', 'round'),
+        ('season', 'row_type', 'round'),
+    ),
+    partition_column='season',
+)
+
+TREND_STATS = ('points', 'valuation', 'plusminus', 'seconds_played')
+TREND_WINDOWS = (5, 10)
+
+PLAYER_TRENDS_SCHEMA = TableSchema(
+    columns=(
+        Column('season', 'season', 'INTEGER'),
+        Column('phase', 'phase', 'TEXT'),
+        Column('round', 'round', 'INTEGER'),
+        Column('gamecode', 'gamecode', 'TEXT'),
+        Column('player_id', 'player_id', 'TEXT'),
+        Column('player', 'player', 'TEXT'),
+        Column('team', 'team', 'TEXT'),
+        Column('points', 'points', 'INTEGER'),
+        Column('valuation', 'valuation', 'INTEGER'),
+        Column('plusminus', 'plusminus', 'REAL'),
+        Column('seconds_played', 'seconds_played', 'INTEGER'),
+    ) + tuple(
+        Column(f"last{window}_{stat}", f"last{window}_{stat}", 'REAL')
+        for window in TREND_WINDOWS for stat in TREND_STATS
+    ) + (
+        Column('season_games', 'season_games', 'INTEGER'),
+    ) + tuple(
+        Column(f"season_avg_{stat}", f"season_avg_{stat}", 'REAL') for stat in TREND_STATS
+    ),
+    conflict_columns=('player_id', 'season', 'gamecode', 'team'),
+    indexes=(
+        ('player_id', 'season', 'round'),
+    ),
+)
+
+ADVANCED_RATE_COLUMNS = ('possessions', 'pace', 'efg_pct', 'ts_pct', 'usage_rate', 'off_rating', 'def_rating', 'net_rating')
+
+ADVANCED_GAME_STATS_SCHEMA = TableSchema(
+    columns=(
+        Column('season', 'season', 'INTEGER'),
+        Column('phase', 'phase', 'TEXT'),
+        Column('round', 'round', 'INTEGER'),
+        Column('gamecode', 'gamecode', 'TEXT'),
+        Column('team', 'team', 'TEXT'),
+        Column('opponent', 'opponent', 'TEXT'),
+        Column('row_type', 'row_type', 'TEXT'),
+        Column('player_id', 'player_id', 'TEXT'),
+        Column('player', 'player', 'TEXT'),
+        Column('seconds_played', 'seconds_played', 'INTEGER'),
+        Column('points', 'points', 'INTEGER'),
+    ) + tuple(Column(name, name, 'REAL') for name in ADVANCED_RATE_COLUMNS),
+    conflict_columns=('player_id', 'gamecode', 'season', 'team'),
+    indexes=(
+        ('team', 'season', 'round'),
+        ('player_id', 'season'),
+    ),
+)
+
+ADVANCED_SEASON_STATS_SCHEMA = TableSchema(
+    columns=(
+        Column('season', 'season', 'INTEGER'),
+        Column('team', 'team', 'TEXT'),
+        Column('row_type', 'row_type', 'TEXT'),
+        Column('player_id', 'player_id', 'TEXT'),
+        Column('player', 'player', 'TEXT'),
+        Column('games', 'games', 'INTEGER'),
+        Column('seconds_played', 'seconds_played', 'INTEGER'),
+        Column('points', 'points', 'INTEGER'),
+    ) + tuple(Column(name, name, 'REAL') for name in ADVANCED_RATE_COLUMNS),
+    conflict_columns=('player_id', 'season', 'team'),
+    indexes=(
+        ('season', 'row_type'),
+    ),
+)
+
+SCHEDULE_RESULTS_SCHEMA = TableSchema(
+    columns=(
+        Column('Team', 'team', 'TEXT'),
+        Column('TeamCode', 'teamcode', 'TEXT'),
+        Column('TeamImage', 'teamlogo', 'TEXT'),
+        Column('Date', 'game_date', 'TEXT'),
+        Column('Opponent', 'opponent', 'TEXT'),
+        Column('OpponentCode', 'opponentcode', 'TEXT'),
+        Column('OpponentImage', 'opponentlogo', 'TEXT'),
+        Column('Round', 'round', 'INTEGER'),
+        Column('Result', 'result', 'TEXT'),
+        Column('Location', 'location', 'TEXT'),
+        Column('Record', 'record', 'TEXT'),
+        Column('Team_Score', 'team_score', 'INTEGER'),
+        Column('Opponent_Score', 'opponent_score', 'INTEGER'),
+        Column('Gamecode', 'gamecode', 'TEXT'),
+        Column('Season', 'season', 'INTEGER'),
+        Column('Phase', 'phase', 'TEXT'),
+    ),
+    conflict_columns=('team', 'gamecode', 'season'),
+    indexes=(
+        ('team', 'season', 'round'),
+        ('season', 'phase', 'round'),
+    ),
+)
+
+STANDINGS_SCHEMA = TableSchema(
+    columns=(
+        Column('Season', 'season', 'INTEGER'),
+        Column('PhaseGroup', 'phase_group', 'TEXT'),
+        Column('Phase', 'phase', 'TEXT'),
+        Column('Round', 'round', 'INTEGER'),
+        Column('Team', 'team', 'TEXT'),
+        Column('TeamCode', 'teamcode', 'TEXT'),
+        Column('Games', 'games', 'INTEGER'),
+        Column('Wins', 'wins', 'INTEGER'),
+        Column('Losses', 'losses', 'INTEGER'),
+        Column('WinPct', 'win_pct', 'REAL'),
+        Column('PointsFor', 'points_for', 'INTEGER'),
+        Column('PointsAgainst', 'points_against', 'INTEGER'),
+        Column('PointDiff', 'point_diff', 'INTEGER'),
+        Column('HomeWins', 'home_wins', 'INTEGER'),
+        Column('HomeLosses', 'home_losses', 'INTEGER'),
+        Column('AwayWins', 'away_wins', 'INTEGER'),
+        Column('AwayLosses', 'away_losses', 'INTEGER'),
+        Column('Streak', 'streak', 'TEXT'),
+    ),
+    conflict_columns=('team', 'season', 'phase_group', 'round'),
+    indexes=(
+        ('season', 'phase_group', 'round'),
+    ),
+)
+
+HEAD_TO_HEAD_SCHEMA = TableSchema(
+    columns=(
+        Column('Season', 'season', 'INTEGER'),
+        Column('PhaseGroup', 'phase_group', 'TEXT'),
+        Column('Team', 'team', 'TEXT'),
+        Column('TeamCode', 'teamcode', 'TEXT'),
+        Column('Opponent', 'opponent', 'TEXT'),
+        Column('OpponentCode', 'opponentcode', 'TEXT'),
+        Column('Games', 'games', 'INTEGER'),
+        Column('Wins', 'wins', 'INTEGER'),
+        Column('Losses', 'losses', 'INTEGER'),
+        Column('PointsFor', 'points_for', 'INTEGER'),
+        Column('PointsAgainst', 'points_against', 'INTEGER'),
+        Column('PointDiff', 'point_diff', 'INTEGER'),
+    ),
+    conflict_columns=('team', 'opponent', 'season', 'phase_group'),
+    indexes=(
+        ('season', 'phase_group'),
+    ),
+)
+
+@dataclass(frozen=True)
+class Dimension:
+    """A dictionary table mapping each distinct string (plus an optional label) to a small integer key."""
+    table: str
+    key: str
+    key_type: str
+    natural: str
+    source: str
+    label: str = None
+    label_source: str = None
+
+SHOT_DIMENSIONS = (
+    Dimension('shot_dim_teams', 'team_key', 'SMALLINT', 'team', 'TEAM'),
+    Dimension('shot_dim_players', 'player_key', 'INTEGER', 'id_player', 'ID_PLAYER', 'player', 'PLAYER'),
+    Dimension('shot_dim_actions', 'action_key', 'SMALLINT', 'id_action', 'ID_ACTION', 'action', 'ACTION'),
+    Dimension('shot_dim_bins', 'bin_key', 'SMALLINT', 'bin', 'Bin'),
+)
+
+SHOT_DATA_SCHEMA = TableSchema(
+    columns=(
+        Column('Season', 'season', 'INTEGER'),
+        Column('Phase', 'phase', 'TEXT'),
+        Column('Round', 'round', 'SMALLINT'),
+        Column('Gamecode', 'gamecode', 'TEXT'),
+        Column('NUM_ANOT', 'num_anot', 'INTEGER'),
+        Column('team_key', 'team_key', 'SMALLINT'),
+        Column('player_key', 'player_key', 'INTEGER'),
+        Column('action_key', 'action_key', 'SMALLINT'),
+        Column('POINTS', 'points', 'SMALLINT'),
+        Column('COORD_X', 'coord_x', 'SMALLINT'),
+        Column('COORD_Y', 'coord_y', 'SMALLINT'),
+        Column('ZONE', 'zone', 'TEXT'),
+        Column('bin_key', 'bin_key', 'SMALLINT'),
+        Column('FASTBREAK', 'fastbreak', 'SMALLINT'),
+        Column('SECOND_CHANCE', 'second_chance', 'SMALLINT'),
+        Column('POINTS_OFF_TURNOVER', 'points_off_turnover', 'SMALLINT'),
+        Column('MINUTE', 'minute', 'SMALLINT'),
+        Column('CONSOLE', 'console', 'TEXT'),
+        Column('POINTS_A', 'points_a', 'SMALLINT'),
+        Column('POINTS_B', 'points_b', 'SMALLINT'),
+        Column('UTC', 'utc', 'TEXT'),
+    ),
+    conflict_columns=('player_key', 'gamecode', 'season', 'num_anot'),
+    indexes=(
+        ('player_key', 'season', 'bin_key'),
+        ('team_key', 'season', 'bin_key'),
+        ('season', 'gamecode'),
+    ),
+    partition_column='season',
+)
+
+ZONE_BINS = [
+    "Unknown",
+    "corner 3 left",
+    "right corner 3",
+    "right side 3",
+    "left side 3",
+    "top 3",
+    "at the rim",
+    "short 2pt left",
+    "short 2pt right",
+    "short 2pt center",
+    "mid 2pt left",
+    "mid 2pt right",
+    "mid 2pt center",
+]
+
+SHOT_ZONE_STAT_COLUMNS = (
+    Column(None, 'attempts', 'INTEGER'),
+    Column(None, 'makes', 'INTEGER'),
+    Column(None, 'points', 'INTEGER'),
+    Column(None, 'fastbreak_attempts', 'INTEGER'),
+    Column(None, 'fastbreak_makes', 'INTEGER'),
+    Column(None, 'fastbreak_points', 'INTEGER'),
+    Column(None, 'second_chance_attempts', 'INTEGER'),
+    Column(None, 'second_chance_makes', 'INTEGER'),
+    Column(None, 'second_chance_points', 'INTEGER'),
+)
+
+SHOT_ZONES_TEAM_SCHEMA = TableSchema(
+    columns=(
+        Column(None, 'season', 'INTEGER'),
+        Column(None, 'phase', 'TEXT'),
+        Column(None, 'team', 'TEXT'),
+        Column(None, 'bin', 'TEXT'),
+    ) + SHOT_ZONE_STAT_COLUMNS,
+    conflict_columns=('season', 'phase', 'team', 'bin'),
+    hashed=False,
+)
+
+SHOT_ZONES_PLAYER_SCHEMA = TableSchema(
+    columns=(
+        Column(None, 'season', 'INTEGER'),
+        Column(None, 'phase', 'TEXT'),
+        Column(None, 'id_player', 'TEXT'),
+        Column(None, 'player', 'TEXT'),
+        Column(None, 'bin', 'TEXT'),
+    ) + SHOT_ZONE_STAT_COLUMNS,
+    conflict_columns=('season', 'phase', 'id_player', 'bin'),
+    hashed=False,
+)
+
+# Sparse court grids: cells lists the row-major index of every cell with a shot, the cell_* arrays its counts
+SHOT_GRID_COLUMNS = (
+    Column(None, 'attempts', 'INTEGER'),
+    Column(None, 'makes', 'INTEGER'),
+    Column(None, 'points', 'INTEGER'),
+    Column(None, 'cells', 'SMALLINT[]'),
+    Column(None, 'cell_attempts', 'INTEGER[]'),
+    Column(None, 'cell_makes', 'INTEGER[]'),
+    Column(None, 'cell_points', 'INTEGER[]'),
+)
+
+SHOT_GRIDS_LEAGUE_SCHEMA = TableSchema(
+    columns=(
+        Column(None, 'season', 'INTEGER'),
+        Column(None, 'phase', 'TEXT'),
+    ) + SHOT_GRID_COLUMNS,
+    conflict_columns=('season', 'phase'),
+    hashed=False,
+)
+
+SHOT_GRIDS_TEAM_SCHEMA = TableSchema(
+    columns=(
+        Column(None, 'season', 'INTEGER'),
+        Column(None, 'phase', 'TEXT'),
+        Column(None, 'team', 'TEXT'),
+    ) + SHOT_GRID_COLUMNS,
+    conflict_columns=('season', 'phase', 'team'),
+    hashed=False,
+)
+
+SHOT_GRIDS_PLAYER_SCHEMA = TableSchema(
+    columns=(
+        Column(None, 'season', 'INTEGER'),
+        Column(None, 'phase', 'TEXT'),
+        Column(None, 'id_player', 'TEXT'),
+        Column(None, 'player', 'TEXT'),
+    ) + SHOT_GRID_COLUMNS,
+    conflict_columns=('season', 'phase', 'id_player'),
+    hashed=False,
+)
+
+PLAYER_RATE_COLUMNS = (
+    'points_per40', 'fga2_per40', 'fga3_per40', 'fta_per40', 'orb_per40', 'drb_per40', 'ast_per40', 'stl_per40',
+    'tov_per40', 'blk_per40', 'fouls_per40', 'fouls_drawn_per40', 'fg2_pct', 'fg3_pct', 'ft_pct',
+)
+ZONE_SHARE_COLUMNS = tuple(f"share_{'_'.join(bin_name.split())}" for bin_name in ZONE_BINS[1:])
+
+PLAYER_FEATURES_SCHEMA = TableSchema(
+    columns=(
+        Column('season', 'season', 'INTEGER'),
+        Column('player_id', 'player_id', 'TEXT'),
+        Column('player', 'player', 'TEXT'),
+        Column('team', 'team', 'TEXT'),
+        Column('games', 'games', 'INTEGER'),
+        Column('seconds_played', 'seconds_played', 'INTEGER'),
+        Column('shot_attempts', 'shot_attempts', 'INTEGER'),
+    ) + tuple(Column(name, name, 'REAL') for name in PLAYER_RATE_COLUMNS + ZONE_SHARE_COLUMNS),
+    conflict_columns=('player_id', 'season'),
+)
+
+PLAYER_SIMILARITY_SCHEMA = TableSchema(
+    columns=(
+        Column('season', 'season', 'INTEGER'),
+        Column('player_id', 'player_id', 'TEXT'),
+        Column('player', 'player', 'TEXT'),
+        Column('team', 'team', 'TEXT'),
+        Column('rank', 'rank', 'SMALLINT'),
+        Column('similar_season', 'similar_season', 'INTEGER'),
+        Column('similar_player_id', 'similar_player_id', 'TEXT'),
+        Column('similar_player', 'similar_player', 'TEXT'),
+        Column('similar_team', 'similar_team', 'TEXT'),
+        Column('similarity', 'similarity', 'REAL'),
+    ),
+    # The unique index on (player_id, season, rank) is also the lookup index for a player-season's neighbours
+    conflict_columns=('player_id', 'season', 'rank'),
+)
+
+def coerce_column(values: pd.Series, column: Column) -> pd.Series:
+    if column.null_values:
+        values = values.mask(values.isin(column.null_values))
+
+    if column.sql_type in ('INTEGER', 'SMALLINT'):
+        numbers = pd.to_numeric(values, errors='coerce').astype('float64')
+        return pd.Series(np.trunc(numbers), index=values.index).astype('Int64')
+    if column.sql_type == 'REAL':
+        return pd.to_numeric(values, errors='coerce').astype('Float64')
+    return values.astype('string')
+
+def coerce_frame(df: pd.DataFrame, schema: TableSchema) -> pd.DataFrame:
+    coerced = {}
+    for column in schema.columns:
+        if column.source in df.columns:
+            values = df[column.source]
+        else:
+            values = pd.Series(None, index=df.index, dtype=object)
+        coerced[column.name] = coerce_column(values, column)
+    return pd.DataFrame(coerced, index=df.index)
+
+def iter_rows(coerced_df: pd.DataFrame):
+    columns = [
+        coerced_df[name].astype(object).where(coerced_df[name].notna(), None).to_numpy()
+        for name in coerced_df.columns
+    ]
+    return zip(*columns)
+
+def index_name(table_name: str, columns) -> str:
+    return f"{table_name}_{'_'.join(columns)}_idx"
+
+def create_table_sql(table_name: str, schema: TableSchema, drop_existing: bool = True,
+                     partitioned: bool = PARTITION_BY_SEASON) -> str:
+    partitioned = partitioned and schema.partition_column is not None
+
+    column_lines = ['id SERIAL' if partitioned else 'id SERIAL PRIMARY KEY']
+    for column in schema.columns:
+        line = f"{column.name} {column.sql_type}"
+        if column.default is not None:
+            line += f" DEFAULT {column.default}"
+        column_lines.append(line)
+    if schema.hashed:
+        column_lines.append(f"{ROW_HASH_COLUMN} BIGINT")
+    if partitioned:
+        column_lines.append(f"PRIMARY KEY(id, {schema.partition_column})")
+    column_lines.append(f"UNIQUE({', '.join(schema.conflict_columns)})")
+
+    drop_sql = f"DROP TABLE IF EXISTS {table_name};\n" if drop_existing else ""
+    column_sql = ',\n    '.join(column_lines)
+    partition_sql = f" PARTITION BY LIST ({schema.partition_column})" if partitioned else ""
+    # Tables created before row hashes were stored get the column on their next load
+    hash_sql = f"\nALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {ROW_HASH_COLUMN} BIGINT;" if schema.hashed else ""
+    index_sql = ''.join(
+        f"\nCREATE INDEX IF NOT EXISTS {index_name(table_name, columns)} ON {table_name} ({', '.join(columns)});"
+        for columns in schema.indexes
+    )
+    return f"{drop_sql}CREATE TABLE IF NOT EXISTS {table_name} (\n    {column_sql}\n){partition_sql};{hash_sql}{index_sql}"
+
+def create_dimension_sql(dimension: Dimension) -> str:
+    serial_type = 'SMALLSERIAL' if dimension.key_type == 'SMALLINT' else 'SERIAL'
+    label_sql = f",\n    {dimension.label} TEXT" if dimension.label else ""
+    return f"""CREATE TABLE IF NOT EXISTS {dimension.table} (
+    {dimension.key} {serial_type} PRIMARY KEY,
+    {dimension.natural} TEXT NOT NULL UNIQUE{label_sql}
+);"""
+
+def is_partitioned(cursor, table_name: str) -> bool:
+    cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (table_name,))
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+def ensure_partitions(cursor, table_name: str, values) -> bool:
+    if not is_partitioned(cursor, table_name):
+        return False
+    for value in sorted(set(values)):
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name}_{int(value)} PARTITION OF {table_name} FOR VALUES IN ({int(value)});")
+    return True
+
+def row_hashes(coerced_df: pd.DataFrame) -> pd.Series:
+    """A 64-bit content hash per row, stable across runs for the same values and schema dtypes."""
+    hashes = pd.util.hash_pandas_object(coerced_df, index=False).to_numpy().view('int64')
+    return pd.Series(hashes, index=coerced_df.index, dtype='Int64')
+
+def prepare_frame(df: pd.DataFrame, schema: TableSchema) -> pd.DataFrame:
+    coerced_df = coerce_frame(df, schema)
+    if schema.hashed:
+        coerced_df[ROW_HASH_COLUMN] = row_hashes(coerced_df)
+    return coerced_df
+
+def default_scope(coerced_df: pd.DataFrame, schema: TableSchema) -> dict:
+    return {
+        column: coerced_df[column].dropna().unique().tolist()
+        for column in ['season', 'gamecode'] if column in schema.conflict_columns
+    }
+
+def fetch_row_hashes(cursor, table_name: str, schema: TableSchema, scope: dict) -> pd.DataFrame:
+    keys = list(schema.conflict_columns)
+    where_sql = ' AND '.join(f"{column} = ANY(%s)" for column in scope)
+    cursor.execute(
+        f"SELECT id, {', '.join(keys)}, {ROW_HASH_COLUMN} FROM {table_name}{' WHERE ' + where_sql if where_sql else ''};",
+        [list(values) for values in scope.values()]
+    )
+    existing = pd.DataFrame(cursor.fetchall(), columns=['id'] + keys + [ROW_HASH_COLUMN])
+    columns = {column.name: column for column in schema.columns}
+    for key in keys:
+        existing[key] = coerce_column(existing[key], columns[key])
+    existing[ROW_HASH_COLUMN] = existing[ROW_HASH_COLUMN].astype('Int64')
+    return existing
+
+def diff_rows(coerced_df: pd.DataFrame, existing: pd.DataFrame, schema: TableSchema) -> tuple:
+    """Split off the rows whose stored hash already matches, and find the stored rows df no longer has.
+
+    Rows with a NULL key never conflict in Postgres, so they are always sent and always replaced."""
+    keys = list(schema.conflict_columns)
+    frame = coerced_df[keys + [ROW_HASH_COLUMN]].reset_index(drop=True)
+    frame['position'] = np.arange(len(frame))
+    frame = frame[frame[keys].notna().all(axis=1)]
+    stored = existing[existing[keys].notna().all(axis=1)]
+
+    matched = frame.merge(stored, on=keys, how='left', suffixes=('', '_stored'))
+    unchanged = matched[ROW_HASH_COLUMN].eq(matched[f"{ROW_HASH_COLUMN}_stored"]).fillna(False).to_numpy(dtype=bool)
+    send = np.ones(len(coerced_df), dtype=bool)
+    send[matched.loc[unchanged, 'position'].to_numpy()] = False
+
+    still_present = stored.merge(frame[keys].drop_duplicates(), on=keys, how='left', indicator=True)['_merge'] == 'both'
+    kept_ids = stored['id'][still_present.to_numpy()]
+    stale_ids = existing.loc[~existing['id'].isin(kept_ids), 'id'].astype('int64').tolist()
+    return coerced_df[send], stale_ids
+
+def upsert_frame(cursor, df: pd.DataFrame, table_name: str, schema: TableSchema,
+                 delete_missing: bool = False, scope: dict = None) -> int:
+    """Upsert the rows of df that are new or changed since they were last loaded, and return how many were sent.
+
+    Stored rows are compared by row_hash within scope (column -> values), by default the seasons and gamecodes
+    in df. With delete_missing the default scope is the whole table, and stored rows in scope that df no longer
+    has are deleted; only the seasons in df are fetched and diffed, the rows of any other season are deleted
+    outright."""
+    with track(f"coerce {table_name}", rows_in=len(df)) as metrics:
+        coerced_df = prepare_frame(df, schema)
+        metrics.rows_out = len(coerced_df)
+
+    if schema.hashed:
+        with track(f"diff {table_name}", rows_in=len(coerced_df)) as metrics:
+            loaded_seasons = None
+            if scope is None and delete_missing and 'season' in coerced_df.columns:
+                loaded_seasons = [int(season) for season in coerced_df['season'].dropna().unique()]
+                scope = {'season': loaded_seasons}
+            elif scope is None:
+                scope = {} if delete_missing else default_scope(coerced_df, schema)
+            existing = fetch_row_hashes(cursor, table_name, schema, scope)
+            coerced_df, stale_ids = diff_rows(coerced_df, existing, schema)
+            metrics.drop(metrics.rows_in - len(coerced_df), 'unchanged')
+            if loaded_seasons is not None:
+                cursor.execute(f"DELETE FROM {table_name} WHERE season IS NULL OR season <> ALL(%s::INTEGER[]);",
+                               (loaded_seasons,))
+                metrics.drop(cursor.rowcount, 'season no longer loaded')
+            if delete_missing and stale_ids:
+                cursor.execute(f"DELETE FROM {table_name} WHERE id = ANY(%s);", (stale_ids,))
+                metrics.drop(len(stale_ids), 'deleted from table')
+            metrics.rows_out = len(coerced_df)
+
+    with track(f"copy_upsert {table_name}", rows_in=len(coerced_df)) as metrics:
+        if coerced_df.empty:
+            metrics.rows_out = 0
+            return 0
+        if schema.partition_column is not None:
+            ensure_partitions(cursor, table_name, coerced_df[schema.partition_column].dropna())
+        metrics.rows_out = copy_upsert(cursor, table_name, list(coerced_df.columns), iter_rows(coerced_df),
+                                       list(schema.conflict_columns))
+    return metrics.rows_out
+
+def reload_partition(cursor, df: pd.DataFrame, table_name: str, schema: TableSchema, value: int) -> int:
+    """Replace every row for one partition value (e.g. one season) instead of rewriting the whole table."""
+    if ensure_partitions(cursor, table_name, [value]):
+        cursor.execute(f"TRUNCATE {table_name}_{int(value)};")
+    else:
+        cursor.execute(f"DELETE FROM {table_name} WHERE {schema.partition_column} = %s;", (int(value),))
+    return upsert_frame(cursor, df, table_name, schema)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Build a full reload in a shadow table and swap it in with one atomic rename, keeping the previous table for rollback
+
+import logging
+
+from DataVersions import bump_data_versions
+from TableSchemas import TableSchema, create_table_sql, index_name
+
+logger = logging.getLogger(__name__)
+
+SHADOW_SUFFIX = '__staging'
+OLD_SUFFIX = '__old'
+MIN_ROW_RATIO = 0.5
+
+def shadow_table_name(table_name: str) -> str:
+    return f"{table_name}{SHADOW_SUFFIX}"
+
+def old_table_name(table_name: str) -> str:
+    return f"{table_name}{OLD_SUFFIX}"
+
+def create_shadow_table(cursor, table_name: str, schema: TableSchema) -> str:
+    shadow_table = shadow_table_name(table_name)
+    cursor.execute(create_table_sql(shadow_table, schema, drop_existing=True))
+    return shadow_table
+
+def table_exists(cursor, table_name: str) -> bool:
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (table_name,))
+    return cursor.fetchone()[0]
+
+def table_family(cursor, table_name: str) -> tuple:
+    """The table with its partitions and id sequence, and every index on them."""
+    cursor.execute("""
+    WITH tables AS (
+        SELECT to_regclass(%(table)s) AS oid
+        UNION ALL
+        SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%(table)s)
+    )
+    SELECT c.relname, c.relkind FROM tables t JOIN pg_class c ON c.oid = t.oid
+    UNION ALL
+    SELECT c.relname, c.relkind FROM pg_class c WHERE c.oid = to_regclass(pg_get_serial_sequence(%(table)s, 'id'));
+    """, {'table': table_name})
+    relations = cursor.fetchall()
+
+    cursor.execute("""
+    WITH tables AS (
+        SELECT to_regclass(%(table)s) AS oid
+        UNION ALL
+        SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%(table)s)
+    )
+    SELECT
+        ic.relname,
+        tc.relname,
+        ARRAY(SELECT a.attname::text FROM unnest(i.indkey) WITH ORDINALITY k(attnum, n)
+              JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum ORDER BY k.n),
+        i.indisprimary,
+        i.indisunique
+    FROM tables t
+    JOIN pg_index i ON i.indrelid = t.oid
+    JOIN pg_class ic ON ic.oid = i.indexrelid
+    JOIN pg_class tc ON tc.oid = i.indrelid;
+    """, {'table': table_name})
+    return relations, cursor.fetchall()
+
+def rename_table_family(cursor, from_name: str, to_name: str):
+    relations, indexes = table_family(cursor, from_name)
+
+    # Postgres truncates and numbers the index names it picks for the shadow table,
+    # so give every index the name create_table_sql would give it on the renamed table
+    for relname, table_relname, columns, is_primary, is_unique in indexes:
+        new_table_relname = f"{to_name}{table_relname[len(from_name):]}"
+        if is_primary:
+            new_name = f"{new_table_relname}_pkey"
+        elif is_unique:
+            new_name = f"{new_table_relname}_{'_'.join(columns)}_key"
+        else:
+            new_name = index_name(new_table_relname, columns)
+        cursor.execute(f"ALTER INDEX {relname} RENAME TO {new_name};")
+
+    for relname, relkind in relations:
+        statement = 'ALTER SEQUENCE' if relkind == 'S' else 'ALTER TABLE'
+        cursor.execute(f"{statement} {relname} RENAME TO {to_name}{relname[len(from_name):]};")
+
+def count_rows(cursor, table_name: str) -> int:
+    cursor.execute(f"SELECT COUNT(*) FROM {table_name};")
+    return cursor.fetchone()[0]
+
+def check_row_count(cursor, table_name: str, min_row_ratio: float = MIN_ROW_RATIO):
+    new_rows = count_rows(cursor, shadow_table_name(table_name))
+    if new_rows == 0:
+        raise ValueError(f"{shadow_table_name(table_name)} is empty, keeping the current {table_name}.")
+
+    if table_exists(cursor, table_name):
+        previous_rows = count_rows(cursor, table_name)
+        if new_rows < previous_rows * min_row_ratio:
+            raise ValueError(
+                f"{shadow_table_name(table_name)} has {new_rows} rows against {previous_rows} in {table_name} "
+                f"(below {min_row_ratio:.0%}), keeping the current table."
+            )
+
+def swap_in_shadow_tables(cursor, table_names: list, min_row_ratio: float = MIN_ROW_RATIO):
+    """Rename each shadow table over its live table. Run inside one transaction and commit right after."""
+    for table_name in table_names:
+        check_row_count(cursor, table_name, min_row_ratio)
+
+    cursor.execute("SET LOCAL lock_timeout = '10s';")
+    for table_name in table_names:
+        if table_exists(cursor, old_table_name(table_name)):
+            cursor.execute(f"DROP TABLE {old_table_name(table_name)};")
+        if table_exists(cursor, table_name):
+            rename_table_family(cursor, table_name, old_table_name(table_name))
+        rename_table_family(cursor, shadow_table_name(table_name), table_name)
+        logger.info(f"Swapped {shadow_table_name(table_name)} in as {table_name}")
+
+def table_seasons(cursor, table_name: str) -> list:
+    cursor.execute(f"SELECT DISTINCT season FROM {table_name} WHERE season IS NOT NULL")
+    return [season for season, in cursor.fetchall()]
+
+def restore_previous_tables(cursor, table_names: list):
+    """Put the tables kept by the last swap back in place of the live ones, bumping their data versions so
+    cached reads of the discarded rows are dropped."""
+    for table_name in table_names:
+        if not table_exists(cursor, old_table_name(table_name)):
+            raise ValueError(f"No previous version of {table_name} to restore.")
+
+    cursor.execute("SET LOCAL lock_timeout = '10s';")
+    for table_name in table_names:
+        cursor.execute(f"DROP TABLE IF EXISTS {table_name};")
+        rename_table_family(cursor, old_table_name(table_name), table_name)
+        bump_data_versions(cursor, table_name, table_seasons(cursor, table_name), replace_table=True)
+        logger.info(f"Restored {old_table_name(table_name)} as {table_name}")
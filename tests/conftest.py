@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# The ETL modules live at the repository root and import each other by name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def db_conn():
+    """A connection to DATABASE_URL whose work is rolled back afterwards; skips the test without a database."""
+    if not os.getenv("DATABASE_URL"):
+        pytest.skip("DATABASE_URL not set")
+    from BulkLoader import connect_to_db
+    conn = connect_to_db()
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
@@ -0,0 +1,91 @@
+import json
+
+import euroleague_api.shot_data
+import euroleague_api.utils
+import pytest
+from euroleague_api.shot_data import ShotData as ShotDataClient
+
+import AsyncFetcher
+from AsyncFetcher import fetch_frames, game_request, record_response, request_key, routing_get_requests
+from FetchStub import start_stub_server, stub_base_url
+from GameFetcher import FetchUnit
+
+SEASON = 2023
+GAMES = range(1, 7)
+
+def shot_rows(gamecode: int) -> list:
+    return [
+        {'NUM_ANOT': n, 'TEAM': 'MAD ', 'ID_PLAYER': f'P{gamecode} ', 'ID_ACTION': '2FGM ', 'POINTS': 2,
+         'COORD_X': 100 * n, 'COORD_Y': 50}
+        for n in range(1, 4)
+    ]
+
+@pytest.fixture
+def recorded_games(tmp_path):
+    """Recorded shot data responses for GAMES, keyed by the request euroleague_api itself makes."""
+    client = ShotDataClient(competition='E')
+    units = [FetchUnit('E', 'shots', SEASON, gamecode, 'RS', gamecode) for gamecode in GAMES]
+    responses_dir = str(tmp_path / 'responses')
+    with routing_get_requests():
+        for unit in units:
+            url, params = game_request(client, unit)
+            body = json.dumps({'Rows': shot_rows(unit.gamecode)}).encode('utf-8')
+            record_response(responses_dir, request_key(url, params), 200, 'application/json', body)
+    return client, units, responses_dir
+
+def test_game_request_reads_the_library_url():
+    original = euroleague_api.shot_data.get_requests
+    with routing_get_requests():
+        url, params = game_request(ShotDataClient(competition='E'), FetchUnit('E', 'shots', SEASON, 7))
+    assert url.endswith('/Points')
+    assert params == {'gamecode': 7, 'seasoncode': f'E{SEASON}'}
+    assert euroleague_api.shot_data.get_requests is original
+
+def test_routing_restores_get_requests_after_last_user():
+    original = euroleague_api.shot_data.get_requests
+    with routing_get_requests():
+        with routing_get_requests():
+            assert euroleague_api.shot_data.get_requests is not original
+        assert euroleague_api.shot_data.get_requests is not original
+    assert euroleague_api.shot_data.get_requests is original
+    assert euroleague_api.utils.get_requests is original
+
+    with pytest.raises(RuntimeError):
+        with routing_get_requests():
+            raise RuntimeError("fetch failed")
+    assert euroleague_api.shot_data.get_requests is original
+    assert AsyncFetcher._routing_users == 0
+
+def test_async_engine_against_stub(recorded_games, tmp_path):
+    client, units, responses_dir = recorded_games
+    original = euroleague_api.shot_data.get_requests
+    server = start_stub_server(responses_dir, failure_rate=0.3, disconnect_rate=0.1, seed=1)
+    try:
+        frames = fetch_frames(client, units, cache_dir=str(tmp_path / 'cache'), base_url=stub_base_url(server),
+                              rate=0, backoff=0.01, max_backoff=0.05, max_retries=8)
+    finally:
+        server.shutdown()
+
+    assert [frame['Gamecode'].unique().tolist() for frame in frames] == [[gamecode] for gamecode in GAMES]
+    for unit, frame in zip(units, frames):
+        # Parsed by euroleague_api, so trailing spaces are stripped, with the game columns the threaded fetch adds
+        assert frame['ID_PLAYER'].tolist() == [f'P{unit.gamecode}'] * 3
+        assert frame['TEAM'].tolist() == ['MAD'] * 3
+        assert (frame['Phase'] == 'RS').all() and (frame['Round'] == unit.gamecode).all()
+    assert server.stats['failures'] + server.stats['disconnects'] > 0
+    assert server.stats['missing'] == 0
+    assert euroleague_api.shot_data.get_requests is original
+
+def test_async_engine_skips_games_without_a_response(recorded_games, tmp_path):
+    client, units, responses_dir = recorded_games
+    missing = FetchUnit('E', 'shots', SEASON, 99)
+    server = start_stub_server(responses_dir)
+    try:
+        frames = fetch_frames(client, units[:2] + [missing], cache_dir=str(tmp_path / 'cache'),
+                              base_url=stub_base_url(server), rate=0)
+    finally:
+        server.shutdown()
+
+    assert frames[2] is None
+    assert [frame['Gamecode'].iloc[0] for frame in frames[:2]] == [1, 2]
+    assert server.stats['missing'] == 1
@@ -0,0 +1,79 @@
+from psycopg2.extras import execute_values
+
+from BulkLoader import copy_upsert
+
+COLUMNS = ['season', 'gamecode', 'player_id', 'player', 'points', 'plusminus']
+CONFLICT_COLUMNS = ['season', 'gamecode', 'player_id']
+UPDATE_COLUMNS = ['player', 'points', 'plusminus']
+
+FIRST_LOAD = [
+    (2024, '1', 'P1', 'Doe, "JJ"', 10, 1.5),
+    (2024, '1', 'P2', 'Line\nbreak', 4, None),
+    (2024, '1', 'P3', '', 0, -2.0),
+    (2024, '1', None, 'Team', 80, None),
+]
+SECOND_LOAD = [
+    (2024, '1', 'P1', 'Doe, "JJ"', 10, 1.5),
+    (2024, '1', 'P2', 'Line\nbreak', 6, 3.0),
+    (2024, '1', 'P3', None, 0, -2.0),
+    (2024, '2', 'P1', 'Back\\slash', 12, float('nan')),
+    (2024, '1', None, 'Team', 80, None),
+]
+
+def create_table(cursor, table_name: str):
+    cursor.execute(f"""
+    CREATE TEMP TABLE {table_name} (
+        id SERIAL PRIMARY KEY,
+        season INTEGER, gamecode TEXT, player_id TEXT, player TEXT, points INTEGER, plusminus REAL,
+        UNIQUE (season, gamecode, player_id)
+    ) ON COMMIT DROP;
+    """)
+
+def execute_values_upsert(cursor, table_name: str, rows: list):
+    """The executemany-style load copy_upsert replaced."""
+    rows = [tuple(None if isinstance(val, float) and val != val else val for val in row) for row in rows]
+    execute_values(cursor, f"""
+    INSERT INTO {table_name} ({', '.join(COLUMNS)}) VALUES %s
+    ON CONFLICT ({', '.join(CONFLICT_COLUMNS)}) DO UPDATE SET
+        {', '.join(f'{col} = EXCLUDED.{col}' for col in UPDATE_COLUMNS)}
+    """, rows)
+
+def table_rows(cursor, table_name: str) -> list:
+    cursor.execute(f"SELECT {', '.join(COLUMNS)} FROM {table_name} ORDER BY {', '.join(COLUMNS)} NULLS FIRST")
+    return cursor.fetchall()
+
+def row_locations(cursor, table_name: str) -> dict:
+    cursor.execute(f"SELECT id, ctid FROM {table_name}")
+    return dict(cursor.fetchall())
+
+def test_copy_upsert_matches_execute_values(db_conn):
+    cursor = db_conn.cursor()
+    create_table(cursor, 'copy_target')
+    create_table(cursor, 'values_target')
+
+    assert copy_upsert(cursor, 'copy_target', COLUMNS, iter(FIRST_LOAD), CONFLICT_COLUMNS) == len(FIRST_LOAD)
+    execute_values_upsert(cursor, 'values_target', FIRST_LOAD)
+    assert table_rows(cursor, 'copy_target') == table_rows(cursor, 'values_target')
+    # Quoted empty strings stay empty strings, only missing values become NULL
+    assert ('', 0) in [(player, points) for _, _, _, player, points, _ in table_rows(cursor, 'copy_target')]
+
+    locations = row_locations(cursor, 'copy_target')
+    copy_upsert(cursor, 'copy_target', COLUMNS, iter(SECOND_LOAD), CONFLICT_COLUMNS)
+    execute_values_upsert(cursor, 'values_target', SECOND_LOAD)
+    rows = table_rows(cursor, 'copy_target')
+    assert rows == table_rows(cursor, 'values_target')
+
+    assert (2024, '1', 'P2', 'Line\nbreak', 6, 3.0) in rows
+    assert (2024, '1', 'P3', None, 0, -2.0) in rows
+    assert (2024, '2', 'P1', 'Back\\slash', 12, None) in rows
+    # NULL keys never conflict, so the team row is inserted again
+    assert sum(player_id is None for _, _, player_id, _, _, _ in rows) == 2
+
+    cursor.execute("SELECT id, player_id FROM copy_target WHERE gamecode = '1' AND player_id IN ('P1', 'P2', 'P3')")
+    ids = {player_id: row_id for row_id, player_id in cursor.fetchall()}
+    new_locations = row_locations(cursor, 'copy_target')
+    # An unchanged row is skipped by IS DISTINCT FROM and keeps its tuple; changed rows are rewritten
+    assert new_locations[ids['P1']] == locations[ids['P1']]
+    assert new_locations[ids['P2']] != locations[ids['P2']]
+    assert new_locations[ids['P3']] != locations[ids['P3']]
+    cursor.close()
@@ -0,0 +1,37 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from EtlMetrics import run_report, track
+
+def spin(seconds: float):
+    end = time.thread_time() + seconds
+    while time.thread_time() < end:
+        pass
+
+def test_memory_is_measured_per_stage(tmp_path):
+    with run_report('test', persist=False, report_dir=str(tmp_path)) as report:
+        with track('allocate'):
+            block = np.ones(50_000_000)  # 400 MB, touched so it is resident
+            del block
+        with track('allocate and keep'):
+            block = np.ones(25_000_000)
+        with track('idle'):
+            pass
+    allocate, keep, idle = report.stages
+    # Freed memory is not charged to the stages that come after
+    assert abs(allocate.rss_growth_mb) < 50
+    assert 150 < keep.rss_growth_mb < 250
+    assert abs(idle.rss_growth_mb) < 50 and idle.rss_mb < keep.rss_mb + 50
+    del block
+
+def test_threaded_stages_count_their_threads_cpu(tmp_path):
+    with run_report('test', persist=False, report_dir=str(tmp_path)) as report:
+        for threaded in (False, True):
+            with track(f'fan out threaded={threaded}', threaded=threaded):
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    list(executor.map(spin, [0.1, 0.1]))
+    calling_thread, process = report.stages
+    assert calling_thread.cpu_seconds < 0.05
+    assert process.cpu_seconds >= 0.15
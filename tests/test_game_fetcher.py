@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import AsyncFetcher
+from GameFetcher import CURRENT_SEASON_TTL, cache_path, current_season, fetch_units, season_fetch_units
+
+class StubClient:
+    """Stands in for a euroleague_api client: a few games a season, counting every call and failing on request."""
+    competition = 'E'
+
+    def __init__(self, games: int = 4, failing: set = ()):
+        self.games = games
+        self.failing = set(failing)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get_gamecodes_season(self, season: int) -> pd.DataFrame:
+        with self.lock:
+            self.calls.append(('gamecodes', season))
+        return pd.DataFrame({
+            'Phase': 'RS',
+            'Round': range(1, self.games + 2),
+            'gameCode': range(1, self.games + 2),
+            'played': [True] * self.games + [False],
+        })
+
+    def get_player_boxscore_stats_data(self, season: int, gamecode: int) -> pd.DataFrame:
+        with self.lock:
+            self.calls.append(('boxscore', season, gamecode))
+        if gamecode in self.failing:
+            raise ConnectionError(f"game {gamecode} unavailable")
+        return pd.DataFrame({'Season': season, 'Gamecode': gamecode, 'Player_ID': ['P1', 'P2'],
+                             'Points': [gamecode, gamecode * 2]})
+
+    def fetched_games(self) -> list:
+        return sorted(call[2] for call in self.calls if call[0] == 'boxscore')
+
+@pytest.fixture(params=['threads', 'async'])
+def engine(request, monkeypatch):
+    if request.param == 'async':
+        # The async engine requests the game first and hands the response to the client to parse; the stub client
+        # makes no request and parses nothing, so any request and answer will do and none leaves the test
+        async def get(self, url, params=None):
+            self.stats.requests += 1
+            return AsyncFetcher.make_response(url, 200, 'OK', {'Content-Type': 'application/json'}, b'{}')
+        monkeypatch.setattr(AsyncFetcher.AsyncFetcher, 'get', get)
+        monkeypatch.setattr(AsyncFetcher, 'game_request', lambda client, unit: (f"/stub/{unit.gamecode}", {}))
+    return request.param
+
+def fetch(client, season: int, cache_dir, engine: str) -> pd.DataFrame:
+    units = season_fetch_units(client, 'boxscore', season, str(cache_dir))
+    return fetch_units(client, units, max_workers=4, cache_dir=str(cache_dir), engine=engine)
+
+def age_cache(cache_dir, seconds: float):
+    past = time.time() - seconds
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            os.utime(os.path.join(root, name), (past, past))
+
+def test_cache_miss_then_hit(tmp_path, engine):
+    client = StubClient()
+    first = fetch(client, 2020, tmp_path, engine)
+    assert client.fetched_games() == [1, 2, 3, 4]
+    assert len(first) == 8
+    assert {'Phase', 'Round'} <= set(first.columns)
+
+    client.calls.clear()
+    second = fetch(client, 2020, tmp_path, engine)
+    assert client.calls == []
+    pd.testing.assert_frame_equal(first, second)
+
+def test_current_season_cache_expires(tmp_path, engine):
+    season = current_season()
+    client = StubClient()
+    fetch(client, season, tmp_path, engine)
+    fetch(client, season - 1, tmp_path, engine)
+
+    client.calls.clear()
+    age_cache(tmp_path, CURRENT_SEASON_TTL - 60)
+    fetch(client, season, tmp_path, engine)
+    assert client.calls == []
+
+    age_cache(tmp_path, CURRENT_SEASON_TTL + 60)
+    fetch(client, season, tmp_path, engine)
+    fetch(client, season - 1, tmp_path, engine)
+    # Only the current season is refetched, the listing included; past seasons are final
+    assert client.calls[0] == ('gamecodes', season)
+    assert client.fetched_games() == [1, 2, 3, 4]
+    assert all(call[1] == season for call in client.calls)
+
+def test_resume_after_partial_run(tmp_path, engine):
+    client = StubClient(games=6, failing={2, 5})
+    partial = fetch(client, 2021, tmp_path, engine)
+    assert sorted(partial['Gamecode'].unique()) == [1, 3, 4, 6]
+    # Failed games are not cached, so the next run picks them up
+    units = season_fetch_units(client, 'boxscore', 2021, str(tmp_path))
+    assert [unit.gamecode for unit in units if not os.path.exists(cache_path(unit, str(tmp_path)))] == [2, 5]
+
+    client.failing.clear()
+    client.calls.clear()
+    resumed = fetch(client, 2021, tmp_path, engine)
+    assert client.fetched_games() == [2, 5]
+    assert sorted(resumed['Gamecode'].unique()) == [1, 2, 3, 4, 5, 6]
+
+def test_unknown_engine(tmp_path):
+    with pytest.raises(ValueError):
+        fetch(StubClient(), 2020, tmp_path, 'processes')
@@ -0,0 +1,88 @@
+import functools
+import os
+
+import pandas as pd
+import pytest
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+import GameLogs
+from BulkLoader import connect_to_db
+from DataVersions import DATA_VERSIONS_TABLE
+from GameLogs import SYNC_STATE_TABLE, advanced_table_names, player_trends_table_name
+from SyntheticData import generate_boxscores
+
+TABLE_NAME = 'game_logs_pytest'
+SEASON = 2024
+
+class SyncClient:
+    """Serves synthetic box scores and records the connection's transaction state at every game fetched."""
+    competition = 'E'
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.boxscores = generate_boxscores(1, n_teams=4, players_per_team=3)
+        self.scores = {gamecode: (80, 70) for gamecode in self.boxscores['Gamecode'].unique()}
+        self.fetched = []
+
+    def get_gamecodes_season(self, season: int) -> pd.DataFrame:
+        games = self.boxscores[['Phase', 'Round', 'Gamecode']].drop_duplicates().rename(columns={'Gamecode': 'gameCode'})
+        return games.assign(played=True, homescore=games['gameCode'].map(lambda code: self.scores[code][0]),
+                            awayscore=games['gameCode'].map(lambda code: self.scores[code][1]))
+
+    def get_player_boxscore_stats_data(self, season: int, gamecode: int) -> pd.DataFrame:
+        self.fetched.append((gamecode, self.conn.info.transaction_status))
+        return self.boxscores[self.boxscores['Gamecode'] == gamecode].reset_index(drop=True)
+
+@pytest.fixture
+def conn():
+    if not os.getenv("DATABASE_URL"):
+        pytest.skip("DATABASE_URL not set")
+    conn = connect_to_db()
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        with conn.cursor() as cursor:
+            for table in (TABLE_NAME, player_trends_table_name(TABLE_NAME), *advanced_table_names(TABLE_NAME)):
+                cursor.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+            for table in (SYNC_STATE_TABLE, DATA_VERSIONS_TABLE):
+                cursor.execute(f"DELETE FROM {table} WHERE table_name = %s", (TABLE_NAME,))
+        conn.commit()
+        conn.close()
+
+def test_sync_fetches_outside_a_transaction_through_the_cache(conn, monkeypatch, tmp_path):
+    client = SyncClient(conn)
+    monkeypatch.setattr(GameLogs, 'BoxScoreData', lambda competition: client)
+    monkeypatch.setattr(GameLogs, 'fetch_new_game_logs',
+                        functools.partial(GameLogs.fetch_new_game_logs, cache_dir=str(tmp_path)))
+
+    def sync() -> list:
+        return GameLogs.sync_game_logs_to_db('E', TABLE_NAME, SEASON, SEASON, conn=conn)
+
+    assert sync() == [SEASON]
+    games = sorted(client.scores)
+    assert sorted(gamecode for gamecode, _ in client.fetched) == games
+    # The connection sits idle, not in a transaction, while the games are fetched
+    assert {status for _, status in client.fetched} == {TRANSACTION_STATUS_IDLE}
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}")
+        assert cursor.fetchone()[0] == len(client.boxscores)
+    conn.commit()
+
+    client.fetched.clear()
+    assert sync() == []
+    assert client.fetched == []
+
+    # A corrected score refetches that game past its cached box score
+    rescored = games[0]
+    client.scores[rescored] = (81, 70)
+    client.boxscores.loc[client.boxscores['Gamecode'] == rescored, 'Points'] += 1
+    assert sync() == [SEASON]
+    assert [gamecode for gamecode, _ in client.fetched] == [rescored]
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT SUM(points) FROM {TABLE_NAME} WHERE gamecode = %s AND row_type = 'player'", (str(rescored),))
+        stored = cursor.fetchone()[0]
+    conn.commit()
+    expected = client.boxscores.loc[(client.boxscores['Gamecode'] == rescored)
+                                    & ~client.boxscores['Player_ID'].isin(['Team', 'Total']), 'Points'].sum()
+    assert stored == expected
@@ -0,0 +1,40 @@
+import pytest
+from psycopg2.pool import PoolError
+
+import LoadTestQueries
+from LoadTestQueries import run_load, run_load_test
+
+class FlakyService:
+    """Fails every third request, as an exhausted pool would."""
+
+    def __init__(self, max_connections: int = 1, cache_size: int = 0):
+        self.calls = 0
+
+    def team_schedule(self, competition_type: str, team: str, season: int):
+        self.calls += 1
+        if self.calls % 3 == 0:
+            raise PoolError("connection pool exhausted")
+        return ()
+
+    def close(self):
+        pass
+
+def test_run_load_collects_errors_instead_of_losing_threads():
+    requests = [('team_schedule', {'team': 'MAD', 'season': 2024})]
+    latencies, errors, elapsed = run_load(FlakyService(), 'E', requests, threads=4, duration=0.05, seed=0)
+    assert latencies and errors
+    assert all(isinstance(error, PoolError) for _, _, error in errors)
+
+def test_run_load_test_fails_on_errors(monkeypatch):
+    monkeypatch.setattr(LoadTestQueries, 'sample_requests',
+                        lambda competition_type, keys, seed: [('team_schedule', {'team': 'MAD', 'season': 2024})])
+    monkeypatch.setattr(LoadTestQueries, 'QueryService', FlakyService)
+    with pytest.raises(RuntimeError, match='PoolError'):
+        run_load_test('E', keys=1, threads=2, duration=0.05, max_connections=1, seed=0)
+
+def test_run_load_test_needs_two_samples(monkeypatch):
+    monkeypatch.setattr(LoadTestQueries, 'sample_requests',
+                        lambda competition_type, keys, seed: [('team_schedule', {'team': 'MAD', 'season': 2024})])
+    monkeypatch.setattr(LoadTestQueries, 'QueryService', FlakyService)
+    with pytest.raises(ValueError, match='Only 0'):
+        run_load_test('E', keys=1, threads=1, duration=0, max_connections=1, seed=0)
@@ -0,0 +1,39 @@
+import pytest
+
+import Pipeline
+
+@pytest.mark.parametrize('argv', [
+    ['--swap-tables'],
+    ['--swap-tables', '--datasets', 'game_logs'],
+    ['--swap-tables', '--full-game-logs', '--datasets', 'game_logs', 'shot_data'],
+    ['--reload-shot-seasons', '--no-stream-shot-data'],
+    ['--reload-shot-seasons', '--transform-only'],
+])
+def test_rejects_flags_that_would_do_nothing(argv):
+    with pytest.raises(SystemExit) as exit_info:
+        Pipeline.main(argv)
+    assert exit_info.value.code == 2
+
+@pytest.mark.parametrize('full_game_logs, game_logs_stage', [(True, 'game_logs:E:load'), (False, 'game_logs:E:sync')])
+def test_similarity_refresh_takes_the_game_log_seasons(full_game_logs, game_logs_stage):
+    stages = {stage.name: stage for stage in Pipeline.build_stages(['E'], ['game_logs', 'shot_data'], full_game_logs)}
+    refresh = stages['player_similarity:E:refresh']
+    assert refresh.depends_on == game_logs_stage
+    assert refresh.after == ('shot_data:E:stream',)
+
+def test_similarity_refresh_skips_a_sync_without_new_games(monkeypatch):
+    calls = []
+    monkeypatch.setattr(Pipeline.PlayerSimilarity, 'refresh_player_similarity',
+                        lambda competition_type, seasons, conn=None: calls.append(seasons))
+    Pipeline.refresh_player_similarity([], 'E')
+    Pipeline.refresh_player_similarity([2023, 2024], 'E')
+    assert calls == [[2023, 2024]]
+
+def test_transform_only_needs_every_season_snapshotted(monkeypatch, capsys):
+    # The default sync writes no game log snapshots; a transform-only reload would delete the missing seasons
+    monkeypatch.setattr(Pipeline, 'missing_seasons',
+                        lambda competition, dataset, start, end: [2023] if dataset == 'boxscore' else [])
+    with pytest.raises(SystemExit) as exit_info:
+        Pipeline.main(['--transform-only', '--competitions', 'E'])
+    assert exit_info.value.code == 2
+    assert 'game_logs E 2023' in capsys.readouterr().err
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from GameLogs import calculate_player_trends
+from TableSchemas import TREND_WINDOWS
+
+def game_logs(rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    players = rng.choice(['P1', 'P2', 'P3', 'Team', 'Total'], rows)
+    return pd.DataFrame({
+        'Season': rng.choice([2023, 2024], rows),
+        'Phase': 'RS',
+        'Round': rng.integers(1, 30, rows),
+        'Gamecode': [str(code) for code in rng.integers(1, 300, rows)],
+        'Player_ID': players,
+        'Player': players,
+        'Team': 'T1',
+        'Minutes': rng.choice(['DNP', '0:00', '12:30', '25:05', '31:59'], rows),
+        'Points': rng.integers(0, 30, rows),
+        'Valuation': rng.integers(-5, 35, rows),
+        'Plusminus': rng.normal(0, 8, rows).round(1),
+    })
+
+def test_rolling_averages_follow_each_players_games():
+    # Rows arrive in no particular order, so any positional mix-up lands values on another player's game
+    trends = calculate_player_trends(game_logs(400, seed=3))
+    assert not trends['player_id'].isin(['Team', 'Total']).any()
+
+    for player_id, games in trends.groupby('player_id'):
+        games = games.sort_values(['season', 'round'], kind='stable')
+        points = games['points'].to_numpy(dtype=float)
+        for window in TREND_WINDOWS:
+            expected = [points[max(0, i - window + 1):i + 1].mean() for i in range(len(points))]
+            np.testing.assert_allclose(games[f"last{window}_points"].to_numpy(), expected)
+        for season, season_games in games.groupby('season'):
+            season_points = season_games['points'].to_numpy(dtype=float)
+            np.testing.assert_allclose(season_games['season_avg_points'].to_numpy(),
+                                       np.cumsum(season_points) / np.arange(1, len(season_points) + 1))
@@ -0,0 +1,155 @@
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import psycopg2
+import pytest
+from psycopg2.pool import PoolError
+
+import QueryService as QueryService_module
+from QueryService import _MISSING, QueryService, ResultCache, start_query_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_imports_without_the_etl_modules():
+    code = ("import sys, QueryService; "
+            "loaded = [name for name in ('ShotData', 'GameLogs', 'euroleague_api') if name in sys.modules]; "
+            "assert not loaded, loaded")
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=REPO_ROOT)
+
+class FailingService:
+    def __init__(self, error: Exception):
+        self.error = error
+
+    def team_schedule(self, competition_type: str, team: str, season: int):
+        raise self.error
+
+@pytest.mark.parametrize('error', [psycopg2.OperationalError('server closed the connection'),
+                                   PoolError('connection pool exhausted')])
+def test_database_errors_answer_500(error):
+    server = start_query_server(FailingService(error), port=0)
+    host, port = server.server_address[:2]
+    try:
+        with pytest.raises(urllib.error.HTTPError) as response:
+            urllib.request.urlopen(f"http://{host}:{port}/team_schedule?competition=E&team=MAD&season=2024", timeout=5)
+    finally:
+        server.shutdown()
+    assert response.value.code == 500
+    body = json.loads(response.value.read())
+    assert 'team_schedule' in body['error'] and str(error) not in body['error']
+
+def test_callers_wait_for_a_free_connection():
+    if not os.getenv("DATABASE_URL"):
+        pytest.skip("DATABASE_URL not set")
+    service = QueryService(max_connections=2, cache_size=0)
+    errors = []
+
+    def query():
+        try:
+            with service.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("SELECT pg_sleep(0.05)")
+        except Exception as e:
+            errors.append(e)
+
+    try:
+        threads = [threading.Thread(target=query) for _ in range(8)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        service.close()
+    assert errors == []
+    # Two at a time: eight queries take at least four rounds
+    assert elapsed >= 0.2
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_result_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(QueryService_module.time, 'monotonic', Clock())
+    cache = ResultCache(max_size=2, ttl=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    # 'a' was read after 'b' went in, so 'b' is the one evicted
+    assert cache.get('b') is _MISSING
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert (cache.hits, cache.misses) == (3, 1)
+
+def test_result_cache_expires_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(QueryService_module.time, 'monotonic', clock)
+    cache = ResultCache(max_size=10, ttl=60)
+    cache.put('a', 1)
+    clock.now += 59
+    assert cache.get('a') == 1
+    clock.now += 2
+    assert cache.get('a') is _MISSING
+    assert 'a' not in cache.entries
+
+def test_result_cache_disabled():
+    cache = ResultCache(max_size=0)
+    cache.put('a', 1)
+    assert cache.get('a') is _MISSING
+
+class StubConnection:
+    def cursor(self):
+        return contextlib.nullcontext(None)
+
+@pytest.fixture
+def stub_service(monkeypatch):
+    """A QueryService without a database: versions come from a dict, queries count their calls."""
+    clock = Clock()
+    versions = {}
+    monkeypatch.setattr(QueryService_module, 'create_connection_pool', lambda max_connections: None)
+    monkeypatch.setattr(QueryService_module.time, 'monotonic', clock)
+    monkeypatch.setattr(QueryService_module, 'fetch_data_versions', lambda cursor: dict(versions))
+    service = QueryService(max_connections=1, cache_size=16, ttl=3600, version_check_seconds=2)
+
+    @contextlib.contextmanager
+    def connection():
+        yield StubConnection()
+    service.connection = connection
+    service.queries = []
+
+    def query(sql, params):
+        service.queries.append(params)
+        return [(1, 'RS', None, '1', 'Opp', 'OPP', 'home', 'Win', 80, 70, f"{len(service.queries)}-0")]
+    service.query = query
+    return service, versions, clock
+
+def test_cached_until_the_data_version_changes(stub_service):
+    service, versions, clock = stub_service
+    table_name = 'schedule_results_euroleague'
+    versions[(table_name, 2024)] = 1
+
+    first = service.team_schedule('E', 'MAD', 2024)
+    assert service.team_schedule('E', 'MAD', 2024) == first
+    assert len(service.queries) == 1
+
+    # Another season of the same table is cached on its own and unaffected by this one's version
+    service.team_schedule('E', 'MAD', 2023)
+    assert len(service.queries) == 2
+
+    versions[(table_name, 2024)] = 2
+    # The versions are only re-read every version_check_seconds
+    assert service.team_schedule('E', 'MAD', 2024) == first
+    clock.now += 2
+    second = service.team_schedule('E', 'MAD', 2024)
+    assert second != first and len(service.queries) == 3
+    service.team_schedule('E', 'MAD', 2023)
+    assert len(service.queries) == 3
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.mark.parametrize('module', ['RawSnapshots', 'GameFetcher', 'ShotData'])
+def test_imports_without_pyarrow(module):
+    # A None entry in sys.modules makes any import of pyarrow fail, as if it were not installed
+    code = f"import sys; sys.modules['pyarrow'] = None; import {module}"
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=REPO_ROOT)
+
+def test_mixed_columns_round_trip(tmp_path):
+    from RawSnapshots import read_snapshot, write_season_snapshot
+    df = pd.DataFrame({
+        'Season': [2024] * 8,
+        'Minutes': ['DNP', 7, 2.5, None, '007', 'nan', float('nan'), True],
+        'Flag': [True, 'False', False, None, 0, 1, 'True', 1.0],
+        'Extra': [[1, 2], {'a': 1}, 'x', None, 3, '[1, 2]', np.int64(4), np.float64(0.5)],
+        'Points': range(8),
+    })
+    path = write_season_snapshot('E', 'boxscore', 2024, df, snapshot_dir=str(tmp_path))
+    restored = read_snapshot(path)
+
+    assert list(restored.columns) == list(df.columns)
+    for column in ['Minutes', 'Flag', 'Extra']:
+        for original, value in zip(df[column], restored[column]):
+            assert type(value) is type(original.item() if isinstance(original, np.generic) else original)
+            if isinstance(original, float) and original != original:
+                assert value != value
+            else:
+                assert value == original
+
+def test_read_seasons_raises_on_a_missing_season(tmp_path):
+    from RawSnapshots import read_seasons, write_season_snapshot
+    for season in (2022, 2024):
+        write_season_snapshot('E', 'boxscore', season, pd.DataFrame({'Season': [season], 'Points': [1]}),
+                              snapshot_dir=str(tmp_path))
+    assert read_seasons('E', 'boxscore', 2022, 2022, snapshot_dir=str(tmp_path))['Season'].tolist() == [2022]
+    with pytest.raises(ValueError, match='2023'):
+        read_seasons('E', 'boxscore', 2022, 2024, snapshot_dir=str(tmp_path))
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+import ShotData
+from BulkLoader import connect_to_db
+from Competitions import shot_facts_table_name, shot_grid_table_names, shot_zone_table_names
+from SyntheticData import generate_shots
+
+TABLE_NAME = 'shot_data_pytest'
+AGGREGATE_TABLES = (*shot_zone_table_names(TABLE_NAME), *shot_grid_table_names(TABLE_NAME))
+
+@pytest.fixture
+def conn():
+    if not os.getenv("DATABASE_URL"):
+        pytest.skip("DATABASE_URL not set")
+    conn = connect_to_db()
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP VIEW IF EXISTS {TABLE_NAME}")
+            for table in (shot_facts_table_name(TABLE_NAME), *AGGREGATE_TABLES):
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.commit()
+        conn.close()
+
+def table_state(cursor) -> dict:
+    state = {}
+    for table in AGGREGATE_TABLES:
+        cursor.execute(f"SELECT '{table}'::regclass::oid, array_agg(DISTINCT season ORDER BY season) FROM {table}")
+        state[table] = cursor.fetchone()
+    return state
+
+def test_full_reload_keeps_the_aggregate_tables(conn, monkeypatch):
+    shots = ShotData.transform_shot_data(generate_shots(2, n_teams=4, players_per_team=3, shots_per_game=20))
+    seasons = sorted(shots['Season'].unique().tolist())
+    ShotData.insert_shot_data_to_db(shots, TABLE_NAME, conn=conn)
+    with conn.cursor() as cursor:
+        before = table_state(cursor)
+    conn.commit()
+    assert all(loaded_seasons == seasons for _, loaded_seasons in before.values())
+
+    seen_during_load = {}
+    refresh = ShotData.refresh_shot_zone_aggregates
+
+    def refresh_and_look(cursor, shot_data_df, table_name):
+        # Another session, mid-load: the aggregates it reads must still be the previous load's
+        reader = connect_to_db()
+        try:
+            with reader.cursor() as reader_cursor:
+                seen_during_load.update(table_state(reader_cursor))
+        finally:
+            reader.close()
+        refresh(cursor, shot_data_df, table_name)
+    monkeypatch.setattr(ShotData, 'refresh_shot_zone_aggregates', refresh_and_look)
+
+    ShotData.insert_shot_data_to_db(shots[shots['Season'] == seasons[-1]], TABLE_NAME, conn=conn)
+    assert seen_during_load == before
+    with conn.cursor() as cursor:
+        after = table_state(cursor)
+    assert {table: oid for table, (oid, _) in after.items()} == {table: oid for table, (oid, _) in before.items()}
+    assert all(loaded_seasons == seasons[-1:] for _, loaded_seasons in after.values())
@@ -0,0 +1,66 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ShotData import COURT_PARAMS, classify_zones, classify_zones_vectorized
+from TableSchemas import ZONE_BINS
+
+def row_by_row(shots: pd.DataFrame) -> list:
+    return [classify_zones(row, COURT_PARAMS) for _, row in shots.iterrows()]
+
+def assert_same_zones(shots: pd.DataFrame):
+    vectorized = classify_zones_vectorized(shots, COURT_PARAMS)
+    assert list(vectorized.cat.categories) == ZONE_BINS
+    assert vectorized.astype(str).tolist() == row_by_row(shots)
+
+def boundary_points() -> list:
+    """Points exactly on every line that separates two bins, and either side of it."""
+    corner_x = COURT_PARAMS['corner_line_x']
+    corner_y = COURT_PARAMS['corner_intersection_y']
+    points = []
+    for x in [-corner_x, corner_x, -50, 50, 0]:
+        for y in [corner_y, -corner_y, 0]:
+            points += [(x, y), (math.nextafter(x, -math.inf), y), (math.nextafter(x, math.inf), y),
+                       (x, math.nextafter(y, math.inf))]
+    for radius in [COURT_PARAMS['restricted_area_radius'], 300, COURT_PARAMS['three_point_radius']]:
+        for degrees in [-90, -60, -30, 0, 30, 60, 90]:
+            angle = math.radians(degrees)
+            x, y = radius * math.sin(angle), radius * math.cos(angle)
+            points += [(x, y), (x * (1 - 1e-12), y * (1 - 1e-12)), (x * (1 + 1e-12), y * (1 + 1e-12))]
+        points += [(0, radius), (radius, 0), (-radius, 0), (50, math.sqrt(radius**2 - 50**2))]
+    for degrees in [-30, 30]:
+        for radius in [700, 900]:
+            angle = math.radians(degrees)
+            points.append((radius * math.sin(angle), radius * math.cos(angle)))
+    return points
+
+def test_random_coordinates():
+    rng = np.random.default_rng(0)
+    shots = pd.DataFrame({'COORD_X': rng.uniform(-800, 800, 20_000), 'COORD_Y': rng.uniform(-200, 1400, 20_000)})
+    assert_same_zones(shots)
+
+def test_integer_coordinates():
+    rng = np.random.default_rng(1)
+    shots = pd.DataFrame({'COORD_X': rng.integers(-800, 800, 20_000), 'COORD_Y': rng.integers(-200, 1400, 20_000)})
+    assert_same_zones(shots)
+
+def test_bin_boundaries():
+    x, y = zip(*boundary_points())
+    shots = pd.DataFrame({'COORD_X': x, 'COORD_Y': y})
+    assert_same_zones(shots)
+    # Every bin but Unknown is reached from the boundaries alone
+    assert set(classify_zones_vectorized(shots, COURT_PARAMS).astype(str)) == set(ZONE_BINS[1:])
+
+@pytest.mark.parametrize('dtype', ['float64', 'Int64', 'object'])
+def test_missing_coordinates(dtype):
+    shots = pd.DataFrame({
+        'COORD_X': pd.Series([None, 10, None, 0, -700, 300], dtype=dtype),
+        'COORD_Y': pd.Series([5, None, None, 0, 100, 800], dtype=dtype),
+    })
+    if dtype == 'float64':
+        shots.loc[0, 'COORD_X'] = np.nan
+    zones = classify_zones_vectorized(shots, COURT_PARAMS).astype(str).tolist()
+    assert zones[:3] == ['Unknown'] * 3
+    assert zones == row_by_row(shots)
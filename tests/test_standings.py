@@ -0,0 +1,33 @@
+import pandas as pd
+
+from ScheduleResults import RUNNING_COLUMNS, create_standings_datasets
+
+def team_records(rows: list) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=['Team', 'TeamCode', 'Opponent', 'OpponentCode', 'Round', 'Date', 'Result',
+                                     'Team_Score', 'Opponent_Score'])
+    df['Season'] = 2024
+    df['Phase'] = 'RS'
+    df['PhaseGroup'] = 'RS'
+    # Only the head-to-head totals are checked, so the running standings columns can stay empty
+    for column in RUNNING_COLUMNS:
+        df[column] = 0
+    df['Streak'] = None
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df
+
+def test_head_to_head_one_row_per_pair_when_a_code_changes():
+    # Bravo is renamed mid-season, so its code differs between the two meetings
+    df = team_records([
+        ('Bravo', 'BRV', 'Alpha', 'ALP', 2, '2024-11-01', 'Loss', 70, 80),
+        ('Alpha', 'ALP', 'Bravo', 'BRV', 2, '2024-11-01', 'Win', 80, 70),
+        ('Alpha', 'ALP', 'Bravo', 'BRV2', 9, '2025-01-10', 'Loss', 75, 77),
+        ('Bravo', 'BRV2', 'Alpha', 'ALP', 9, '2025-01-10', 'Win', 77, 75),
+    ])
+    _, head_to_head = create_standings_datasets(df)
+
+    assert not head_to_head.duplicated(['Season', 'PhaseGroup', 'Team', 'Opponent']).any()
+    rows = head_to_head.set_index('Team')
+    assert rows.loc['Alpha', 'OpponentCode'] == 'BRV2'
+    assert rows.loc['Bravo', 'TeamCode'] == 'BRV2'
+    assert rows.loc['Alpha', ['Games', 'Wins', 'Losses', 'PointsFor', 'PointsAgainst', 'PointDiff']].tolist() == [2, 1, 1, 155, 147, 8]
+    assert rows.loc['Bravo', 'PointDiff'] == -8
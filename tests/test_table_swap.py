@@ -0,0 +1,22 @@
+from DataVersions import bump_data_versions, fetch_data_versions
+from TableSwap import old_table_name, restore_previous_tables
+
+TABLE_NAME = 'swap_pytest'
+
+def test_restore_bumps_data_versions(db_conn):
+    cursor = db_conn.cursor()
+    for table, seasons in ((TABLE_NAME, (2023, 2024)), (old_table_name(TABLE_NAME), (2022, 2023))):
+        cursor.execute(f"CREATE TABLE {table} (id SERIAL PRIMARY KEY, season INTEGER)")
+        cursor.execute(f"INSERT INTO {table} (season) SELECT unnest(%s::INTEGER[])", (list(seasons),))
+    # The swap that put the current table in versioned its seasons
+    bump_data_versions(cursor, TABLE_NAME, [2023, 2024], replace_table=True)
+    before = fetch_data_versions(cursor)
+
+    restore_previous_tables(cursor, [TABLE_NAME])
+    after = fetch_data_versions(cursor)
+    cursor.execute(f"SELECT array_agg(season ORDER BY season) FROM {TABLE_NAME}")
+    assert cursor.fetchone()[0] == [2022, 2023]
+    # Every season of either version of the table gets a new version, so cached reads of the discarded rows miss
+    for season in (2022, 2023, 2024):
+        assert after[(TABLE_NAME, season)] > before.get((TABLE_NAME, season), 0)
+    cursor.close()
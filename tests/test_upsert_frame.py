@@ -0,0 +1,45 @@
+import pandas as pd
+
+from TableSchemas import Column, TableSchema, create_table_sql, diff_rows, prepare_frame, upsert_frame
+
+SCHEMA = TableSchema(
+    columns=(
+        Column('Season', 'season', 'INTEGER'),
+        Column('Team', 'team', 'TEXT'),
+        Column('Wins', 'wins', 'INTEGER'),
+    ),
+    conflict_columns=('season', 'team'),
+)
+
+def frame(rows: list) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=['Season', 'Team', 'Wins'])
+
+def stored(cursor, table_name: str) -> dict:
+    cursor.execute(f"SELECT season, team, wins, ctid FROM {table_name}")
+    return {(season, team): (wins, ctid) for season, team, wins, ctid in cursor.fetchall()}
+
+def test_diff_rows_finds_unchanged_and_stale_rows():
+    previous = prepare_frame(frame([(2024, 'A', 1), (2024, 'B', 2), (2024, 'C', 3), (2024, None, 4)]), SCHEMA)
+    existing = previous[['season', 'team', 'row_hash']].assign(id=[10, 11, 12, 13])
+    current = prepare_frame(frame([(2024, 'A', 1), (2024, 'B', 5), (2024, None, 4), (2024, 'D', 0)]), SCHEMA)
+
+    send, stale_ids = diff_rows(current, existing, SCHEMA)
+    assert send['team'].fillna('<null>').tolist() == ['B', '<null>', 'D']
+    # C is gone, and a row with a NULL key never matches, so it is replaced
+    assert stale_ids == [12, 13]
+
+def test_full_reload_diffs_loaded_seasons_and_drops_the_rest(db_conn):
+    cursor = db_conn.cursor()
+    cursor.execute(create_table_sql('upsert_frame_test', SCHEMA, drop_existing=True, partitioned=False))
+    upsert_frame(cursor, frame([(2023, 'A', 10), (2023, 'B', 11), (2024, 'A', 1), (2024, 'B', 2), (2024, 'C', 3)]),
+                 'upsert_frame_test', SCHEMA, delete_missing=True)
+    before = stored(cursor, 'upsert_frame_test')
+
+    sent = upsert_frame(cursor, frame([(2024, 'A', 1), (2024, 'B', 5), (2025, 'A', 0)]), 'upsert_frame_test', SCHEMA,
+                        delete_missing=True)
+    after = stored(cursor, 'upsert_frame_test')
+    assert sent == 2
+    assert sorted(after) == [(2024, 'A'), (2024, 'B'), (2025, 'A')]
+    assert after[(2024, 'A')] == before[(2024, 'A')]
+    assert after[(2024, 'B')][0] == 5
+    cursor.close()